@@ -1,11 +1,13 @@
 # app/api/v1/endpoints.py
 import logging
+from typing import List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException
 
 from app.api.deps import get_repository
 from app.api.v1 import schemas
+from app.config import settings
 from app.db.repository import MessageRepository
 
 logger = logging.getLogger(__name__)
@@ -86,21 +88,64 @@ async def approve_and_send_ticket(
 
     try:
         # Используем метод send_reply
-        await email_service.send_reply(recipient_email, llm_response)
+        sent_message_id = await email_service.send_reply(
+            recipient_email, llm_response, in_reply_to=ticket.get("message_id")
+        )
     except Exception as e:
         logger.error(f"SMTP sending failed: {e}")
         raise HTTPException(status_code=503, detail=f"Failed to send email: {str(e)}")
 
+    # Запоминаем наш ответ: по его Message-ID ответ клиента попадет в этот тикет
+    await repo.add_ticket_message(
+        ticket_id, "out", llm_response, settings.SMTP_USER, sent_message_id
+    )
+
     # 4. Обновляем статус в БД (ставим is_resolved = True)
     await repo.update_ticket(ticket_id, {"is_resolved": True})
 
     return {"status": "success", "message": "Reply sent and ticket closed"}
 
 
+@router.get("/{ticket_id}/messages", response_model=list[schemas.TicketMessageResponse])
+async def get_ticket_messages(
+    ticket_id: UUID, repo: MessageRepository = Depends(get_repository)
+):
+    """Переписка по тикету (ответы клиента и наши письма)."""
+    return await repo.get_ticket_messages(ticket_id)
+
+
+@router.post("/{ticket_id}/reclassify", response_model=dict)
+async def reclassify_ticket(
+    ticket_id: UUID, repo: MessageRepository = Depends(get_repository)
+):
+    """
+    Повторно прогоняет тикет через NER + AI с учетом всей переписки.
+    Для ответов клиента это не делается автоматически, только по запросу.
+    """
+    from app.services.email_service import EmailService
+
+    updates = await EmailService(repo).reclassify_ticket(ticket_id)
+    if updates is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return updates
+
+
 from pydantic import BaseModel
 
 from app.services.parsing.ner_extractor import extract_entities
+from app.services.embedding_service import embedding_service
+from app.services.global_index import global_index
+from app.services.llm_cache import llm_cache
+from app.services.llm_backends import llm_backend
+from app.services.metrics import ticket_latency
+from app.services.model_registry import model_registry
+from app.services.parsing import morphology
+from app.services.parsing.ner_pool import ner_pool
 from app.services.parsing.utils import mask_pii
+from app.services.rag_engine import rag_engine
+from app.services.semantic_cache import semantic_cache
+from app.services.spam_filter import spam_filter
+from app.services.ticket_classifier import ticket_classifier
 
 
 # Схема для входящего текста
@@ -108,6 +153,10 @@ class DebugText(BaseModel):
     text: str
 
 
+class DebugTexts(BaseModel):
+    texts: List[str]
+
+
 @router.post("/debug/nlp")
 async def debug_nlp(request: DebugText):
     """
@@ -121,3 +170,66 @@ async def debug_nlp(request: DebugText):
     masked_text, entity_map = mask_pii(request.text, entities)
 
     return {"entities": entities, "masked_text": masked_text, "entity_map": entity_map}
+
+
+@router.post("/debug/nlp/batch")
+async def debug_nlp_batch(request: DebugTexts):
+    """Пакетный вариант /debug/nlp: сущности для каждого текста."""
+    # NER - в пуле процессов, как в конвейере писем: event loop не блокируется
+    batch = await ner_pool.extract_batch(request.texts)
+    return [
+        {"text": text, "entities": entities}
+        for text, entities in zip(request.texts, batch)
+    ]
+
+
+@router.get("/debug/morph/stats")
+async def debug_morph_stats():
+    """Попадания в кэш морфологии этого процесса (воркеры NER-пула считают свой)."""
+    return morphology.cache_stats()
+
+
+@router.get("/debug/models")
+async def debug_models():
+    """Какие модели загружены в этом процессе и сколько заняла загрузка."""
+    return model_registry.status()
+
+
+@router.get("/debug/spam/stats")
+async def debug_spam_stats():
+    """Доля писем, отклоненных спам-фильтром до NER (с момента старта процесса)."""
+    return spam_filter.stats
+
+
+@router.get("/debug/classifier/stats")
+async def debug_classifier_stats():
+    """Классификатор тикетов: обучен ли и отчет о точности на отложенной выборке."""
+    return ticket_classifier.stats
+
+
+@router.get("/debug/llm-cache/stats")
+async def debug_llm_cache_stats():
+    """Попадания в кэш ответов LLM (точный + семантический)."""
+    return {"exact": llm_cache.stats, "semantic": semantic_cache.stats}
+
+
+@router.get("/debug/ai/latency")
+async def debug_ai_latency():
+    """Задержки шагов process_ticket_ai (кэши, скачивание руководства, RAG, LLM)."""
+    return ticket_latency.stats
+
+
+@router.get("/debug/rag/stats")
+async def debug_rag_stats():
+    """Кэш загруженных индексов руководств, глобальный индекс и батчинг эмбеддингов."""
+    return {
+        "device_indexes": rag_engine.index_cache.stats,
+        "global": global_index.stats,
+        "embeddings": embedding_service.stats,
+    }
+
+
+@router.get("/debug/llm/stats")
+async def debug_llm_stats():
+    """Вызовы LLM: движок, повторы и отказы (HF) или очередь генерации (локальная модель)."""
+    return llm_backend.stats
@@ -57,3 +57,16 @@ class TicketResponse(TicketBase):
 
     class Config:
         from_attributes = True
+
+
+class TicketMessageResponse(BaseModel):
+    id: UUID
+    ticket_id: UUID
+    created_at: datetime
+    direction: str  # "in" - письмо клиента, "out" - наш ответ
+    message_id: Optional[str]
+    sender: Optional[str]
+    body: Optional[str]
+
+    class Config:
+        from_attributes = True
@@ -75,4 +75,4 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="AI Support Backend", lifespan=lifespan)
 
 # Подключение роутов
-app.include_router(tickets_router, prefix="/api/v1")F
\ No newline at end of file
+app.include_router(tickets_router, prefix="/api/v1")
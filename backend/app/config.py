@@ -19,6 +19,80 @@ class Settings(BaseSettings):
     USE_MOCK_AI: bool = True
     HF_API_TOKEN: str = ""
     HF_API_URL: str = ""
+    # Движок LLM: "hf" (HF Inference API) или "llamacpp" (локальная GGUF-модель на CPU)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "hf")
+    LLM_LOCAL_MODEL_PATH: str = os.getenv(
+        "LLM_LOCAL_MODEL_PATH",
+        os.path.join(DATA_DIR, "models", "qwen2.5-7b-instruct-q4_k_m.gguf"),
+    )
+    LLM_LOCAL_THREADS: int = 4
+    LLM_LOCAL_CTX: int = 4096
+    LLM_LOCAL_MAX_TOKENS: int = 400
+    LLM_LOCAL_QUEUE_SIZE: int = 32  # Ожидающих генерации, дальше - письмо откладывается
+    # Пул соединений к LLM (общий клиент из lifespan)
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_TIMEOUT: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_POOL_TIMEOUT: float = 10.0
+    # Диспетчер LLM: квота, запросы в полете, повторы, circuit breaker
+    LLM_RATE_LIMIT: float = 5.0  # Запросов в секунду
+    LLM_RATE_BURST: int = 10
+    LLM_MAX_IN_FLIGHT: int = 8
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE: float = 1.0
+    LLM_BACKOFF_MAX: float = 30.0
+    LLM_BREAKER_THRESHOLD: int = 5  # Ошибок подряд до размыкания
+    LLM_BREAKER_RESET: float = 60.0
+    # Очередь писем, отложенных до восстановления LLM
+    LLM_RETRY_KEY: str = "llm:retry"
+    LLM_RETRY_INTERVAL: int = 15
+    LLM_RETRY_BATCH: int = 50
+    LLM_RETRY_DELAY: int = 60
+    LLM_RETRY_MAX_DELAY: int = 3600
+    LLM_RETRY_MAX_ATTEMPTS: int = 10  # Дальше - ручная обработка
+    # Кэш ответов LLM по маскированному тексту (LRU в памяти + общий Redis)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_SIZE: int = 5_000
+    LLM_CACHE_TTL: int = 7 * 24 * 3600
+    LLM_CACHE_REDIS: bool = True
+    LLM_CACHE_REDIS_PREFIX: str = "llm_cache:"
+    LLM_CACHE_REDIS_MAX_ENTRIES: int = 100_000
+    # Семантический кэш: похожие (по E5) жалобы получают готовый ответ
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.93  # Косинусная близость
+    SEMANTIC_CACHE_TOP_K: int = 3
+    SEMANTIC_CACHE_MAX_AGE: int = 30 * 24 * 3600
+    SEMANTIC_CACHE_EVICT_INTERVAL: int = 3600
+    SEMANTIC_CACHE_SAVE_EVERY: int = 20
+
+    # --- Models ---
+    EMBEDDING_MODEL_NAME: str = "intfloat/multilingual-e5-base"
+    # torch - sentence-transformers fp32; onnx - int8 через onnxruntime
+    # (python -m app.services.onnx_embedding export)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_DIR: str = os.path.join(DATA_DIR, "models", "e5-base-onnx-int8")
+    EMBEDDING_ONNX_THREADS: int = 4
+    EMBEDDING_MAX_LENGTH: int = 512
+    # Порог parity-проверки int8 против fp32, ниже - пересобрать индексы
+    EMBEDDING_ONNX_MIN_COSINE: float = 0.98
+    EMBEDDING_ONNX_MIN_RECALL: float = 0.95
+    # Динамический батчинг эмбеддингов (embedding_service)
+    EMBEDDING_MAX_BATCH: int = 32
+    EMBEDDING_BATCH_WINDOW: float = 0.01  # Секунд ожидания добора батча запросов
+    EMBEDDING_PASSAGE_BATCH: int = 32  # Фрагментов руководства за один encode
+    EMBEDDING_CACHE_SIZE: int = 10_000
+    EMBEDDING_CACHE_TTL: int = 3600
+    # Модели, которые lifespan загружает до приема писем (см. model_registry)
+    MODEL_PREWARM: List[str] = [
+        "segmenter",
+        "ner_tagger",
+        "morph_vocab",
+        "morph",
+        "embedding",
+    ]
 
     # --- Database ---
     POSTGRES_DSN: PostgresDsn = Field(
@@ -31,6 +105,14 @@ class Settings(BaseSettings):
     IMAP_USER: str = ""
     IMAP_PASSWORD: str = ""
     IMAP_MAILBOX: str = "INBOX"
+    IMAP_SSL: bool = True
+    IMAP_TIMEOUT: int = 30
+    IMAP_FETCH_BATCH_SIZE: int = 200  # UID в одной команде UID FETCH
+    IMAP_MAX_FETCH_BYTES: int = 1_000_000  # Вложения сверх лимита не скачиваются
+    # Push-режим (IMAP IDLE, RFC 2177). Если сервер не умеет IDLE - работает polling
+    IMAP_USE_IDLE: bool = False
+    IMAP_IDLE_TIMEOUT: int = 25 * 60  # RFC 2177: перезапускать IDLE не реже 29 минут
+    IMAP_RECONNECT_DELAY: int = 10
 
     # --- SMTP ---
     SMTP_HOST: str = "smtp.mail.ru"
@@ -42,6 +124,19 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379"
     REDIS_CHANNEL: str = "channel:new_ticket"
 
+    # --- Ingestion queue (Redis Streams) ---
+    INGEST_USE_QUEUE: bool = False
+    INGEST_READER_ENABLED: bool = True  # False - реплика только обрабатывает очередь
+    INGEST_STREAM: str = "stream:incoming_emails"
+    INGEST_GROUP: str = "email-processors"
+    INGEST_CONSUMERS: int = 2
+    INGEST_BATCH_SIZE: int = 50
+    INGEST_BLOCK_MS: int = 5000
+    INGEST_CLAIM_INTERVAL: int = 30
+    INGEST_CLAIM_IDLE_MS: int = 5 * 60 * 1000
+    INGEST_MAX_DELIVERIES: int = 5
+    INGEST_STREAM_MAXLEN: int = 100_000
+
     # --- Telegram Bot ---
     TELEGRAM_BOT_TOKEN: str = ""
     TELEGRAM_GROUP_ID: int = 0
@@ -53,6 +148,86 @@ class Settings(BaseSettings):
     # --- Workers ---
     POLLING_INTERVAL: int = 60
 
+    # --- NER process pool (0 - NER в пуле потоков) ---
+    NER_POOL_WORKERS: int = 0
+    NER_POOL_MAX_TASKS_PER_CHILD: int = 500
+    NER_POOL_HEALTH_INTERVAL: int = 60
+    NER_POOL_HEALTH_TIMEOUT: int = 30
+    # Пул завис, если при задачах в работе ни одна не завершилась за это время
+    NER_POOL_HANG_TIMEOUT: int = 300
+    # Сколько писем NER-стадия отдает теггеру за один вызов
+    NER_BATCH_SIZE: int = 16
+
+    # --- Deduplication ---
+    DEDUP_ENABLED: bool = True
+    DEDUP_BLOOM_CAPACITY: int = 1_000_000
+    DEDUP_BLOOM_ERROR_RATE: float = 0.001
+    DEDUP_LRU_SIZE: int = 10_000
+    DEDUP_WARMUP_LIMIT: int = 1_000_000
+
+    # --- Device catalog (JSON, перечитывается при изменении файла) ---
+    DEVICE_CATALOG_PATH: str = os.path.join(
+        os.path.dirname(__file__), "services", "parsing", "devices.json"
+    )
+    DEVICE_CATALOG_RELOAD_INTERVAL: int = 30
+
+    # --- Spam filter (до NER) ---
+    SPAM_FILTER_ENABLED: bool = True
+    SPAM_KEYWORD_MIN_HITS: int = 2  # Разных рекламных слов для отказа
+    SPAM_SCAN_MAX_CHARS: int = 20_000  # Сканируется начало собственного текста письма
+    SPAM_CLASSIFIER_THRESHOLD: float = 0.95
+    SPAM_TRAIN_LIMIT: int = 20_000
+    SPAM_TRAIN_MIN_PER_CLASS: int = 20
+
+    # --- RAG по руководствам приборов (в process_ticket_ai) ---
+    RAG_ENABLED: bool = True
+    RAG_LATENCY_BUDGET: float = 3.0  # Секунд на поиск, дальше - ответ без контекста
+    RAG_TOP_K: int = 3
+    RAG_MAX_CONTEXT_CHARS: int = 2000
+    RAG_MAX_RETRIEVALS: int = 8  # Одновременных поисков по руководствам
+    # "Руководства нет на сайте" помним, чтобы не искать его каждый тикет
+    MANUAL_MISS_CACHE_SIZE: int = 10_000
+    MANUAL_MISS_TTL: int = 24 * 3600
+    RAG_INDEX_CACHE_MB: int = 512  # Загруженные индексы приборов в памяти
+    # Ожидание сборки индекса прибора в другом процессе (опрос flock)
+    RAG_BUILD_LOCK_POLL: float = 0.2
+    RAG_BUILD_LOCK_TIMEOUT: float = 600
+    # Единый индекс всех руководств (python -m app.services.global_index build)
+    RAG_GLOBAL_INDEX: bool = False
+    RAG_GLOBAL_INDEX_DIR: str = os.path.join(DATA_DIR, "faiss_global")
+    RAG_GLOBAL_INDEX_TYPE: str = "hnsw"  # hnsw | ivf | flat
+    RAG_HNSW_M: int = 32
+    RAG_HNSW_EF_CONSTRUCTION: int = 200
+    RAG_HNSW_EF_SEARCH: int = 64
+    RAG_IVF_NLIST: int = 1024
+    RAG_IVF_NPROBE: int = 16
+
+    # --- Ticket classifier (TF-IDF + линейные головы: category/sentiment/important) ---
+    TICKET_CLASSIFIER_ENABLED: bool = True
+    TICKET_CLASSIFIER_PATH: str = os.path.join(
+        DATA_DIR, "models", "ticket_classifier.json"
+    )
+    TICKET_CLASSIFIER_THRESHOLD: float = 0.8  # Ниже - метки ставит LLM
+    TICKET_CLASSIFIER_IMPORTANT_THRESHOLD: float = 0.3  # Лучше лишняя тревога
+    TICKET_CLASSIFIER_TRAIN_LIMIT: int = 20_000
+    TICKET_CLASSIFIER_MIN_SAMPLES: int = 200
+    TICKET_CLASSIFIER_MIN_PER_CLASS: int = 10
+    TICKET_CLASSIFIER_HOLDOUT: float = 0.2
+    TICKET_CLASSIFIER_EPOCHS: int = 5
+    TICKET_CLASSIFIER_LEARNING_RATE: float = 0.5
+
+    # --- Morphology cache (pymorphy3 parse/inflect, 0 - без TTL) ---
+    MORPH_CACHE_SIZE: int = 50_000
+    MORPH_CACHE_TTL: int = 0
+
+    # --- Pipeline (число воркеров на стадию и размер очередей между ними) ---
+    PIPELINE_QUEUE_SIZE: int = 100
+    PIPELINE_NER_CONCURRENCY: int = 2
+    PIPELINE_MASK_CONCURRENCY: int = 2
+    PIPELINE_AI_CONCURRENCY: int = 8
+    PIPELINE_PERSIST_CONCURRENCY: int = 4
+    PIPELINE_PUBLISH_CONCURRENCY: int = 4
+
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), "..", "..", ".env")
         env_file_encoding = "utf-8"
@@ -65,8 +240,3 @@ def get_settings() -> Settings:
 
 
 settings = get_settings()
-<<<<<<< HEAD
-=======
-
-
->>>>>>> f37fb5223398d065006790523c4f329eb2753bf6
@@ -60,4 +60,49 @@ async def init_db(pool):
         """
 
         await conn.execute(create_table_query)
+
+        # Дедупликация: Message-ID и хэш нормализованного тела
+        await conn.execute("""
+            ALTER TABLE tickets ADD COLUMN IF NOT EXISTS message_id TEXT;
+            ALTER TABLE tickets ADD COLUMN IF NOT EXISTS body_hash TEXT;
+            ALTER TABLE tickets ADD COLUMN IF NOT EXISTS filtered_by TEXT;
+            ALTER TABLE tickets ADD COLUMN IF NOT EXISTS classified_by TEXT;
+            CREATE UNIQUE INDEX IF NOT EXISTS tickets_message_id_key
+                ON tickets (message_id) WHERE message_id IS NOT NULL;
+            CREATE UNIQUE INDEX IF NOT EXISTS tickets_body_hash_key
+                ON tickets (body_hash) WHERE body_hash IS NOT NULL;
+            """)
         logger.info("Database table 'tickets' checked/created successfully.")
+
+        # Чекпоинт инкрементальной синхронизации IMAP (по UID)
+        create_sync_state_query = """
+        CREATE TABLE IF NOT EXISTS imap_sync_state (
+            mailbox TEXT PRIMARY KEY,
+            uid_validity BIGINT NOT NULL,
+            last_uid BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+
+        await conn.execute(create_sync_state_query)
+        logger.info("Database table 'imap_sync_state' checked/created successfully.")
+
+        # Переписка по тикету: ответы клиента (in) и наши письма (out)
+        create_messages_query = """
+        CREATE TABLE IF NOT EXISTS ticket_messages (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            ticket_id UUID NOT NULL REFERENCES tickets(id) ON DELETE CASCADE,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            direction TEXT NOT NULL,
+            message_id TEXT,
+            sender TEXT,
+            body TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ticket_messages_ticket_id_idx
+            ON ticket_messages (ticket_id, created_at);
+        CREATE UNIQUE INDEX IF NOT EXISTS ticket_messages_message_id_key
+            ON ticket_messages (message_id) WHERE message_id IS NOT NULL;
+        """
+
+        await conn.execute(create_messages_query)
+        logger.info("Database table 'ticket_messages' checked/created successfully.")
@@ -16,8 +16,12 @@ class MessageRepository:
                 id, created_at, full_name, phone_num, email, object_name,
                 device_type, device_num, original_message, summary,
                 llm_response, sentiment, category,
-                is_resolved, is_important, manual_required, is_relevant
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
+                is_resolved, is_important, manual_required, is_relevant,
+                message_id, body_hash, filtered_by, classified_by
+            ) VALUES (
+                $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
+                $11, $12, $13, $14, $15, $16, $17, $18, $19, $20, $21
+            )
             RETURNING id
         """
         async with self.pool.acquire() as conn:
@@ -41,6 +45,10 @@ class MessageRepository:
                 data.get("is_important", False),
                 data.get("manual_required", False),
                 data.get("is_relevant", True),
+                data.get("message_id"),
+                data.get("body_hash"),
+                data.get("filtered_by"),
+                data.get("classified_by"),
             )
             return msg_id
 
@@ -91,3 +99,122 @@ class MessageRepository:
         async with self.pool.acquire() as conn:
             result = await conn.execute(query, ticket_id)
             return result == "DELETE 1"
+
+    async def find_duplicate(
+        self, message_id: Optional[str], body_hash: Optional[str]
+    ) -> Optional[UUID]:
+        query = "SELECT id FROM tickets WHERE message_id = $1 OR body_hash = $2 LIMIT 1"
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, message_id, body_hash)
+
+    async def get_dedup_keys(self, limit: int) -> List[Dict]:
+        query = """
+            SELECT message_id, body_hash FROM tickets
+            WHERE message_id IS NOT NULL OR body_hash IS NOT NULL
+            ORDER BY created_at DESC LIMIT $1
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, limit)
+            return [dict(row) for row in rows]
+
+    async def get_classified_samples(self, limit: int) -> List[Dict]:
+        """Размеченные тикеты для обучения спам-фильтра (без его же решений)."""
+        query = """
+            SELECT original_message, category, is_relevant FROM tickets
+            WHERE category IS NOT NULL AND filtered_by IS NULL
+            ORDER BY created_at DESC LIMIT $1
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, limit)
+            return [dict(row) for row in rows]
+
+    async def get_labeled_tickets(self, limit: int) -> List[Dict]:
+        """
+        Тикеты с метками от LLM для обучения классификатора тикетов.
+        Без ручной обработки, авто-отклоненных и размеченных самим классификатором.
+        """
+        query = """
+            SELECT original_message, category, sentiment, is_important FROM tickets
+            WHERE category IS NOT NULL AND sentiment IS NOT NULL
+                AND NOT manual_required
+                AND filtered_by IS NULL AND classified_by IS NULL
+            ORDER BY created_at DESC LIMIT $1
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, limit)
+            return [dict(row) for row in rows]
+
+    async def find_ticket_by_message_ids(
+        self, message_ids: List[str]
+    ) -> Optional[UUID]:
+        """Ищет тикет, к которому относится любое из писем (по Message-ID)."""
+        query = """
+            SELECT id FROM tickets WHERE message_id = ANY($1::text[])
+            UNION ALL
+            SELECT ticket_id FROM ticket_messages WHERE message_id = ANY($1::text[])
+            LIMIT 1
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, message_ids)
+
+    async def add_ticket_message(
+        self,
+        ticket_id: UUID,
+        direction: str,
+        body: str,
+        sender: Optional[str] = None,
+        message_id: Optional[str] = None,
+    ) -> bool:
+        """Добавляет письмо в переписку. Повторная доставка того же письма игнорируется."""
+        query = """
+            INSERT INTO ticket_messages (
+                id, ticket_id, created_at, direction, message_id, sender, body
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (message_id) WHERE message_id IS NOT NULL DO NOTHING
+        """
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(
+                query,
+                uuid4(),
+                ticket_id,
+                datetime.now(timezone.utc),
+                direction,
+                message_id,
+                sender,
+                body,
+            )
+            return result == "INSERT 0 1"
+
+    async def get_ticket_messages(self, ticket_id: UUID) -> List[Dict]:
+        query = """
+            SELECT * FROM ticket_messages WHERE ticket_id = $1 ORDER BY created_at
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, ticket_id)
+            return [dict(row) for row in rows]
+
+    async def get_sync_state(self, mailbox: str) -> Optional[Dict]:
+        query = "SELECT uid_validity, last_uid FROM imap_sync_state WHERE mailbox = $1"
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(query, mailbox)
+            return dict(row) if row else None
+
+    async def save_sync_state(self, mailbox: str, uid_validity: int, last_uid: int):
+        """
+        Сохраняет чекпоинт. При том же UIDVALIDITY last_uid только растет,
+        при смене UIDVALIDITY - перезаписывается.
+        """
+        query = """
+            INSERT INTO imap_sync_state (mailbox, uid_validity, last_uid, updated_at)
+            VALUES ($1, $2, $3, NOW())
+            ON CONFLICT (mailbox) DO UPDATE SET
+                last_uid = CASE
+                    WHEN imap_sync_state.uid_validity = EXCLUDED.uid_validity
+                    THEN GREATEST(imap_sync_state.last_uid, EXCLUDED.last_uid)
+                    ELSE EXCLUDED.last_uid
+                END,
+                uid_validity = EXCLUDED.uid_validity,
+                updated_at = NOW()
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, mailbox, uid_validity, last_uid)
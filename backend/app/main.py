@@ -15,7 +15,21 @@ from app.bot.listener import listen_redis
 from app.config import settings
 from app.db.database import create_db_pool, init_db
 from app.db.repository import MessageRepository
-from app.workers.email_watcher import email_polling_worker
+from app.messaging.ingest_queue import IngestQueue
+from app.messaging.retry_queue import retry_queue
+from app.services.dedup import dedup_index
+from app.services.embedding_service import embedding_service
+from app.services.global_index import global_index
+from app.services.llm_backends import llm_backend
+from app.services.llm_cache import llm_cache
+from app.services.model_registry import model_registry
+from app.services.semantic_cache import semantic_cache
+from app.services.spam_filter import spam_filter
+from app.services.ticket_classifier import ticket_classifier
+from app.services.parsing.ner_pool import ner_pool
+from app.workers.email_watcher import email_idle_worker, email_polling_worker
+from app.workers.ingest_worker import consumer_name, ingest_consumer_worker
+from app.workers.llm_retry_worker import llm_retry_worker
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -33,9 +47,54 @@ async def lifespan(app: FastAPI):
     await init_db(pool)
     app.state.db_pool = pool
     repo = MessageRepository(pool)
+    if settings.DEDUP_ENABLED:
+        await dedup_index.warm_up(repo)
+    if settings.SPAM_FILTER_ENABLED:
+        await spam_filter.train(repo)
+    if settings.TICKET_CLASSIFIER_ENABLED:
+        await ticket_classifier.load_or_train(repo)
+
+    # Модели грузим до первого письма, а не на первом тикете после деплоя
+    await model_registry.prewarm(settings.MODEL_PREWARM)
+
+    if settings.SEMANTIC_CACHE_ENABLED:
+        await semantic_cache.load()
+    if settings.RAG_GLOBAL_INDEX:
+        await asyncio.to_thread(global_index.load)
+
+    # Движок LLM: общий HTTP-клиент (HF) или загрузка локальной GGUF-модели
+    await llm_backend.start()
+
+    # NER в отдельных процессах (модели грузятся в каждом воркере один раз)
+    ner_health_task = None
+    if settings.NER_POOL_WORKERS:
+        ner_pool.start()
+        await ner_pool.warm_up()
+        ner_health_task = asyncio.create_task(ner_pool.health_loop())
+
+    # 2. Воркер почты (IDLE push-режим или polling)
+    # В режиме очереди читатель IMAP только складывает письма в Redis Stream,
+    # а обрабатывают их консьюмеры (их можно запускать и на других репликах)
+    worker_tasks = []
+    ingest_queue = IngestQueue() if settings.INGEST_USE_QUEUE else None
+
+    if not ingest_queue or settings.INGEST_READER_ENABLED:
+        email_worker = (
+            email_idle_worker if settings.IMAP_USE_IDLE else email_polling_worker
+        )
+        worker_tasks.append(asyncio.create_task(email_worker(repo, ingest_queue)))
+
+    if ingest_queue:
+        for i in range(settings.INGEST_CONSUMERS):
+            worker_tasks.append(
+                asyncio.create_task(
+                    ingest_consumer_worker(repo, ingest_queue, consumer_name(i))
+                )
+            )
 
-    # 2. Воркер почты
-    email_task = asyncio.create_task(email_polling_worker(repo))
+    # Письма, отложенные из-за недоступности LLM, возвращаются в обработку
+    if not settings.USE_MOCK_AI:
+        worker_tasks.append(asyncio.create_task(llm_retry_worker(repo, ingest_queue)))
 
     # 3. Telegram Bot
     bot_task = None
@@ -55,14 +114,24 @@ async def lifespan(app: FastAPI):
     # --- Shutdown ---
     logger.info("Shutting down...")
 
-    email_task.cancel()
+    for task in worker_tasks:
+        task.cancel()
     if bot_task:
         bot_task.cancel()
 
-    try:
-        await email_task
-    except asyncio.CancelledError:
-        pass
+    if ner_health_task:
+        ner_health_task.cancel()
+
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
+    ner_pool.shutdown()
+    await llm_backend.close()
+    await embedding_service.close()
+    await llm_cache.close()
+    await retry_queue.close()
+    if settings.SEMANTIC_CACHE_ENABLED:
+        await semantic_cache.save()
+    if ingest_queue:
+        await ingest_queue.close()
 
     if bot_task:
         try:
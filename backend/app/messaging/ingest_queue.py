@@ -0,0 +1,124 @@
+# app/messaging/ingest_queue.py
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (id записи в стриме, письмо)
+StreamEntry = Tuple[str, Dict]
+
+
+class IngestQueue:
+    """
+    Надежная очередь сырых писем на Redis Streams с consumer group.
+    Семантика at-least-once: запись подтверждается (XACK) только после
+    сохранения тикета, зависшие записи упавших консьюмеров забираются XAUTOCLAIM.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis = redis_client or redis.from_url(
+            settings.REDIS_URL, decode_responses=True
+        )
+        self.stream = settings.INGEST_STREAM
+        self.group = settings.INGEST_GROUP
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def push_many(self, emails: List[Dict]) -> List[str]:
+        pipe = self.redis.pipeline(transaction=False)
+        for email_data in emails:
+            pipe.xadd(
+                self.stream,
+                {"payload": json.dumps(email_data, ensure_ascii=False)},
+                maxlen=settings.INGEST_STREAM_MAXLEN,
+                approximate=True,
+            )
+        entry_ids = await pipe.execute()
+        logger.info(f"Queued {len(entry_ids)} emails to {self.stream}")
+        return entry_ids
+
+    async def read(self, consumer: str) -> List[StreamEntry]:
+        response = await self.redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream: ">"},
+            count=settings.INGEST_BATCH_SIZE,
+            block=settings.INGEST_BLOCK_MS,
+        )
+        entries = []
+        for _, messages in response or []:
+            entries.extend(self._decode(messages))
+        return entries
+
+    async def claim_stale(self, consumer: str) -> List[StreamEntry]:
+        """
+        Забирает записи, которые другие консьюмеры взяли и не подтвердили
+        дольше INGEST_CLAIM_IDLE_MS. Записи сверх INGEST_MAX_DELIVERIES
+        считаются "отравленными": логируются и подтверждаются.
+        """
+        response = await self.redis.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=settings.INGEST_CLAIM_IDLE_MS,
+            start_id="0-0",
+            count=settings.INGEST_BATCH_SIZE,
+        )
+        # Записи без данных (удалены из стрима) в Redis 6.2 остаются в PEL
+        missing = [entry_id for entry_id, fields in response[1] if not fields]
+        await self.ack(*missing)
+
+        entries = self._decode(response[1])
+        if not entries:
+            return []
+
+        pending = await self.redis.xpending_range(
+            self.stream,
+            self.group,
+            min=entries[0][0],
+            max=entries[-1][0],
+            count=len(entries),
+            consumername=consumer,
+        )
+        deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+        poisoned = [
+            entry_id
+            for entry_id, _ in entries
+            if deliveries.get(entry_id, 0) > settings.INGEST_MAX_DELIVERIES
+        ]
+        if poisoned:
+            logger.error(f"Dropping poisoned stream entries: {poisoned}")
+            await self.ack(*poisoned)
+
+        logger.info(f"Reclaimed {len(entries) - len(poisoned)} stale stream entries")
+        return [entry for entry in entries if entry[0] not in poisoned]
+
+    async def ack(self, *entry_ids: str):
+        if entry_ids:
+            await self.redis.xack(self.stream, self.group, *entry_ids)
+
+    async def close(self):
+        await self.redis.close()
+
+    @staticmethod
+    def _decode(messages) -> List[StreamEntry]:
+        entries = []
+        for entry_id, fields in messages:
+            # Запись могла быть удалена из стрима (MAXLEN), пока висела в PEL
+            if not fields or "payload" not in fields:
+                continue
+            entries.append((entry_id, json.loads(fields["payload"])))
+        return entries
@@ -0,0 +1,63 @@
+# app/messaging/retry_queue.py
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RetryQueue:
+    """
+    Письма, отложенные до восстановления LLM (sorted set, score - время повтора).
+    Запись в Redis делается до XACK, поэтому письмо не теряется при падении.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self._redis = redis_client
+        self.key = settings.LLM_RETRY_KEY
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def park(self, email_data: Dict):
+        attempts = email_data.get("llm_attempts", 0) + 1
+        delay = min(
+            settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_DELAY * 2 ** (attempts - 1)
+        )
+        payload = {k: v for k, v in email_data.items() if k != "entry_id"}
+        payload["llm_attempts"] = attempts
+        await self.redis.zadd(
+            self.key, {json.dumps(payload, ensure_ascii=False): time.time() + delay}
+        )
+        logger.info(f"Email parked for LLM retry #{attempts} in {delay}s")
+
+    async def pop_due(self, limit: int) -> List[Dict]:
+        members = await self.redis.zrangebyscore(
+            self.key, "-inf", time.time(), start=0, num=limit
+        )
+        emails = []
+        for member in members:
+            # ZREM = 1 только у одного из конкурирующих воркеров
+            if await self.redis.zrem(self.key, member):
+                emails.append(json.loads(member))
+        return emails
+
+    async def size(self) -> int:
+        return await self.redis.zcard(self.key)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+# Синглтон
+retry_queue = RetryQueue()
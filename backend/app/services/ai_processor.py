@@ -1,13 +1,34 @@
 # app/services/ai_processor.py
-import json
-from typing import Dict, Optional
-from urllib.parse import urlparse
-
-import httpx
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict, List, Optional, Set
 
 from app.config import get_settings
+from app.services.fetcher import find_and_download_pdf
+from app.services.global_index import global_index
+from app.services.llm_backends import (
+    ANSWER_ONLY_SCHEMA,
+    ANSWER_SCHEMA,
+    llm_backend,
+)
+from app.services.llm_cache import llm_cache, make_key
+from app.services.llm_dispatcher import LLMUnavailableError
+from app.services.metrics import ticket_latency
+from app.services.rag_engine import rag_engine
+from app.services.semantic_cache import semantic_cache
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Поиск по руководству, не уложившийся в бюджет, доделывается в фоне
+_background_tasks: Set[asyncio.Task] = set()
+# Одновременных поисков (скачивание, сборка индекса, эмбеддинг) не больше
+# RAG_MAX_RETRIEVALS: при всплеске писем лишние тикеты идут без руководства
+_retrieval_slots = asyncio.Semaphore(settings.RAG_MAX_RETRIEVALS)
+
+# Менять при любой правке промпта: версия входит в ключ кэша ответов
+PROMPT_VERSION = "answer-v1"
 
 PROMPT_GENERATE_ANSWER = """
 Ты сотрудник службы поддержки газовой службы. 
@@ -32,6 +53,26 @@ PROMPT_GENERATE_ANSWER = """
 }
 """
 
+# Метки уже поставил локальный классификатор: от LLM нужен только ответ
+PROMPT_VERSION_ANSWER_ONLY = "answer-only-v1"
+
+PROMPT_ANSWER_ONLY = """
+Ты сотрудник службы поддержки газовой службы. 
+Твоя задача — подготовить ответ на жалобу.
+
+Входящий текст содержит плейсхолдеры: <NAME_1>, <DEVICE_1> и т.д.
+
+ПРАВИЛА:
+1. summary: Краткое описание проблемы (1 предложение).
+2. answer: Вежливый ответ. Используй плейсхолдеры. Для смены падежа имени добавь суффикс: _GEN (кого?), _DAT (кому?) и т.д.
+
+Верни результат СТРОГО валидным JSON без markdown:
+{
+  "summary": "Описание...",
+  "answer": "Текст ответа..."
+}
+"""
+
 
 def _manual_response(reason: str, important: bool = False) -> Dict:
     return {
@@ -44,125 +85,283 @@ def _manual_response(reason: str, important: bool = False) -> Dict:
     }
 
 
-def _normalize_hf_url(url: str) -> Optional[str]:
+async def _call_llm(
+    prompt: str, input_text: str, schema: Optional[Dict] = None
+) -> Optional[dict]:
+    # Движок (HF Inference API или локальная GGUF-модель) - LLM_BACKEND
+    return await llm_backend.generate(prompt, input_text, schema)
+
+
+def _retrieval_enabled(device_name: Optional[str]) -> bool:
+    use_global = settings.RAG_GLOBAL_INDEX and global_index.ready
+    return bool(
+        not settings.USE_MOCK_AI
+        and settings.RAG_ENABLED
+        and (device_name or use_global)
+    )
+
+
+def start_retrieval(
+    masked_text: str, device_name: Optional[str], timings: Dict[str, float]
+) -> Optional[asyncio.Task]:
     """
-    Нормализует HF API URL: поддерживает старый/новый формат и просто model_id.
-    Возвращает None, если URL невалиден.
+    Запускает поиск фрагментов руководства, как только известен прибор:
+    конвейер писем вызывает его на стадии маскирования, и поиск идет
+    параллельно с классификацией. Шаги поиска пишутся в timings тикета.
     """
-    if not url or not url.strip():
+    if not _retrieval_enabled(device_name):
         return None
+    if _retrieval_slots.locked():
+        ticket_latency.count("rag_skipped")
+        logger.warning("Too many manual retrievals in flight, skipping")
+        return None
+    retrieval = asyncio.create_task(
+        _timed(
+            timings, "rag_total", _bounded_retrieve(masked_text, device_name, timings)
+        )
+    )
+    _background_tasks.add(retrieval)
+    retrieval.add_done_callback(_background_tasks.discard)
+    return retrieval
 
-    url = url.strip()
 
-    # Если передан только model_id (например, "meta-llama/Meta-Llama-3.1-8B-Instruct")
-    if "/" in url and not url.startswith("http"):
-        return f"https://router.huggingface.co/hf-inference/models/{url}"
+async def process_ticket_ai(
+    masked_text: str,
+    device_name: Optional[str],
+    allow_park: bool = False,
+    labels: Optional[Dict] = None,
+    retrieval: Optional[asyncio.Task] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Dict:
+    """
+    Главная точка входа.
+    Возвращает словарь с полями: summary, answer, sentiment, category, important, manual_required.
+    При allow_park недоступность LLM пробрасывается как LLMUnavailableError
+    (письмо откладывается), иначе тикет уходит в ручную обработку.
+    labels (sentiment, category, important) от локального классификатора
+    заменяют метки LLM, а промпт сокращается до summary и answer.
+    Фрагменты руководства прибора ищутся параллельно с проверкой кэшей,
+    не дольше RAG_LATENCY_BUDGET: опоздавший поиск не задерживает ответ.
+    retrieval - поиск, уже запущенный start_retrieval (с тем же timings),
+    иначе он запускается здесь.
+    """
 
-    # Если старый формат api-inference.huggingface.co
-    if "api-inference.huggingface.co" in url and "/models/" in url:
-        model_id = url.split("/models/")[-1].split("?")[0].strip()
-        if model_id:
-            return f"https://router.huggingface.co/hf-inference/models/{model_id}"
+    # Генерация ответа
+    if settings.USE_MOCK_AI:
+        return {**mock_llm_call(masked_text), **(labels or {})}
 
-    # Проверяем, что URL имеет правильный протокол
-    parsed = urlparse(url)
-    if parsed.scheme not in ("http", "https"):
-        return None
+    if labels:
+        prompt, version = PROMPT_ANSWER_ONLY, PROMPT_VERSION_ANSWER_ONLY
+        schema = ANSWER_ONLY_SCHEMA
+    else:
+        prompt, version = PROMPT_GENERATE_ANSWER, PROMPT_VERSION
+        schema = ANSWER_SCHEMA
+
+    started = time.perf_counter()
+    timings = {} if timings is None else timings
+    # Ответ с контекстом руководства зависит от прибора
+    if device_name and _retrieval_enabled(device_name):
+        version = f"{version}:{device_name}"
+    if retrieval is None:
+        retrieval = start_retrieval(masked_text, device_name, timings)
+
+    try:
+        result = await _generate(
+            masked_text,
+            prompt,
+            schema,
+            version,
+            allow_park,
+            retrieval,
+            started,
+            timings,
+        )
+    finally:
+        timings["total"] = time.perf_counter() - started
+        ticket_latency.record("total", timings["total"])
+        logger.info(
+            "AI timings: "
+            + ", ".join(
+                f"{step}={seconds * 1000:.0f}ms" for step, seconds in timings.items()
+            )
+        )
+    return {**result, **labels} if labels else result
 
-    return url
 
+async def _generate(
+    masked_text: str,
+    prompt: str,
+    schema: Dict,
+    version: str,
+    allow_park: bool,
+    retrieval: Optional[asyncio.Task],
+    started: float,
+    timings: Dict[str, float],
+) -> Dict:
+    # Одинаковые после маскирования жалобы не оплачиваются повторно
+    cache_key = make_key(masked_text, version)
+    if settings.LLM_CACHE_ENABLED:
+        cached = await _timed(timings, "llm_cache", llm_cache.get(cache_key))
+        if cached:
+            _cancel_retrieval(retrieval)
+            return cached
 
-async def _call_llm(
-    prompt: str, input_text: str, client: httpx.AsyncClient
-) -> Optional[dict]:
-    full_prompt = f"{prompt}\n\nТекст:\n{input_text}"
-    payload = {
-        "inputs": full_prompt,
-        "parameters": {
-            "return_full_text": False,
-            "max_new_tokens": 300,
-            "temperature": 0.1,
-        },
-    }
-    # Внутри _call_llm, самая первая строка:
-    import re
-
-    raw_url = getattr(settings, "HF_API_URL", "").strip()
-    # Удаляем ВСЕ пробельные символы (включая \t, \n, \r)
-    settings.HF_API_URL = re.sub(r"\s+", "", raw_url)
-
-    # Нормализуем и валидируем URL
-    api_url = _normalize_hf_url(settings.HF_API_URL)
-    if not api_url:
-        print(
-            f"LLM Error: Неверный HF_API_URL='{settings.HF_API_URL}'. "
-            f"Ожидается: полный URL или model_id (напр. 'meta-llama/Meta-Llama-3.1-8B-Instruct')"
+    # Перефразированные жалобы: ответ ближайшего похожего тикета
+    if settings.SEMANTIC_CACHE_ENABLED:
+        similar = await _timed(
+            timings, "semantic_cache", _semantic_lookup(masked_text, version)
         )
-        return None
+        if similar:
+            _cancel_retrieval(retrieval)
+            result = {**similar, "manual_required": False}
+            if settings.LLM_CACHE_ENABLED:
+                await llm_cache.set(cache_key, result)
+            return result
 
-    headers = {"Authorization": f"Bearer {settings.HF_API_TOKEN}"}
+    context = await _await_context(retrieval, started) if retrieval else []
 
     try:
-        api_url = settings.HF_API_URL.strip().rstrip(
-            "/"
-        )  # убираем лишние пробелы/слеши
-        if not api_url.startswith("http"):
-            api_url = f"https://router.huggingface.co/hf-inference/models/{api_url}"
-        response = await client.post(
-            api_url, json=payload, headers=headers, timeout=30.0
+        result = await _timed(
+            timings,
+            "llm",
+            _call_llm(_with_context(prompt, context), masked_text, schema),
         )
-        response.raise_for_status()
-        result_text = response.json()[0]["generated_text"]
-        # Простой парсер JSON (без изменений)
-        start_idx = result_text.find("{")
-        end_idx = result_text.rfind("}") + 1
-        if start_idx != -1 and end_idx > start_idx:
-            return json.loads(result_text[start_idx:end_idx])
-        return None
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 410:
-            print(
-                "LLM Error: 410 Gone — эндпоинт устарел. Используйте router.huggingface.co"
-            )
-        elif e.response.status_code == 401:
-            print(
-                "LLM Error: 401 Unauthorized — проверьте HF_API_TOKEN и доступ к модели"
-            )
-        elif e.response.status_code == 404:
-            print(
-                f"LLM Error: 404 Not Found — модель '{settings.HF_API_URL}' не найдена"
+    except LLMUnavailableError as e:
+        if allow_park:
+            raise
+        return _manual_response(f"LLM недоступен: {e}")
+    if result:
+        result["manual_required"] = False
+        result["important"] = result.get("important", False)
+        if settings.LLM_CACHE_ENABLED:
+            await llm_cache.set(cache_key, result)
+        if settings.SEMANTIC_CACHE_ENABLED:
+            await _semantic_add(masked_text, result, version)
+        return result
+    else:
+        return _manual_response("Ошибка генерации ответа AI")
+
+
+async def _timed(timings: Dict[str, float], step: str, awaitable: Awaitable):
+    """Замер шага: в отчет тикета и в общую статистику задержек."""
+    step_started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        elapsed = time.perf_counter() - step_started
+        timings[step] = elapsed
+        ticket_latency.record(step, elapsed)
+
+
+def _cancel_retrieval(retrieval: Optional[asyncio.Task]):
+    """Ответ из кэша: контекст руководства не понадобится, поиск не нужен."""
+    if retrieval and not retrieval.done():
+        retrieval.cancel()
+
+
+async def _bounded_retrieve(
+    masked_text: str, device_name: Optional[str], timings: Dict[str, float]
+) -> List[str]:
+    async with _retrieval_slots:
+        return await _retrieve_context(masked_text, device_name, timings)
+
+
+async def _retrieve_context(
+    masked_text: str, device_name: Optional[str], timings: Dict[str, float]
+) -> List[str]:
+    """
+    Руководство и индекс прибора грузятся параллельно с эмбеддингом запроса.
+    С глобальным индексом: прибор из индекса - поиск с фильтром по нему,
+    прибор не распознан или руководства нет - поиск по всей базе.
+    """
+    use_global = settings.RAG_GLOBAL_INDEX and global_index.ready
+    try:
+        if device_name and not (use_global and global_index.has_device(device_name)):
+            loaded, query_emb = await asyncio.gather(
+                _load_manual_index(device_name, timings),
+                _timed(timings, "rag_embed", rag_engine.embed_query(masked_text)),
             )
+            if loaded is not None:
+                return await _timed(
+                    timings,
+                    "rag_search",
+                    rag_engine.search(loaded, query_emb, settings.RAG_TOP_K),
+                )
+            device_name = None
         else:
-            print(f"LLM Error: HTTP {e.response.status_code} — {e}")
-        return None
+            query_emb = await _timed(
+                timings, "rag_embed", rag_engine.embed_query(masked_text)
+            )
+
+        if not use_global:
+            return []
+        return await _timed(
+            timings,
+            "rag_search",
+            global_index.search(query_emb, settings.RAG_TOP_K, device_name),
+        )
     except Exception as e:
-        print(f"LLM Error: {e}")
-        return None
+        # Без руководства ответ все равно будет: ошибка поиска не роняет тикет
+        logger.exception(f"RAG error for {device_name}: {e}")
+        return []
 
 
-async def process_ticket_ai(masked_text: str, device_name: Optional[str]) -> Dict:
-    """
-    Главная точка входа.
-    Возвращает словарь с полями: summary, answer, sentiment, category, important, manual_required.
-    """
+async def _load_manual_index(device_name: str, timings: Dict[str, float]):
+    pdf_path = None
+    if not rag_engine.has_index(device_name):
+        pdf_path = await _timed(
+            timings, "fetch_pdf", find_and_download_pdf(device_name)
+        )
+        if not pdf_path:
+            return None
+    return await _timed(
+        timings, "rag_index", rag_engine.load_index(device_name, pdf_path)
+    )
 
-    if not settings.USE_MOCK_AI:
-        async with httpx.AsyncClient() as client:
-            # Логика RAG / Fetcher (упрощенно)
-            pass
 
-    # Генерация ответа
-    if settings.USE_MOCK_AI:
-        return mock_llm_call(masked_text)
+async def _await_context(retrieval: asyncio.Task, started: float) -> List[str]:
+    remaining = settings.RAG_LATENCY_BUDGET - (time.perf_counter() - started)
+    try:
+        # shield: по таймауту поиск не отменяется - скачанное руководство
+        # и построенный индекс пригодятся следующим тикетам
+        return await asyncio.wait_for(asyncio.shield(retrieval), max(remaining, 0))
+    except asyncio.TimeoutError:
+        ticket_latency.count("rag_timeout")
+        logger.warning("RAG missed latency budget, generating without context")
+        return []
 
-    async with httpx.AsyncClient() as client:
-        result = await _call_llm(PROMPT_GENERATE_ANSWER, masked_text, client)
-        if result:
-            result["manual_required"] = False
-            result["important"] = result.get("important", False)
-            return result
-        else:
-            return _manual_response("Ошибка генерации ответа AI")
+
+def _with_context(prompt: str, context: List[str]) -> str:
+    if not context:
+        return prompt
+    fragments, size = [], 0
+    for chunk in context:
+        if size + len(chunk) > settings.RAG_MAX_CONTEXT_CHARS:
+            break
+        fragments.append(f"- {chunk}")
+        size += len(chunk)
+    if not fragments:
+        return prompt
+    return (
+        f"{prompt}\nФрагменты руководства по эксплуатации прибора "
+        "(используй, если они относятся к проблеме):\n" + "\n".join(fragments)
+    )
+
+
+async def _semantic_lookup(masked_text: str, version: str) -> Optional[Dict]:
+    # Сбой кэша (нет модели, битый индекс) не должен ронять обработку тикета
+    try:
+        return await semantic_cache.lookup(masked_text, version)
+    except Exception as e:
+        logger.exception(f"Semantic cache lookup error: {e}")
+        return None
+
+
+async def _semantic_add(masked_text: str, result: Dict, version: str):
+    try:
+        await semantic_cache.add(masked_text, result, version)
+    except Exception as e:
+        logger.exception(f"Semantic cache add error: {e}")
 
 
 def mock_llm_call(masked_text: str) -> Dict:
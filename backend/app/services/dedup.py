@@ -0,0 +1,129 @@
+# app/services/dedup.py
+import hashlib
+import logging
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config import settings
+from app.db.repository import MessageRepository
+
+logger = logging.getLogger(__name__)
+
+_QUOTED_LINE_RE = re.compile(r"^\s*>.*$", re.MULTILINE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_body(body: str) -> str:
+    """Убирает цитаты, регистр и различия в пробелах."""
+    body = _QUOTED_LINE_RE.sub("", body)
+    return _WHITESPACE_RE.sub(" ", body).strip().lower()
+
+
+def body_hash(body: str, sender: str) -> str:
+    """Хэш нормализованного тела. Отправитель входит в ключ: одинаковые
+    короткие жалобы от разных людей - разные тикеты."""
+    key = f"{(sender or '').strip().lower()}\n{normalize_body(body)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class BloomFilter:
+    """Битовый Bloom-фильтр: "точно нет" без обращения к БД."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        # Double hashing (Kirsch-Mitzenmacher): k позиций из двух хэшей
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+
+class DedupIndex:
+    """
+    Индекс дубликатов перед NER и LLM. Ключи: заголовок Message-ID и хэш тела.
+    Bloom-фильтр отсекает заведомо новые письма без запроса в БД,
+    LRU помнит недавние ключи, БД (уникальные индексы) - источник истины.
+    Если фильтр не знает ключ (другая реплика, прогрев не охватил),
+    дубликат все равно поймает уникальный индекс при вставке.
+    Ключ запоминается только после сохранения тикета: письмо, которое упало
+    посреди конвейера, при повторной доставке не примут за дубликат.
+    Одинаковые письма в одном пакете проходят оба - второй отсечет вставка.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.bloom = BloomFilter(
+            settings.DEDUP_BLOOM_CAPACITY, settings.DEDUP_BLOOM_ERROR_RATE
+        )
+        self.recent: "OrderedDict[str, object]" = OrderedDict()
+        self.stats: Dict[str, int] = {"checked": 0, "duplicates": 0, "db_lookups": 0}
+
+    async def warm_up(self, repo: MessageRepository):
+        keys = await repo.get_dedup_keys(settings.DEDUP_WARMUP_LIMIT)
+        for row in keys:
+            for key in _keys(row["message_id"], row["body_hash"]):
+                self.bloom.add(key)
+        logger.info(f"Dedup index warmed up with {len(keys)} tickets")
+
+    async def find_duplicate(
+        self, repo: MessageRepository, message_id: Optional[str], body_hash: str
+    ) -> Optional[object]:
+        """Возвращает id сохраненного тикета, иначе None."""
+        self.stats["checked"] += 1
+        keys = _keys(message_id, body_hash)
+
+        for key in keys:
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                self.stats["duplicates"] += 1
+                return self.recent[key]
+
+        if not any(key in self.bloom for key in keys):
+            return None
+
+        self.stats["db_lookups"] += 1
+        ticket_id = await repo.find_duplicate(message_id, body_hash)
+        if ticket_id:
+            self.stats["duplicates"] += 1
+            self.remember(message_id, body_hash, ticket_id)
+        return ticket_id
+
+    def remember(self, message_id: Optional[str], body_hash: str, ticket_id: object):
+        """Вызывается после успешной вставки тикета."""
+        for key in _keys(message_id, body_hash):
+            self.bloom.add(key)
+            self.recent[key] = ticket_id
+            self.recent.move_to_end(key)
+        while len(self.recent) > settings.DEDUP_LRU_SIZE:
+            self.recent.popitem(last=False)
+
+
+def _keys(message_id: Optional[str], body_hash: Optional[str]):
+    keys = []
+    if message_id:
+        keys.append(f"mid:{message_id}")
+    if body_hash:
+        keys.append(f"hash:{body_hash}")
+    return keys
+
+
+# Синглтон
+dedup_index = DedupIndex()
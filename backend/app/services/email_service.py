@@ -2,26 +2,74 @@
 import asyncio
 import email
 import email.header
+import email.utils
 import imaplib
 import logging
 import re
 import smtplib
 import ssl
 from email.message import EmailMessage
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
 
 from app.config import settings
 from app.db.repository import MessageRepository
-from app.services.ai_processor import process_ticket_ai
-from app.services.parsing.ner_extractor import extract_entities
+from app.messaging.ingest_queue import IngestQueue, StreamEntry
+from app.messaging.retry_queue import retry_queue
+from app.services.ai_processor import process_ticket_ai, start_retrieval
+from app.services.dedup import body_hash, dedup_index
+from app.services.llm_dispatcher import LLMUnavailableError
+from app.services.parsing.ner_pool import ner_pool
 from app.services.parsing.utils import mask_pii, unmask_pii
+from app.services.pipeline import Stage, StagedPipeline
+from app.services.spam_filter import FILTER_HEADERS, spam_filter
+from app.services.ticket_classifier import ticket_classifier
 
 logger = logging.getLogger(__name__)
 
+_FETCH_UID_RE = re.compile(rb"\bUID (\d+)", re.IGNORECASE)
+_MESSAGE_ID_RE = re.compile(r"<[^<>\s]+>")
+
+
+def _compress_uid_set(uids: List[int]) -> str:
+    """[1, 2, 3, 5, 7, 8] -> "1:3,5,7:8" (sequence-set из RFC 3501)."""
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid == prev + 1:
+            prev = uid
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def _parse_fetch_response(data: list) -> List[Tuple[int, bytes]]:
+    """
+    Разбирает ответ imaplib на UID FETCH: [(b'1 (UID 5 BODY[]<0> {n}', raw), b')', ...].
+    UID может прийти как до литерала, так и после него.
+    """
+    messages = []
+    for i, item in enumerate(data):
+        if not isinstance(item, tuple):
+            continue
+        match = _FETCH_UID_RE.search(item[0])
+        if not match and i + 1 < len(data) and isinstance(data[i + 1], bytes):
+            match = _FETCH_UID_RE.search(data[i + 1])
+        if match:
+            messages.append((int(match.group(1)), item[1]))
+    return messages
+
 
 class EmailService:
-    def __init__(self, repo: MessageRepository):
+    def __init__(
+        self, repo: MessageRepository, ingest_queue: Optional[IngestQueue] = None
+    ):
         self.repo = repo
+        # Если задана очередь - письма уходят в Redis Stream, а не в обработку
+        self.ingest_queue = ingest_queue
 
         # IMAP Config
         self.imap_host = settings.IMAP_HOST
@@ -38,63 +86,155 @@ class EmailService:
 
     # --- IMAP FETCHING ---
 
-    async def fetch_new_emails(self) -> List[Dict]:
-        """Асинхронная обертка для синхронного IMAP."""
+    async def fetch_new_emails(
+        self, imap: Optional[imaplib.IMAP4] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Асинхронная обертка для синхронного IMAP.
+        Возвращает новые письма и чекпоинт, который нужно сохранить после обработки.
+        """
+        state = await self.repo.get_sync_state(self.mailbox)
         loop = asyncio.get_event_loop()
-        emails = await loop.run_in_executor(None, self._fetch_emails_sync)
-        return emails or []
+        emails, checkpoint = await loop.run_in_executor(
+            None, self._fetch_emails_sync, imap, state
+        )
+        return emails or [], checkpoint
+
+    def _connect_imap(self) -> imaplib.IMAP4:
+        """Открывает IMAP-сессию и логинится."""
+        if settings.IMAP_SSL:
+            imap = imaplib.IMAP4_SSL(
+                self.imap_host, self.imap_port, timeout=settings.IMAP_TIMEOUT
+            )
+        else:
+            imap = imaplib.IMAP4(
+                self.imap_host, self.imap_port, timeout=settings.IMAP_TIMEOUT
+            )
+        try:
+            imap.login(self.username, self.password)
+        except Exception:
+            imap.shutdown()
+            raise
+        return imap
+
+    def _fetch_emails_sync(
+        self, imap: Optional[imaplib.IMAP4] = None, state: Optional[Dict] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Синхронная логика работы с IMAP сервером.
+        Если передана уже открытая сессия (IDLE-режим) - работает в ней,
+        ошибки пробрасываются наверх, чтобы сессия была переподключена.
+        """
+        if imap is not None:
+            return self._fetch_from_imap(imap, state)
 
-    def _fetch_emails_sync(self) -> List[Dict]:
-        """Синхронная логика работы с IMAP сервером."""
         if not self.username or not self.password:
             logger.warning("IMAP credentials missing. Skipping fetch.")
-            return []
+            return [], None
 
         try:
-            with imaplib.IMAP4_SSL(self.imap_host, self.imap_port) as imap:
-                imap.login(self.username, self.password)
-                imap.select(self.mailbox)
-
-                status, messages = imap.search(None, "UNSEEN")
-                if status != "OK":
-                    return []
-
-                msg_ids = messages[0].split()
-                results = []
+            with self._connect_imap() as imap:
+                return self._fetch_from_imap(imap, state)
 
-                for msg_id in msg_ids:
-                    status, data = imap.fetch(msg_id, "(RFC822)")
-                    if status != "OK":
-                        continue
-
-                    raw_email = data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    body = self._get_email_body(msg)
-
-                    if not body:
-                        continue
+        except Exception as e:
+            logger.error(f"IMAP Connection Error: {e}")
+            return [], None
+
+    def _fetch_from_imap(
+        self, imap: imaplib.IMAP4, state: Optional[Dict]
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Инкрементальная синхронизация по UID (RFC 3501).
+        Источник истины - (UIDVALIDITY, last_uid) в Postgres, а не флаг \\Seen:
+        письма забираются пачками через UID FETCH по sequence-set,
+        BODY.PEEK не трогает флаги, \\Seen ставится одним STORE на пачку.
+        """
+        status, _ = imap.select(self.mailbox)
+        if status != "OK":
+            return [], None
+        _, validity_data = imap.response("UIDVALIDITY")
+        if not validity_data or validity_data[0] is None:
+            logger.warning("IMAP server did not report UIDVALIDITY")
+            return [], None
+        uid_validity = int(validity_data[0])
+
+        last_uid = 0
+        if state and state["uid_validity"] == uid_validity:
+            last_uid = state["last_uid"]
+
+        if last_uid:
+            status, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+        else:
+            # Первый запуск или сменился UIDVALIDITY - берем только непрочитанные
+            status, data = imap.uid("SEARCH", None, "UNSEEN")
+        if status != "OK":
+            return [], None
+
+        # "N:*" всегда возвращает последнее письмо, даже если его UID < N
+        uids = sorted(int(uid) for uid in data[0].split() if int(uid) > last_uid)
+        if not uids:
+            return [], None
+
+        results = []
+        fetched_uid = last_uid
+        batch_size = settings.IMAP_FETCH_BATCH_SIZE
+        for i in range(0, len(uids), batch_size):
+            batch = uids[i : i + batch_size]
+            uid_set = _compress_uid_set(batch)
+            status, data = imap.uid(
+                "FETCH",
+                uid_set,
+                f"(UID BODY.PEEK[]<0.{settings.IMAP_MAX_FETCH_BYTES}>)",
+            )
+            if status != "OK":
+                # Чекпоинт не должен перескочить незабранные письма:
+                # остаток заберем в следующем цикле
+                logger.warning(f"IMAP FETCH {uid_set} failed: {status} {data}")
+                break
+
+            for uid, raw_email in _parse_fetch_response(data):
+                parsed = self._parse_raw_email(raw_email)
+                if parsed:
+                    results.append({**parsed, "uid": uid})
+
+            # \Seen - только для людей, синхронизация от флага не зависит
+            imap.uid("STORE", uid_set, "+FLAGS.SILENT", "(\\Seen)")
+            fetched_uid = batch[-1]
+
+        if fetched_uid == last_uid:
+            return results, None
+        checkpoint = {
+            "mailbox": self.mailbox,
+            "uid_validity": uid_validity,
+            "last_uid": fetched_uid,
+        }
+        return results, checkpoint
 
-                    # Извлечение email отправителя
-                    from_header = msg.get("From", "")
-                    email_addr = ""
-                    if from_header:
-                        from_str = str(
-                            email.header.make_header(
-                                email.header.decode_header(from_header)
-                            )
-                        )
-                        email_match = re.search(r"<(.+?)>", from_str)
-                        email_addr = email_match.group(1) if email_match else from_str
+    def _parse_raw_email(self, raw_email: bytes) -> Optional[Dict]:
+        msg = email.message_from_bytes(raw_email)
+        body = self._get_email_body(msg)
 
-                    results.append({"body": body, "email_addr": email_addr})
-                    # Помечаем как прочитанное
-                    imap.store(msg_id, "+FLAGS", "\\Seen")
+        if not body:
+            return None
 
-                return results
+        # Извлечение email отправителя
+        from_header = msg.get("From", "")
+        email_addr = ""
+        if from_header:
+            from_str = str(
+                email.header.make_header(email.header.decode_header(from_header))
+            )
+            email_match = re.search(r"<(.+?)>", from_str)
+            email_addr = email_match.group(1) if email_match else from_str
 
-        except Exception as e:
-            logger.error(f"IMAP Connection Error: {e}")
-            return []
+        return {
+            "body": body,
+            "email_addr": email_addr,
+            "message_id": (msg.get("Message-ID") or "").strip() or None,
+            "in_reply_to": (msg.get("In-Reply-To") or "").strip() or None,
+            "references": _MESSAGE_ID_RE.findall(msg.get("References") or ""),
+            "headers": {h: str(msg[h]) for h in FILTER_HEADERS if msg[h] is not None},
+        }
 
     def _get_email_body(self, msg) -> str:
         if msg.is_multipart():
@@ -113,61 +253,217 @@ class EmailService:
 
     # --- MAIN PROCESSING ---
 
-    async def process_and_save_emails(self):
+    async def process_and_save_emails(self, imap: Optional[imaplib.IMAP4] = None):
         """Основной цикл. Работает в главном потоке (async)."""
-        emails = await self.fetch_new_emails()
-
-        if not emails:
-            return
-
-        loop = asyncio.get_event_loop()
-        from app.messaging.publisher import publish_new_ticket
+        emails, checkpoint = await self.fetch_new_emails(imap)
 
-        for email_data in emails:
-            try:
-                body = email_data["body"]
-                sender = email_data["email_addr"]
-
-                # 1. NLP (ТЯЖЕЛАЯ ЗАДАЧА) - выносим в поток, но ЖДЕМ результат
-                entities = await loop.run_in_executor(None, extract_entities, body)
-
-                # 2. Обработка (в главном потоке, безопасно для DB)
-                ticket = await self._process_single_email(body, sender, entities)
-
-                if ticket:
-                    # 3. Сохранение
-                    msg_id = await self.repo.create_ticket(ticket)
-                    logger.info(
-                        f"Ticket {msg_id} saved. Category: {ticket.get('category')}"
-                    )
-
-                    # 4. Публикация
-                    await publish_new_ticket(msg_id, ticket)
+        if emails:
+            if self.ingest_queue:
+                # Чекпоинт двигаем только после того, как письма надежно в очереди
+                await self.ingest_queue.push_many(emails)
+            else:
+                await self._process_emails(emails)
+
+        if checkpoint:
+            await self.repo.save_sync_state(**checkpoint)
+
+    async def process_queue_entries(self, entries: List[StreamEntry]) -> List[Dict]:
+        """Обрабатывает записи из Redis Stream. XACK делается в стадии persist."""
+        emails = [
+            {**email_data, "entry_id": entry_id} for entry_id, email_data in entries
+        ]
+        return await self._process_emails(emails)
+
+    async def _process_emails(self, emails: List[Dict]) -> List[Dict]:
+        """
+        Конвейер Dedup -> Thread -> Filter -> NER -> Mask -> AI -> Unmask ->
+        Persist -> Publish.
+        Сетевые стадии (AI, БД, Redis) работают параллельно,
+        CPU-тяжелый NER ограничен своим числом воркеров.
+        """
+        pipeline = StagedPipeline(
+            [
+                Stage("dedup", self._stage_dedup),
+                Stage("thread", self._stage_thread),
+                Stage("filter", self._stage_filter),
+                Stage(
+                    "ner",
+                    self._stage_ner,
+                    settings.PIPELINE_NER_CONCURRENCY,
+                    settings.NER_BATCH_SIZE,
+                ),
+                Stage("mask", self._stage_mask, settings.PIPELINE_MASK_CONCURRENCY),
+                Stage(
+                    "classify", self._stage_classify, settings.PIPELINE_MASK_CONCURRENCY
+                ),
+                Stage("ai", self._stage_ai, settings.PIPELINE_AI_CONCURRENCY),
+                Stage("unmask", self._stage_unmask, settings.PIPELINE_MASK_CONCURRENCY),
+                Stage(
+                    "persist",
+                    self._stage_persist,
+                    settings.PIPELINE_PERSIST_CONCURRENCY,
+                ),
+                Stage(
+                    "publish",
+                    self._stage_publish,
+                    settings.PIPELINE_PUBLISH_CONCURRENCY,
+                ),
+            ],
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+        )
+        items = (
+            {"body": e["body"], "sender": e["email_addr"], "source": e} for e in emails
+        )
+        return await pipeline.run(items)
 
-            except Exception as e:
-                logger.exception(f"Failed to process email: {e}")
+    # --- PIPELINE STAGES ---
+    # Каждая стадия получает и возвращает контекст письма (dict).
+    # Если ticket уже собран (например, спам), NER, Mask и AI-стадии его пропускают.
 
-    async def _process_single_email(
-        self, body: str, sender: str, entities: List[Dict]
-    ) -> Optional[Dict]:
-        """Пайплайн: Mask -> AI -> Unmask."""
+    async def _stage_dedup(self, item: Dict) -> Optional[Dict]:
+        """Отбрасывает повторы до NER и платного LLM."""
+        message_id = item["source"].get("message_id")
+        item["body_hash"] = body_hash(item["body"], item["sender"])
+        if not settings.DEDUP_ENABLED:
+            return item
 
-        mapped_data = self._map_entities_to_schema(entities, sender)
+        duplicate_of = await dedup_index.find_duplicate(
+            self.repo, message_id, item["body_hash"]
+        )
+        if duplicate_of:
+            logger.info(f"Duplicate email dropped (ticket {duplicate_of})")
+            await self._ack(item)
+            return None
+        return item
+
+    async def _stage_thread(self, item: Dict) -> Optional[Dict]:
+        """
+        Ответ в существующей переписке (In-Reply-To / References) не становится
+        новым тикетом: письмо добавляется в ticket_messages, тикет переоткрывается.
+        Повторная классификация - только по запросу (reclassify_ticket).
+        """
+        source = item["source"]
+        refs = [source.get("in_reply_to")] + list(source.get("references") or [])
+        refs = [ref for ref in refs if ref]
+        if not refs:
+            return item
+
+        ticket_id = await self.repo.find_ticket_by_message_ids(refs)
+        if not ticket_id:
+            return item
+
+        await self.repo.add_ticket_message(
+            ticket_id, "in", item["body"], item["sender"], source.get("message_id")
+        )
+        await self.repo.update_ticket(ticket_id, {"is_resolved": False})
+        logger.info(f"Follow-up attached to ticket {ticket_id}")
+        await self._ack(item)
+        return None
+
+    async def _stage_filter(self, item: Dict) -> Dict:
+        """Дешевый спам-фильтр: автоответы, рассылки и реклама не идут в NER и LLM."""
+        if not settings.SPAM_FILTER_ENABLED:
+            return item
+
+        reason = spam_filter.check(
+            item["body"], item["sender"], item["source"].get("headers")
+        )
+        if reason:
+            logger.info(f"Email rejected by spam filter: {reason}")
+            item["mapped"] = self._map_entities_to_schema([], item["sender"])
+            item["ticket"] = self._rejected_ticket(
+                item, reason, f"Автоматическая фильтрация: {reason}"
+            )
+        return item
+
+    async def _stage_ner(self, items: List[Dict]) -> List[Dict]:
+        # NLP (ТЯЖЕЛАЯ ЗАДАЧА) - пакетом в пул процессов (или потоков)
+        pending = [item for item in items if "ticket" not in item]
+        if pending:
+            batch = await ner_pool.extract_batch([item["body"] for item in pending])
+            for item, entities in zip(pending, batch):
+                item["entities"] = entities
+        return items
+
+    async def _stage_mask(self, item: Dict) -> Dict:
+        if "ticket" in item:
+            return item
+
+        body, entities = item["body"], item["entities"]
+        item["mapped"] = self._map_entities_to_schema(entities, item["sender"])
 
         if not self._is_relevant(entities, body):
-            return {
-                **mapped_data,
-                "original_message": body,
-                "is_relevant": False,
-                "category": "спам",
-                "summary": "Автоматическая фильтрация: не извлечены данные",
-                "is_important": False,
-                "manual_required": False,
-            }
-
-        masked_text, entity_map = mask_pii(body, entities)
-        ai_result = await process_ticket_ai(masked_text, mapped_data.get("device_type"))
+            item["ticket"] = self._rejected_ticket(
+                item, "no_key_info", "Автоматическая фильтрация: не извлечены данные"
+            )
+            return item
+
+        item["masked_text"], item["entity_map"] = mask_pii(body, entities)
+        # Прибор известен: руководство ищется, пока идут классификация и кэши
+        item["timings"] = {}
+        item["retrieval"] = start_retrieval(
+            item["masked_text"], item["mapped"].get("device_type"), item["timings"]
+        )
+        return item
 
+    def _rejected_ticket(self, item: Dict, reason: str, summary: str) -> Dict:
+        return {
+            **item["mapped"],
+            "original_message": item["body"],
+            "is_relevant": False,
+            "category": "спам",
+            "summary": summary,
+            "is_important": False,
+            "manual_required": False,
+            "filtered_by": reason,
+        }
+
+    async def _stage_classify(self, item: Dict) -> Dict:
+        """Метки локальным классификатором: LLM нужен только для ответа, спам - не нужен."""
+        if "ticket" in item or not settings.TICKET_CLASSIFIER_ENABLED:
+            return item
+
+        labels = ticket_classifier.classify(item["body"])
+        if labels and labels["category"] == "спам":
+            if item.get("retrieval"):
+                item["retrieval"].cancel()
+            item["ticket"] = self._rejected_ticket(
+                item, "ticket_classifier", "Автоматическая фильтрация: спам"
+            )
+        elif labels:
+            item["labels"] = labels
+        return item
+
+    async def _stage_ai(self, item: Dict) -> Optional[Dict]:
+        if "ticket" in item:
+            return item
+
+        # Письма из почты при падении LLM откладываются, а не уходят в ручную работу
+        source = item.get("source")
+        allow_park = bool(source) and (
+            source.get("llm_attempts", 0) < settings.LLM_RETRY_MAX_ATTEMPTS
+        )
+        try:
+            item["ai_result"] = await process_ticket_ai(
+                item["masked_text"],
+                item["mapped"].get("device_type"),
+                allow_park,
+                labels=item.get("labels"),
+                retrieval=item.get("retrieval"),
+                timings=item.get("timings"),
+            )
+        except LLMUnavailableError as e:
+            logger.warning(f"LLM unavailable ({e}). Parking email for retry")
+            await retry_queue.park(source)
+            await self._ack(item)
+            return None
+        return item
+
+    async def _stage_unmask(self, item: Dict) -> Dict:
+        if "ticket" in item:
+            return item
+
+        ai_result, entity_map = item["ai_result"], item["entity_map"]
         clean_summary = unmask_pii(ai_result.get("summary", ""), entity_map)
         clean_answer = (
             unmask_pii(ai_result.get("answer", ""), entity_map)
@@ -175,9 +471,9 @@ class EmailService:
             else None
         )
 
-        return {
-            **mapped_data,
-            "original_message": body,
+        item["ticket"] = {
+            **item["mapped"],
+            "original_message": item["body"],
             "summary": clean_summary,
             "llm_response": clean_answer,
             "sentiment": ai_result.get("sentiment"),
@@ -185,7 +481,85 @@ class EmailService:
             "is_important": ai_result.get("important", False),
             "manual_required": ai_result.get("manual_required", False),
             "is_relevant": True,
+            "classified_by": "ticket_classifier" if item.get("labels") else None,
         }
+        return item
+
+    async def _stage_persist(self, item: Dict) -> Optional[Dict]:
+        ticket = item["ticket"]
+        ticket["message_id"] = item["source"].get("message_id")
+        ticket["body_hash"] = item.get("body_hash")
+        try:
+            item["ticket_id"] = await self.repo.create_ticket(ticket)
+        except asyncpg.UniqueViolationError:
+            # Дубликат, который не поймал индекс (другая реплика, гонка)
+            logger.info("Duplicate email dropped on insert")
+            await self._ack(item)
+            return None
+
+        dedup_index.remember(
+            ticket["message_id"], ticket["body_hash"], item["ticket_id"]
+        )
+        logger.info(
+            f"Ticket {item['ticket_id']} saved. Category: {ticket.get('category')}"
+        )
+        # Ack-after-persist: до этой точки запись остается в PEL и будет переобработана
+        await self._ack(item)
+        return item
+
+    async def _stage_publish(self, item: Dict) -> Dict:
+        from app.messaging.publisher import publish_new_ticket
+
+        await publish_new_ticket(item["ticket_id"], item["ticket"])
+        return item
+
+    async def _ack(self, item: Dict):
+        entry_id = item["source"].get("entry_id")
+        if entry_id and self.ingest_queue:
+            await self.ingest_queue.ack(entry_id)
+
+    async def _process_single_email(
+        self, body: str, sender: str, entities: List[Dict]
+    ) -> Optional[Dict]:
+        """Пайплайн для одного письма: Mask -> AI -> Unmask."""
+        item = {"body": body, "sender": sender, "entities": entities}
+        item = await self._stage_mask(item)
+        item = await self._stage_ai(item)
+        item = await self._stage_unmask(item)
+        return item["ticket"]
+
+    async def reclassify_ticket(self, ticket_id) -> Optional[Dict]:
+        """
+        Повторный прогон NER + AI по тикету вместе с ответами клиента.
+        Возвращает обновленные поля или None, если тикета нет.
+        """
+        ticket = await self.repo.get_ticket(ticket_id)
+        if not ticket:
+            return None
+
+        messages = await self.repo.get_ticket_messages(ticket_id)
+        body = "\n\n".join(
+            [ticket["original_message"]]
+            + [m["body"] for m in messages if m["direction"] == "in" and m["body"]]
+        )
+
+        entities = await ner_pool.extract(body)
+        result = await self._process_single_email(body, ticket.get("email"), entities)
+
+        updates = {
+            key: result.get(key)
+            for key in (
+                "summary",
+                "llm_response",
+                "sentiment",
+                "category",
+                "is_important",
+                "manual_required",
+                "is_relevant",
+            )
+        }
+        await self.repo.update_ticket(ticket_id, updates)
+        return updates
 
     def _map_entities_to_schema(self, entities: List[Dict], sender_email: str) -> Dict:
         data = {
@@ -206,7 +580,8 @@ class EmailService:
             # Убрал блок elif etype == "EMAIL" ...
             # так как email уже определен из sender_email
             elif etype == "DEVICE":
-                if ent["text"] != ent["normal"]:
+                # Заводской номер: в тексте номер, normal - модель по каталогу
+                if ent.get("serial"):
                     data["device_num"] = ent["text"]
                     data["device_type"] = ent["normal"]
                 else:
@@ -221,15 +596,24 @@ class EmailService:
 
     # --- SMTP SENDING ---
 
-    async def send_reply(self, to_email: str, response_text: str):
-        """Асинхронная отправка письма."""
+    async def send_reply(
+        self, to_email: str, response_text: str, in_reply_to: Optional[str] = None
+    ) -> str:
+        """
+        Асинхронная отправка письма. Возвращает Message-ID отправленного письма,
+        по нему ответ клиента будет привязан к тикету.
+        """
         if not to_email:
             raise ValueError("No email")
 
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._send_email_sync, to_email, response_text)
+        return await loop.run_in_executor(
+            None, self._send_email_sync, to_email, response_text, in_reply_to
+        )
 
-    def _send_email_sync(self, to_email: str, response_text: str):
+    def _send_email_sync(
+        self, to_email: str, response_text: str, in_reply_to: Optional[str] = None
+    ) -> str:
         """Синхронная отправка через SMTP."""
         if not self.smtp_user or not self.smtp_password:
             logger.warning("SMTP credentials missing")
@@ -239,6 +623,12 @@ class EmailService:
         msg["Subject"] = "Re: Ваше обращение"
         msg["From"] = self.smtp_user
         msg["To"] = to_email
+        msg["Message-ID"] = email.utils.make_msgid(
+            domain=self.smtp_user.rpartition("@")[2] or None
+        )
+        if in_reply_to:
+            msg["In-Reply-To"] = in_reply_to
+            msg["References"] = in_reply_to
         msg.set_content(response_text)
 
         context = ssl.create_default_context()
@@ -255,6 +645,7 @@ class EmailService:
                     server.login(self.smtp_user, self.smtp_password)
                     server.send_message(msg)
             logger.info(f"Email sent to {to_email}")
+            return msg["Message-ID"]
         except Exception as e:
             logger.error(f"SMTP Error: {e}")
             raise
@@ -0,0 +1,215 @@
+# app/services/embedding_service.py
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.cache import MISSING, TTLCache
+from app.services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Эмбеддинги E5 с динамическим батчингом. Запросы параллельных тикетов
+    копятся до EMBEDDING_MAX_BATCH штук или EMBEDDING_BATCH_WINDOW секунд
+    и считаются одним encode, результаты раздаются ожидающим корутинам.
+    Фрагменты руководств (сборка индекса) идут порциями по
+    EMBEDDING_PASSAGE_BATCH и только когда нет запросов: сборка большого
+    индекса не задерживает поиск. Эмбеддинги запросов кэшируются.
+    encode выполняется в одном потоке за раз - модель на CPU и так
+    занимает все ядра.
+    """
+
+    def __init__(self, encoder: Optional[Callable[[List[str]], np.ndarray]] = None):
+        self._encoder = encoder
+        self._cache = TTLCache(
+            settings.EMBEDDING_CACHE_SIZE, settings.EMBEDDING_CACHE_TTL
+        )
+        # Ожидающие запросы: текст -> future (одинаковые тексты считаются один раз)
+        self._queries: Dict[str, asyncio.Future] = {}
+        self._first_query_at = 0.0
+        # Задания на фрагменты: тексты, future, сколько уже посчитано, результаты
+        self._passages: List[Tuple[List[str], asyncio.Future, int, List]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats_counters = {
+            "queries": 0,
+            "query_batches": 0,
+            "batched_queries": 0,
+            "passage_jobs": 0,
+            "passage_batches": 0,
+            "passages": 0,
+            "errors": 0,
+        }
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self._encoder:
+            vectors = self._encoder(texts)
+        else:
+            model = model_registry.get("embedding")
+            vectors = model.encode(texts, normalize_embeddings=True)
+        vectors = np.asarray(vectors, dtype="float32")
+        # Иначе часть ожидающих не получила бы ни вектора, ни ошибки
+        if len(vectors) != len(texts):
+            raise ValueError(
+                f"Encoder returned {len(vectors)} vectors for {len(texts)} texts"
+            )
+        return vectors
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker and not self._worker.done():
+            if self._worker.get_loop() is loop:
+                return
+            # Новый event loop: ожидания из прежнего цикла уже никто не разбудит
+            self._queries, self._passages = {}, []
+        self._wakeup = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Вектор запроса (E5: префикс "query: "). Не изменять - он в кэше."""
+        self.stats_counters["queries"] += 1
+        cached = self._cache.get(text)
+        if cached is not MISSING:
+            return cached
+
+        future = self._queries.get(text)
+        if future is None:
+            self._ensure_worker()
+            if not self._queries:
+                self._first_query_at = time.monotonic()
+            future = asyncio.get_running_loop().create_future()
+            self._queries[text] = future
+            if len(self._queries) >= settings.EMBEDDING_MAX_BATCH:
+                self._batch_full.set()
+            self._wakeup.set()
+        # shield: таймаут одного тикета не отменяет общий future батча
+        return await asyncio.shield(future)
+
+    async def embed_passages(self, texts: List[str]) -> np.ndarray:
+        """Векторы фрагментов документа (E5: префикс "passage: "), фоновый приоритет."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._passages.append((texts, future, 0, []))
+        self.stats_counters["passage_jobs"] += 1
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            if not self._queries and not self._passages:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            if self._queries:
+                await self._wait_for_batch()
+                await self._encode_queries()
+            elif self._passages:
+                await self._encode_passages()
+
+    async def _wait_for_batch(self):
+        """Окно набора батча отсчитывается от первого ожидающего запроса."""
+        remaining = settings.EMBEDDING_BATCH_WINDOW - (
+            time.monotonic() - self._first_query_at
+        )
+        if remaining <= 0 or len(self._queries) >= settings.EMBEDDING_MAX_BATCH:
+            return
+        self._batch_full.clear()
+        try:
+            await asyncio.wait_for(self._batch_full.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _encode_queries(self):
+        texts = list(self._queries)[: settings.EMBEDDING_MAX_BATCH]
+        futures = [self._queries.pop(text) for text in texts]
+        if self._queries:
+            self._first_query_at = time.monotonic()
+
+        try:
+            vectors = await asyncio.to_thread(
+                self._encode, [f"query: {text}" for text in texts]
+            )
+        except Exception as e:
+            logger.error(f"Query embedding failed: {e}")
+            self.stats_counters["errors"] += 1
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats_counters["query_batches"] += 1
+        self.stats_counters["batched_queries"] += len(texts)
+        for text, future, vector in zip(texts, futures, vectors):
+            vector = vector.reshape(1, -1)
+            vector.setflags(write=False)
+            self._cache.set(text, vector)
+            if not future.done():
+                future.set_result(vector)
+
+    async def _encode_passages(self):
+        texts, future, done, results = self._passages[0]
+        if future.done():
+            # Сборку отменили - дальше не считаем
+            self._passages.pop(0)
+            return
+
+        batch = texts[done : done + settings.EMBEDDING_PASSAGE_BATCH]
+        try:
+            vectors = await asyncio.to_thread(
+                self._encode, [f"passage: {text}" for text in batch]
+            )
+        except Exception as e:
+            logger.error(f"Passage embedding failed: {e}")
+            self.stats_counters["errors"] += 1
+            self._passages.pop(0)
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.stats_counters["passage_batches"] += 1
+        self.stats_counters["passages"] += len(batch)
+        results.append(vectors)
+        done += len(batch)
+        if done < len(texts):
+            self._passages[0] = (texts, future, done, results)
+            return
+
+        self._passages.pop(0)
+        if not future.done():
+            future.set_result(np.concatenate(results))
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        for future in [*self._queries.values(), *(job[1] for job in self._passages)]:
+            future.cancel()
+        self._queries, self._passages = {}, []
+
+    @property
+    def stats(self) -> Dict:
+        batches = self.stats_counters["query_batches"]
+        return {
+            **self.stats_counters,
+            "avg_query_batch": (
+                round(self.stats_counters["batched_queries"] / batches, 2)
+                if batches
+                else None
+            ),
+            "pending_queries": len(self._queries),
+            "pending_passage_jobs": len(self._passages),
+            "cache": self._cache.stats,
+        }
+
+
+# Синглтон
+embedding_service = EmbeddingService()
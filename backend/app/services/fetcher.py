@@ -8,6 +8,7 @@ import httpx
 from bs4 import BeautifulSoup
 
 from app.config import get_settings
+from app.services.cache import MISSING, TTLCache
 
 settings = get_settings()
 BASE_URL = "https://eriskip.com"
@@ -15,6 +16,9 @@ BASE_URL = "https://eriskip.com"
 # Блокировки для предотвращения "гонки" (race condition)
 download_locks = defaultdict(asyncio.Lock)
 
+# Приборы, руководства для которых на сайте нет: не ищем заново каждый тикет
+missing_manuals = TTLCache(settings.MANUAL_MISS_CACHE_SIZE, settings.MANUAL_MISS_TTL)
+
 
 def sanitize_filename(name: str) -> str:
     """Очистка имени файла от недопустимых символов."""
@@ -40,6 +44,8 @@ async def find_and_download_pdf(device_name: str) -> Optional[str]:
         if os.path.exists(filepath):
             print(f"Found cached PDF for {device_name}")
             return filepath
+        if missing_manuals.get(device_name) is not MISSING:
+            return None
 
         print(f"Searching online for {device_name}...")
 
@@ -57,6 +63,7 @@ async def find_and_download_pdf(device_name: str) -> Optional[str]:
 
                 if not product_link_tag:
                     print(f"Device {device_name} not found in search results.")
+                    missing_manuals.set(device_name, True)
                     return None
 
                 product_url = product_link_tag["href"]
@@ -86,6 +93,7 @@ async def find_and_download_pdf(device_name: str) -> Optional[str]:
 
                 if not pdf_link:
                     print(f"PDF manual link not found on page {product_url}")
+                    missing_manuals.set(device_name, True)
                     return None
 
                 if not pdf_link.startswith("http"):
@@ -0,0 +1,321 @@
+# app/services/global_index.py
+"""
+Единый векторный индекс по всем руководствам (HNSW или IVF) с метаданными
+фрагментов: прибор, документ, страница. Поиск по всей базе - приближенный,
+с фильтром по прибору - точный по его фрагментам.
+
+Сборка из DATA_DIR/knowledge_base/*.pdf и замер полноты/задержки
+относительно точного поиска (текущих Flat-индексов):
+    python -m app.services.global_index build
+    python -m app.services.global_index bench [--queries N] [--k K]
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from pypdf import PdfReader
+
+from app.config import settings
+from app.services.model_registry import model_registry
+from app.services.rag_engine import chunk_text, write_dir_atomic
+
+logger = logging.getLogger(__name__)
+
+# Векторов на кластер IVF, меньше - faiss предупреждает о плохом обучении
+_IVF_MIN_POINTS_PER_CENTROID = 39
+
+
+def _factory_string(index_type: str, total: int) -> str:
+    if index_type == "hnsw":
+        return f"HNSW{settings.RAG_HNSW_M},Flat"
+    if index_type == "ivf":
+        nlist = max(
+            1, min(settings.RAG_IVF_NLIST, total // _IVF_MIN_POINTS_PER_CENTROID)
+        )
+        return f"IVF{nlist},Flat"
+    if index_type == "flat":
+        return "Flat"
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+class GlobalVectorIndex:
+    """
+    Индекс всех фрагментов руководств. id вектора - номер фрагмента в chunks.
+    Фильтр по прибору: точный поиск среди его фрагментов (IDSelector) -
+    у одного прибора их немного, а ANN-граф при жестком фильтре теряет полноту.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.index: Optional[faiss.Index] = None
+        self.index_type: Optional[str] = None
+        self.chunks: List[Dict] = []
+        self._device_ids: Dict[str, np.ndarray] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None and self.index.ntotal > 0
+
+    def has_device(self, device_name: Optional[str]) -> bool:
+        return bool(device_name) and device_name in self._device_ids
+
+    def build(self, vectors: np.ndarray, chunks: List[Dict], index_type: str):
+        """vectors - нормализованные эмбеддинги фрагментов в порядке chunks."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        index = faiss.index_factory(
+            vectors.shape[1],
+            _factory_string(index_type, len(vectors)),
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        if index_type == "hnsw":
+            faiss.downcast_index(index).hnsw.efConstruction = (
+                settings.RAG_HNSW_EF_CONSTRUCTION
+            )
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        self._set(index, index_type, chunks)
+
+    def _set(self, index: faiss.Index, index_type: str, chunks: List[Dict]):
+        device_ids = defaultdict(list)
+        for chunk_id, chunk in enumerate(chunks):
+            device_ids[chunk["device"]].append(chunk_id)
+        self.index, self.index_type, self.chunks = index, index_type, chunks
+        self._device_ids = {
+            device: np.array(ids, dtype="int64") for device, ids in device_ids.items()
+        }
+
+    def search_sync(
+        self, query_emb: np.ndarray, top_k: int, device_name: Optional[str] = None
+    ) -> List[Dict]:
+        """Фрагменты с метаданными и близостью, лучшие первыми."""
+        query_emb = np.ascontiguousarray(query_emb, dtype="float32").reshape(1, -1)
+        if self.has_device(device_name):
+            scores, ids = self._search_device(query_emb, top_k, device_name)
+        else:
+            scores, ids = self.index.search(query_emb, top_k, params=self._ann_params())
+
+        return [
+            {**self.chunks[chunk_id], "id": int(chunk_id), "score": float(score)}
+            for score, chunk_id in zip(scores[0], ids[0])
+            if chunk_id != -1
+        ]
+
+    async def search(
+        self, query_emb: np.ndarray, top_k: int, device_name: Optional[str] = None
+    ) -> List[str]:
+        results = await asyncio.to_thread(
+            self.search_sync, query_emb, top_k, device_name
+        )
+        return [chunk["text"] for chunk in results]
+
+    def _ann_params(self) -> Optional[faiss.SearchParameters]:
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=settings.RAG_HNSW_EF_SEARCH)
+        if self.index_type == "ivf":
+            return faiss.SearchParametersIVF(nprobe=settings.RAG_IVF_NPROBE)
+        return None
+
+    def _search_device(self, query_emb: np.ndarray, top_k: int, device_name: str):
+        selector = faiss.IDSelectorBatch(self._device_ids[device_name])
+        if self.index_type == "hnsw":
+            # Граф не нужен: точный поиск по хранилищу векторов HNSW
+            storage = faiss.downcast_index(faiss.downcast_index(self.index).storage)
+            return storage.search(
+                query_emb, top_k, params=faiss.SearchParameters(sel=selector)
+            )
+        if self.index_type == "ivf":
+            nlist = faiss.extract_index_ivf(self.index).nlist
+            return self.index.search(
+                query_emb,
+                top_k,
+                params=faiss.SearchParametersIVF(sel=selector, nprobe=nlist),
+            )
+        return self.index.search(
+            query_emb, top_k, params=faiss.SearchParameters(sel=selector)
+        )
+
+    def vectors(self) -> np.ndarray:
+        """Все векторы индекса (для замера против точного поиска)."""
+        if self.index_type == "ivf":
+            faiss.extract_index_ivf(self.index).make_direct_map()
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    def save(self):
+        index, meta = self.index, {"type": self.index_type, "chunks": self.chunks}
+
+        def write(tmp_dir: str):
+            faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        write_dir_atomic(self.index_dir, write)
+
+    def load(self) -> bool:
+        index_file = os.path.join(self.index_dir, "index.faiss")
+        meta_file = os.path.join(self.index_dir, "meta.json")
+        if not (os.path.exists(index_file) and os.path.exists(meta_file)):
+            return False
+        index = faiss.read_index(index_file)
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+        self._set(index, meta["type"], meta["chunks"])
+        logger.info(
+            f"Global {self.index_type} index loaded: {index.ntotal} chunks, "
+            f"{len(self._device_ids)} devices"
+        )
+        return True
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "type": self.index_type,
+            "chunks": len(self.chunks),
+            "devices": len(self._device_ids),
+        }
+
+
+def load_manual_chunks(knowledge_dir: str) -> List[Dict]:
+    """Фрагменты всех PDF базы знаний. Имя файла - название прибора (как у fetcher)."""
+    chunks = []
+    for pdf_path in sorted(glob.glob(os.path.join(knowledge_dir, "*.pdf"))):
+        document = os.path.basename(pdf_path)
+        device = os.path.splitext(document)[0]
+        try:
+            pages = PdfReader(pdf_path).pages
+        except Exception as e:
+            logger.error(f"Failed to read {pdf_path}: {e}")
+            continue
+        for page_number, page in enumerate(pages, start=1):
+            for text in chunk_text(page.extract_text() or ""):
+                chunks.append(
+                    {
+                        "device": device,
+                        "document": document,
+                        "page": page_number,
+                        "text": text,
+                    }
+                )
+    return chunks
+
+
+def _percentiles_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+    }
+
+
+def benchmark(
+    index: GlobalVectorIndex, queries: np.ndarray, devices: List[str], k: int
+) -> Dict:
+    """
+    Полнота recall@k и задержка относительно точного поиска:
+    глобальный Flat для поиска по всей базе, Flat на прибор (как в RAGEngine)
+    для поиска с фильтром.
+    """
+    vectors = index.vectors()
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    device_flat = {}
+    for device, ids in index._device_ids.items():
+        device_flat[device] = faiss.IndexFlatIP(vectors.shape[1])
+        device_flat[device].add(vectors[ids])
+
+    report = {"type": index.index_type, "chunks": index.index.ntotal, "k": k}
+    for mode in ("global", "device"):
+        recalls, ann_times, flat_times = [], [], []
+        for query, device in zip(queries, devices):
+            query = query.reshape(1, -1)
+            started = time.perf_counter()
+            found = index.search_sync(query, k, device if mode == "device" else None)
+            ann_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            if mode == "device":
+                _, local = device_flat[device].search(query, k)
+                exact = index._device_ids[device][local[0][local[0] != -1]]
+            else:
+                _, exact = flat.search(query, k)
+                exact = exact[0]
+            flat_times.append(time.perf_counter() - started)
+
+            truth = set(exact.tolist())
+            hits = len({chunk["id"] for chunk in found} & truth)
+            recalls.append(hits / len(truth) if truth else 1.0)
+
+        report[mode] = {
+            "recall": round(sum(recalls) / len(recalls), 4),
+            "index": _percentiles_ms(ann_times),
+            "flat_baseline": _percentiles_ms(flat_times),
+        }
+    return report
+
+
+# Синглтон
+global_index = GlobalVectorIndex(settings.RAG_GLOBAL_INDEX_DIR)
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    model = model_registry.get("embedding")
+    return model.encode(texts, batch_size=32, normalize_embeddings=True)
+
+
+def _build_cli(index_type: str):
+    chunks = load_manual_chunks(os.path.join(settings.DATA_DIR, "knowledge_base"))
+    if not chunks:
+        print("No manuals found in knowledge_base")
+        return
+    # E5 требует префикс "passage: " для документов
+    vectors = _encode([f"passage: {chunk['text']}" for chunk in chunks])
+    global_index.build(vectors, chunks, index_type)
+    global_index.save()
+    print(json.dumps(global_index.stats, ensure_ascii=False))
+
+
+def _bench_cli(queries: int, k: int):
+    if not global_index.load():
+        print(f"Global index not found in {global_index.index_dir}")
+        return
+    # Запросы - сами фрагменты базы (E5: префикс "query: ")
+    sample = random.Random(0).sample(
+        global_index.chunks, min(queries, len(global_index.chunks))
+    )
+    query_vectors = _encode([f"query: {chunk['text']}" for chunk in sample])
+    report = benchmark(
+        global_index, query_vectors, [chunk["device"] for chunk in sample], k
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Глобальный индекс руководств")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Собрать индекс из knowledge_base")
+    build_parser.add_argument(
+        "--type",
+        default=settings.RAG_GLOBAL_INDEX_TYPE,
+        choices=["hnsw", "ivf", "flat"],
+    )
+    bench_parser = commands.add_parser("bench", help="Полнота и задержка против Flat")
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--k", type=int, default=settings.RAG_TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        _build_cli(args.type)
+    else:
+        _bench_cli(args.queries, args.k)
@@ -0,0 +1,133 @@
+# app/services/imap_idle.py
+import imaplib
+import logging
+import re
+import select
+import ssl
+import time
+from typing import Optional
+
+from app.services.email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+# "* 12 EXISTS" - сервер сообщает о новом количестве писем в ящике
+EXISTS_RE = re.compile(rb"^\* \d+ EXISTS", re.IGNORECASE)
+
+# Шаг ожидания в select: позволяет быстро выйти из IDLE после close()
+_WAIT_SLICE = 1.0
+
+
+class ImapIdleSession:
+    """
+    Долгоживущая IMAP-сессия в режиме IDLE (RFC 2177).
+    imaplib до Python 3.14 не умеет IDLE, поэтому команда отправляется вручную.
+    Все методы блокирующие - вызываются через run_in_executor.
+    """
+
+    def __init__(self, service: EmailService):
+        self.service = service
+        self.imap: Optional[imaplib.IMAP4] = None
+        self._closed = False
+
+    def connect(self):
+        self.imap = self.service._connect_imap()
+        self.imap.select(self.service.mailbox)
+
+    @property
+    def supports_idle(self) -> bool:
+        return self.imap is not None and "IDLE" in self.imap.capabilities
+
+    def idle(self, timeout: float) -> bool:
+        """
+        Ждет уведомления от сервера не дольше timeout секунд.
+        Возвращает True, если пришел EXISTS (появились новые письма).
+        """
+        imap = self.imap
+        if imap is None or self._closed:
+            raise imaplib.IMAP4.abort("IDLE session is not connected")
+
+        tag = imap._new_tag()
+        imap.send(tag + b" IDLE\r\n")
+
+        has_new = False
+        # Ждем continuation "+ idling"
+        while True:
+            line = self._readline()
+            if line.startswith(b"+"):
+                break
+            if line.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+            if EXISTS_RE.match(line):
+                has_new = True
+
+        deadline = time.monotonic() + timeout
+        while not has_new:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._wait_readable(remaining):
+                break
+            if EXISTS_RE.match(self._readline()):
+                has_new = True
+
+        # Завершаем IDLE и дочитываем ответ на нашу команду
+        imap.send(b"DONE\r\n")
+        while True:
+            line = self._readline()
+            if EXISTS_RE.match(line):
+                has_new = True
+            if line.startswith(tag):
+                if b" OK" not in line.upper():
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+                break
+
+        return has_new
+
+    def close(self):
+        self._closed = True
+        if self.imap is None:
+            return
+        try:
+            self.imap.shutdown()
+        except Exception:
+            pass
+        self.imap = None
+
+    def _readline(self) -> bytes:
+        line = self.imap.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("IMAP connection closed by server")
+        return line
+
+    def _buffered(self) -> bool:
+        """
+        Есть ли данные в буфере imaplib: EXISTS, пришедший одним пакетом
+        с "+ idling", уже прочитан из сокета, и select его не увидит.
+        """
+        sock = self.imap.sock
+        timeout = sock.gettimeout()
+        # Неблокирующий peek: при пустом буфере не ждет данных из сокета
+        sock.setblocking(False)
+        try:
+            return bool(self.imap.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _wait_readable(self, timeout: float) -> bool:
+        """Ждет данных в сокете с учетом буферов imaplib и SSL."""
+        deadline = time.monotonic() + timeout
+        while not self._closed:
+            if self._buffered():
+                return True
+            sock = self.imap.sock
+            pending = getattr(sock, "pending", None)
+            if pending and pending():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([sock], [], [], min(remaining, _WAIT_SLICE))
+            if readable:
+                return True
+        raise imaplib.IMAP4.abort("IDLE session closed")
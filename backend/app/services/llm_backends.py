@@ -0,0 +1,234 @@
+# app/services/llm_backends.py
+import abc
+import asyncio
+import json
+from typing import Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.services.llm_client import llm_client
+from app.services.llm_dispatcher import LLMUnavailableError, llm_dispatcher
+from app.services.model_registry import model_registry
+
+# JSON-схема ответа: локальная модель генерирует строго по ней (грамматика)
+ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentiment": {"type": "string", "enum": ["positive", "negative", "neutral"]},
+        "category": {
+            "type": "string",
+            "enum": [
+                "неисправность",
+                "калибровка",
+                "документация",
+                "консультация",
+                "спам",
+                "благодарность",
+            ],
+        },
+        "important": {"type": "boolean"},
+        "summary": {"type": "string"},
+        "answer": {"type": "string"},
+    },
+    "required": ["sentiment", "category", "important", "summary", "answer"],
+}
+
+# Метки поставил локальный классификатор: нужны только summary и answer
+ANSWER_ONLY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": ANSWER_SCHEMA["properties"]["summary"],
+        "answer": ANSWER_SCHEMA["properties"]["answer"],
+    },
+    "required": ["summary", "answer"],
+}
+
+
+def _extract_json(text: str) -> Optional[dict]:
+    """Первый JSON-объект в ответе модели (модели любят обрамлять его текстом)."""
+    start_idx = text.find("{")
+    end_idx = text.rfind("}") + 1
+    if start_idx != -1 and end_idx > start_idx:
+        return json.loads(text[start_idx:end_idx])
+    return None
+
+
+class LLMBackend(abc.ABC):
+    """
+    Интерфейс движка LLM. generate возвращает разобранный JSON-ответ или None
+    (ответ не получен - тикет уйдет в ручную обработку). LLMUnavailableError -
+    движок временно недоступен, письмо можно отложить. schema - JSON-схема
+    ответа, которого ждет промпт (по умолчанию ANSWER_SCHEMA).
+    """
+
+    name = "base"
+
+    async def start(self):
+        pass
+
+    @abc.abstractmethod
+    async def generate(
+        self, prompt: str, input_text: str, schema: Optional[Dict] = None
+    ) -> Optional[dict]:
+        """Ответ модели на prompt для input_text."""
+
+    async def close(self):
+        pass
+
+    @property
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+class HFInferenceBackend(LLMBackend):
+    """HF Inference API через общий HTTP-клиент и диспетчер (квота, повторы)."""
+
+    name = "hf"
+
+    async def start(self):
+        llm_client.start()
+
+    async def generate(
+        self, prompt: str, input_text: str, schema: Optional[Dict] = None
+    ) -> Optional[dict]:
+        # Формат ответа задан в самом промпте
+        full_prompt = f"{prompt}\n\nТекст:\n{input_text}"
+        payload = {
+            "inputs": full_prompt,
+            "parameters": {
+                "return_full_text": False,
+                "max_new_tokens": 300,
+                "temperature": 0.1,
+            },
+        }
+
+        try:
+            # Квота, повторы и circuit breaker - в диспетчере
+            response = await llm_dispatcher.call(payload)
+            return _extract_json(response.json()[0]["generated_text"])
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 410:
+                print(
+                    "LLM Error: 410 Gone — эндпоинт устарел. Используйте router.huggingface.co"
+                )
+            elif e.response.status_code == 401:
+                print(
+                    "LLM Error: 401 Unauthorized — проверьте HF_API_TOKEN и доступ к модели"
+                )
+            elif e.response.status_code == 404:
+                print(
+                    f"LLM Error: 404 Not Found — модель '{llm_client.api_url}' не найдена"
+                )
+            else:
+                print(f"LLM Error: HTTP {e.response.status_code} — {e}")
+            return None
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            print(f"LLM Error: {e}")
+            return None
+
+    async def close(self):
+        await llm_client.close()
+
+    @property
+    def stats(self) -> Dict:
+        return {"backend": self.name, **llm_dispatcher.stats}
+
+
+class LlamaCppBackend(LLMBackend):
+    """
+    Локальная GGUF-модель на CPU (llama.cpp). Модель загружается один раз
+    через model_registry и живет весь процесс. Контекст llama.cpp не
+    потокобезопасен: генерации идут по одной, очередь ожидания ограничена
+    LLM_LOCAL_QUEUE_SIZE (при переполнении - LLMUnavailableError, письмо
+    откладывается). Ответ ограничен JSON-грамматикой по схеме промпта;
+    грамматика собирается один раз на схему.
+    """
+
+    name = "llamacpp"
+
+    def __init__(self):
+        self._slot = asyncio.Semaphore(1)
+        self._waiting = 0
+        self._grammars: Dict[str, object] = {}
+        self.stats_counters = {"generated": 0, "rejected": 0, "failed": 0}
+
+    async def start(self):
+        await model_registry.prewarm(["gguf"])
+
+    @staticmethod
+    def _compile_grammar(schema_json: str):
+        from llama_cpp import LlamaGrammar
+
+        return LlamaGrammar.from_json_schema(schema_json)
+
+    def _grammar(self, schema: Dict):
+        # Порядок полей в грамматике - как в схеме, ключи не сортируем
+        schema_json = json.dumps(schema, ensure_ascii=False)
+        grammar = self._grammars.get(schema_json)
+        if grammar is None:
+            grammar = self._grammars[schema_json] = self._compile_grammar(schema_json)
+        return grammar
+
+    def _generate_sync(self, prompt: str, input_text: str, schema: Dict) -> str:
+        model = model_registry.get("gguf")
+        completion = model.create_chat_completion(
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": f"Текст:\n{input_text}"},
+            ],
+            grammar=self._grammar(schema),
+            max_tokens=settings.LLM_LOCAL_MAX_TOKENS,
+            temperature=0.1,
+        )
+        return completion["choices"][0]["message"]["content"]
+
+    async def generate(
+        self, prompt: str, input_text: str, schema: Optional[Dict] = None
+    ) -> Optional[dict]:
+        if self._waiting >= settings.LLM_LOCAL_QUEUE_SIZE:
+            self.stats_counters["rejected"] += 1
+            raise LLMUnavailableError("Local LLM queue is full")
+
+        self._waiting += 1
+        try:
+            await self._slot.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            text = await asyncio.to_thread(
+                self._generate_sync, prompt, input_text, schema or ANSWER_SCHEMA
+            )
+            result = _extract_json(text)
+        except Exception as e:
+            self.stats_counters["failed"] += 1
+            print(f"Local LLM Error: {e}")
+            return None
+        finally:
+            self._slot.release()
+
+        self.stats_counters["generated"] += 1
+        return result
+
+    @property
+    def stats(self) -> Dict:
+        return {"backend": self.name, "waiting": self._waiting, **self.stats_counters}
+
+
+BACKENDS = {
+    HFInferenceBackend.name: HFInferenceBackend,
+    LlamaCppBackend.name: LlamaCppBackend,
+}
+
+
+def create_backend(name: str) -> LLMBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}. Available: {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+# Синглтон
+llm_backend = create_backend(settings.LLM_BACKEND)
@@ -0,0 +1,120 @@
+# app/services/llm_cache.py
+import hashlib
+import json
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def make_key(masked_text: str, prompt_version: str) -> str:
+    """
+    Ключ по маскированному тексту: после mask_pii жалобы разных клиентов
+    часто совпадают дословно ("<NAME_1>, датчик ПГ ЭРИС-414 не работает").
+    """
+    normalized = _WHITESPACE_RE.sub(" ", masked_text).strip().casefold()
+    digest = hashlib.sha256(f"{prompt_version}\n{normalized}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Кэш ответов LLM по точному совпадению маскированного текста.
+    Фронт - LRU в памяти процесса, бэкенд - общий Redis (если включен),
+    у обоих TTL. В Redis число ключей ограничено LLM_CACHE_REDIS_MAX_ENTRIES:
+    индекс в sorted set, самые старые вытесняются при записи.
+    В кэше лежат ответы с плейсхолдерами, unmask_pii подставляет данные тикета.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.front = TTLCache(settings.LLM_CACHE_SIZE, settings.LLM_CACHE_TTL)
+        self._redis = redis_client
+        self.prefix = settings.LLM_CACHE_REDIS_PREFIX
+        self.stats_counters = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @property
+    def redis(self) -> Optional[redis.Redis]:
+        if self._redis is None and settings.LLM_CACHE_REDIS:
+            self._redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def get(self, key: str) -> Optional[Dict]:
+        value = self.front.get(key)
+        if value is not MISSING:
+            self.stats_counters["memory_hits"] += 1
+            return dict(value)
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(f"{self.prefix}{key}")
+            except RedisError as e:
+                logger.warning(f"LLM cache Redis read failed: {e}")
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self.front.set(key, value)
+                self.stats_counters["redis_hits"] += 1
+                return dict(value)
+
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict):
+        self.front.set(key, dict(value))
+        if self.redis is None:
+            return
+
+        index = f"{self.prefix}index"
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(
+                f"{self.prefix}{key}",
+                json.dumps(value, ensure_ascii=False),
+                ex=settings.LLM_CACHE_TTL or None,
+            )
+            pipe.zadd(index, {key: time.time()})
+            pipe.zcard(index)
+            *_, size = await pipe.execute()
+
+            overflow = size - settings.LLM_CACHE_REDIS_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await self.redis.zpopmin(index, overflow)
+                if evicted:
+                    await self.redis.delete(
+                        *(f"{self.prefix}{member}" for member, _ in evicted)
+                    )
+        except RedisError as e:
+            logger.warning(f"LLM cache Redis write failed: {e}")
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def clear(self):
+        self.front.clear()
+        self.stats_counters = {key: 0 for key in self.stats_counters}
+
+    @property
+    def stats(self) -> Dict:
+        hits = self.stats_counters["memory_hits"] + self.stats_counters["redis_hits"]
+        total = hits + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "memory_size": len(self.front),
+            "hit_rate": round(hits / total, 4) if total else None,
+        }
+
+
+# Синглтон
+llm_cache = LLMCache()
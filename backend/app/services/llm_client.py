@@ -0,0 +1,116 @@
+# app/services/llm_client.py
+import logging
+import re
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+HF_ROUTER_URL = "https://router.huggingface.co/hf-inference/models/"
+
+
+def _normalize_hf_url(url: str) -> Optional[str]:
+    """
+    Нормализует HF API URL: поддерживает старый/новый формат и просто model_id.
+    Возвращает None, если URL невалиден.
+    """
+    # Удаляем ВСЕ пробельные символы (включая \t, \n, \r)
+    url = re.sub(r"\s+", "", url or "")
+    if not url:
+        return None
+
+    # Если передан только model_id (например, "meta-llama/Meta-Llama-3.1-8B-Instruct")
+    if "/" in url and not url.startswith("http"):
+        return f"{HF_ROUTER_URL}{url}"
+
+    # Если старый формат api-inference.huggingface.co
+    if "api-inference.huggingface.co" in url and "/models/" in url:
+        model_id = url.split("/models/")[-1].split("?")[0].strip()
+        if model_id:
+            return f"{HF_ROUTER_URL}{model_id}"
+
+    # Проверяем, что URL имеет правильный протокол
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        return None
+
+    return url.rstrip("/")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClient:
+    """
+    Долгоживущий HTTP-клиент к LLM (keep-alive, HTTP/2, пул соединений).
+    Создается в lifespan: DNS, TCP и TLS оплачиваются один раз, а не на
+    каждый тикет. URL и заголовки вычисляются при старте.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.api_url: Optional[str] = None
+
+    def start(self):
+        if self._client:
+            return
+
+        self.api_url = _normalize_hf_url(settings.HF_API_URL)
+        if not self.api_url and not settings.USE_MOCK_AI:
+            logger.error(
+                f"Invalid HF_API_URL='{settings.HF_API_URL}'. Expected a full URL "
+                f"or a model_id (e.g. 'meta-llama/Meta-Llama-3.1-8B-Instruct')"
+            )
+
+        http2 = settings.LLM_HTTP2 and _http2_available()
+        if settings.LLM_HTTP2 and not http2:
+            logger.warning("Package 'h2' is not installed. LLM client uses HTTP/1.1")
+
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            headers={"Authorization": f"Bearer {settings.HF_API_TOKEN}"},
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.LLM_TIMEOUT,
+                connect=settings.LLM_CONNECT_TIMEOUT,
+                pool=settings.LLM_POOL_TIMEOUT,
+            ),
+        )
+        logger.info(f"LLM client started (http2={http2}, url={self.api_url})")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Вне lifespan (скрипты, тесты) клиент создается при первом запросе
+        if self._client is None:
+            self.start()
+        return self._client
+
+    async def post(self, payload: Dict) -> httpx.Response:
+        client = self.client
+        if not self.api_url:
+            raise ValueError(f"Invalid HF_API_URL='{settings.HF_API_URL}'")
+        response = await client.post(self.api_url, json=payload)
+        response.raise_for_status()
+        return response
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+# Синглтон
+llm_client = LLMClient()
@@ -0,0 +1,201 @@
+# app/services/llm_dispatcher.py
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+from app.services.llm_client import llm_client
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """LLM недоступен (circuit breaker открыт или повторы исчерпаны)."""
+
+
+class TokenBucket:
+    """Ограничение частоты запросов: rate токенов в секунду, запас burst."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    closed -> open после threshold ошибок подряд; через reset_timeout
+    half-open пропускает один пробный запрос: успех закрывает, ошибка открывает снова.
+    Пробный запрос отмечен номером: освободить его без исхода (отмена) может
+    только тот вызов, которому он достался.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Номер пробного запроса в полете (None - пробного нет)
+        self._trial: Optional[int] = None
+        self._trials = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Tuple[bool, Optional[int]]:
+        """(пропустить ли запрос, номер пробного запроса, если он достался вызову)."""
+        state = self.state
+        if state == "closed":
+            return True, None
+        if state == "half_open" and self._trial is None:
+            self._trials += 1
+            self._trial = self._trials
+            return True, self._trial
+        return False, None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+
+    def record_failure(self, trial: Optional[int] = None):
+        """Ошибка вызова из закрытого состояния не освобождает чужой пробный запрос."""
+        self.failures += 1
+        if trial is not None:
+            self.release_trial(trial)
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.error("LLM circuit breaker opened")
+            self.opened_at = time.monotonic()
+
+    def release_trial(self, trial: int):
+        """Пробный запрос trial завершился без исхода (отмена): пустить следующий."""
+        if self._trial == trial:
+            self._trial = None
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """Retry-After в секундах или HTTP-датой (RFC 9110)."""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class LLMDispatcher:
+    """
+    Единая точка вызова LLM: token bucket держит частоту в пределах квоты,
+    семафор - число запросов в полете, 429/5xx/таймауты повторяются с
+    экспоненциальной задержкой и jitter (Retry-After имеет приоритет).
+    При открытом circuit breaker вызов сразу падает с LLMUnavailableError,
+    и письмо откладывается в очередь повторов, а не уходит в ручную обработку.
+    """
+
+    def __init__(self):
+        self.bucket = TokenBucket(settings.LLM_RATE_LIMIT, settings.LLM_RATE_BURST)
+        self.semaphore = asyncio.Semaphore(settings.LLM_MAX_IN_FLIGHT)
+        self.breaker = CircuitBreaker(
+            settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET
+        )
+        self.stats_counters = {"calls": 0, "retries": 0, "rejected": 0, "failed": 0}
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, settings.LLM_BACKOFF_MAX)
+        # Full jitter: равномерно от 0 до base * 2^attempt
+        return random.uniform(
+            0, min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2**attempt)
+        )
+
+    async def call(self, payload: Dict) -> httpx.Response:
+        self.stats_counters["calls"] += 1
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            allowed, trial = self.breaker.allow()
+            if not allowed:
+                self.stats_counters["rejected"] += 1
+                raise LLMUnavailableError("LLM circuit breaker is open")
+
+            response = None
+            try:
+                await self.bucket.acquire()
+                async with self.semaphore:
+                    response = await llm_client.post(payload)
+                self.breaker.record_success()
+                return response
+            except httpx.HTTPStatusError as e:
+                response = e.response
+                if response.status_code not in RETRYABLE_STATUSES:
+                    # Ошибка запроса (401, 404...), эндпоинт при этом жив
+                    self.breaker.record_success()
+                    raise
+                error = f"HTTP {response.status_code}"
+                if response.status_code == 429:
+                    # Исчерпана квота, а не падение эндпоинта
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure(trial)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = f"{type(e).__name__}: {e}"
+                self.breaker.record_failure(trial)
+            finally:
+                # Иначе отмененный пробный запрос навсегда оставит breaker half-open
+                if trial is not None:
+                    self.breaker.release_trial(trial)
+
+            if attempt == settings.LLM_MAX_RETRIES:
+                break
+            delay = self._backoff(attempt, response)
+            self.stats_counters["retries"] += 1
+            logger.warning(f"LLM call failed ({error}). Retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self.stats_counters["failed"] += 1
+        raise LLMUnavailableError(f"LLM call failed after retries: {error}")
+
+    @property
+    def stats(self) -> Dict:
+        return {**self.stats_counters, "breaker": self.breaker.state}
+
+
+# Синглтон
+llm_dispatcher = LLMDispatcher()
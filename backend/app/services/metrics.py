@@ -0,0 +1,44 @@
+# app/services/metrics.py
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict
+
+
+class LatencyTracker:
+    """
+    Задержки шагов обработки тикета (скользящее окно последних замеров на шаг)
+    и счетчики событий (например, таймаутов).
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.clear()
+
+    def clear(self):
+        self._samples: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self.events: Counter = Counter()
+
+    def record(self, step: str, seconds: float):
+        self._samples[step].append(seconds)
+
+    def count(self, event: str):
+        self.events[event] += 1
+
+    @property
+    def stats(self) -> Dict:
+        steps = {}
+        for step, samples in self._samples.items():
+            ordered = sorted(samples)
+            steps[step] = {
+                "count": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return {"steps": steps, "events": dict(self.events)}
+
+
+# Синглтон
+ticket_latency = LatencyTracker()
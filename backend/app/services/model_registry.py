@@ -0,0 +1,150 @@
+# app/services/model_registry.py
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Единственный владелец тяжелых моделей (Natasha, pymorphy3, E5).
+    Модель загружается не более одного раза на процесс: лениво при первом
+    get() или заранее через prewarm() в lifespan. Библиотеки моделей
+    импортируются внутри загрузчиков, поэтому процессы без NER (бот)
+    их не тянут. Время загрузки каждой модели сохраняется в load_times.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        # Блокировка на модель: NER грузится из потоков пула параллельно
+        with self._locks[name]:
+            if name not in self._models:
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = round(time.perf_counter() - started, 3)
+                logger.info(f"Model '{name}' loaded in {self.load_times[name]}s")
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def prewarm_sync(self, names: Iterable[str]):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception:
+                # Не валим старт: модель попробует загрузиться лениво
+                logger.exception(f"Failed to prewarm model '{name}'")
+
+    async def prewarm(self, names: Iterable[str]):
+        """Загружает модели в потоке, не блокируя event loop."""
+        await asyncio.to_thread(self.prewarm_sync, list(names))
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_time": self.load_times.get(name),
+            }
+            for name in self._loaders
+        }
+
+
+# --- Загрузчики ---
+
+
+def _load_segmenter():
+    from natasha import Segmenter
+
+    return Segmenter()
+
+
+def _load_news_embedding():
+    from natasha import NewsEmbedding
+
+    return NewsEmbedding()
+
+
+def _load_ner_tagger():
+    from natasha import NewsNERTagger
+
+    tagger = NewsNERTagger(model_registry.get("news_embedding"))
+    tagger.batch_size = settings.NER_BATCH_SIZE
+    return tagger
+
+
+def _load_morph_vocab():
+    from natasha import MorphVocab
+
+    return MorphVocab()
+
+
+def _load_morph_analyzer():
+    import pymorphy3
+
+    return pymorphy3.MorphAnalyzer()
+
+
+def load_embedding_backend(backend: str):
+    """E5 на PyTorch (fp32) или ONNX int8 (см. app.services.onnx_embedding)."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
+    if backend == "onnx":
+        from app.services.onnx_embedding import OnnxEmbedder
+
+        return OnnxEmbedder.load(
+            settings.EMBEDDING_ONNX_DIR, settings.EMBEDDING_ONNX_THREADS
+        )
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def _load_embedding_model():
+    return load_embedding_backend(settings.EMBEDDING_BACKEND)
+
+
+def _load_gguf_model():
+    from llama_cpp import Llama
+
+    return Llama(
+        model_path=settings.LLM_LOCAL_MODEL_PATH,
+        n_ctx=settings.LLM_LOCAL_CTX,
+        n_threads=settings.LLM_LOCAL_THREADS,
+        verbose=False,
+    )
+
+
+# Модели, нужные для NER (прогреваются в воркерах NER-пула)
+NER_MODELS = ["segmenter", "news_embedding", "ner_tagger", "morph_vocab", "morph"]
+
+# Синглтон
+model_registry = ModelRegistry()
+model_registry.register("segmenter", _load_segmenter)
+model_registry.register("news_embedding", _load_news_embedding)
+model_registry.register("ner_tagger", _load_ner_tagger)
+model_registry.register("morph_vocab", _load_morph_vocab)
+model_registry.register("morph", _load_morph_analyzer)
+model_registry.register("embedding", _load_embedding_model)
+model_registry.register("gguf", _load_gguf_model)
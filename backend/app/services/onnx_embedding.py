@@ -0,0 +1,271 @@
+# app/services/onnx_embedding.py
+"""
+E5 через onnxruntime: экспорт в ONNX с динамическим int8-квантованием весов,
+без PyTorch в рабочем процессе (EMBEDDING_BACKEND=onnx).
+
+    python -m app.services.onnx_embedding export
+    python -m app.services.onnx_embedding parity [--texts N] [--k K]
+    python -m app.services.onnx_embedding bench --backend torch|onnx
+
+export и parity требуют torch/transformers (только на машине сборки),
+bench запускается отдельно для каждого движка: RSS процесса не смешивается.
+
+Совместимость индексов: размерность та же (768), векторы int8 близки к fp32.
+parity сравнивает косинус с fp32 и полноту поиска запросов int8 по векторам
+фрагментов fp32 (так работают уже собранные индексы). Если проверка не
+прошла - пересобрать индексы (см. README, «Движок эмбеддингов»).
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.rag_engine import write_dir_atomic
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+
+def _mean_pool(hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Пулинг E5: среднее по токенам без паддинга."""
+    mask = mask[..., None].astype("float32")
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class OnnxEmbedder:
+    """
+    Тот же интерфейс encode, что у SentenceTransformer: embedding_service
+    и CLI глобального индекса не знают, какой движок загружен.
+    """
+
+    def __init__(self, session, tokenizer, max_length: int):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self._input_names = {node.name for node in session.get_inputs()}
+
+    @classmethod
+    def load(cls, model_dir: str, threads: int) -> "OnnxEmbedder":
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(meta["max_length"])
+        tokenizer.enable_padding(pad_id=meta["pad_id"], pad_token=meta["pad_token"])
+        return cls(session, tokenizer, meta["max_length"])
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        # Батчи из текстов близкой длины: меньше паддинга на CPU
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            input_ids = np.array([e.ids for e in encodings], dtype="int64")
+            mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+            inputs = {"input_ids": input_ids, "attention_mask": mask}
+            if "token_type_ids" in self._input_names:
+                inputs["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, inputs)[0]
+            for i, vector in zip(batch, _mean_pool(hidden, mask)):
+                vectors[i] = vector
+
+        result = np.stack(vectors).astype("float32") if texts else np.empty((0, 0))
+        if normalize_embeddings and len(result):
+            result /= np.linalg.norm(result, axis=1, keepdims=True)
+        return result
+
+
+def export(model_dir: str, model_name: str, max_length: int):
+    """E5 из transformers -> ONNX fp32 -> динамическое int8-квантование весов."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["query: датчик не работает"], return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+
+    def write(tmp_dir: str):
+        fp32_path = os.path.join(tmp_dir, "model_fp32.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": dynamic,
+                    "attention_mask": dynamic,
+                    "last_hidden_state": dynamic,
+                },
+                opset_version=17,
+            )
+        quantize_dynamic(
+            fp32_path, os.path.join(tmp_dir, "model.onnx"), weight_type=QuantType.QInt8
+        )
+        os.remove(fp32_path)
+        tokenizer.backend_tokenizer.save(os.path.join(tmp_dir, "tokenizer.json"))
+        meta = {
+            "model": model_name,
+            "quantization": "int8-dynamic",
+            "dim": model.config.hidden_size,
+            "max_length": max_length,
+            "pad_id": tokenizer.pad_token_id,
+            "pad_token": tokenizer.pad_token,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    write_dir_atomic(model_dir, write)
+
+
+def parity_check(
+    reference: Encoder, candidate: Encoder, texts: List[str], k: int
+) -> Dict:
+    """
+    Косинус векторов candidate (int8) и reference (fp32) на одних текстах
+    и recall@k поиска: запросы candidate по фрагментам reference против
+    запросов reference по тем же фрагментам.
+    """
+    passages = [f"passage: {text}" for text in texts]
+    queries = [f"query: {text}" for text in texts]
+    ref_passages, ref_queries = reference(passages), reference(queries)
+    cand_passages, cand_queries = candidate(passages), candidate(queries)
+
+    cosines = np.concatenate(
+        [
+            np.sum(ref_passages * cand_passages, axis=1),
+            np.sum(ref_queries * cand_queries, axis=1),
+        ]
+    )
+    k = min(k, len(texts))
+    truth = np.argsort(-(ref_queries @ ref_passages.T), axis=1)[:, :k]
+    found = np.argsort(-(cand_queries @ ref_passages.T), axis=1)[:, :k]
+    recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+
+    report = {
+        "texts": len(texts),
+        "cosine_min": round(float(cosines.min()), 4),
+        "cosine_mean": round(float(cosines.mean()), 4),
+        f"index_recall@{k}": round(float(recall), 4),
+    }
+    report["passed"] = bool(
+        report["cosine_min"] >= settings.EMBEDDING_ONNX_MIN_COSINE
+        and recall >= settings.EMBEDDING_ONNX_MIN_RECALL
+    )
+    return report
+
+
+def _percentiles_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 2),
+    }
+
+
+def benchmark(encode: Encoder, texts: List[str], batch_size: int = 32) -> Dict:
+    """Задержка одного запроса (как тикет) и пропускная способность батчами."""
+    encode(texts[:1])  # прогрев
+    single = []
+    for text in texts:
+        started = time.perf_counter()
+        encode([f"query: {text}"])
+        single.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        encode([f"passage: {text}" for text in texts[start : start + batch_size]])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "texts": len(texts),
+        "query": _percentiles_ms(single),
+        "batch_texts_per_s": round(len(texts) / elapsed, 1),
+    }
+
+
+def _sample_texts(n: int) -> List[str]:
+    """Фрагменты руководств из базы знаний - тексты, которые реально кодируются."""
+    from app.services.global_index import load_manual_chunks
+
+    chunks = load_manual_chunks(os.path.join(settings.DATA_DIR, "knowledge_base"))
+    texts = [chunk["text"] for chunk in chunks]
+    return random.Random(0).sample(texts, min(n, len(texts)))
+
+
+def _encoder(backend: str) -> Encoder:
+    from app.services.model_registry import load_embedding_backend
+
+    model = load_embedding_backend(backend)
+    return lambda texts: model.encode(texts, normalize_embeddings=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX int8 E5")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="Экспорт и квантование в EMBEDDING_ONNX_DIR")
+    parity_parser = commands.add_parser("parity", help="Сравнение с fp32")
+    parity_parser.add_argument("--texts", type=int, default=200)
+    parity_parser.add_argument("--k", type=int, default=settings.RAG_TOP_K)
+    bench_parser = commands.add_parser(
+        "bench", help="Задержка, пропускная способность, RSS"
+    )
+    bench_parser.add_argument("--backend", default=settings.EMBEDDING_BACKEND)
+    bench_parser.add_argument("--texts", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(
+            settings.EMBEDDING_ONNX_DIR,
+            settings.EMBEDDING_MODEL_NAME,
+            settings.EMBEDDING_MAX_LENGTH,
+        )
+        print(f"Exported to {settings.EMBEDDING_ONNX_DIR}")
+    elif args.command == "parity":
+        report = parity_check(
+            _encoder("torch"), _encoder("onnx"), _sample_texts(args.texts), args.k
+        )
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        started = time.perf_counter()
+        encode = _encoder(args.backend)
+        load_time = time.perf_counter() - started
+        report = {
+            "backend": args.backend,
+            "load_s": round(load_time, 2),
+            **benchmark(encode, _sample_texts(args.texts)),
+            # ru_maxrss в Linux - в килобайтах
+            "max_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+        }
+        print(json.dumps(report, ensure_ascii=False, indent=2))
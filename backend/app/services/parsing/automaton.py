@@ -0,0 +1,138 @@
+# app/services/parsing/automaton.py
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+
+class KeywordMatch(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    value: object
+
+
+class KeywordAutomaton:
+    """
+    Автомат Ахо-Корасик: все вхождения любого числа ключевых слов за один
+    проход по тексту, O(len(text) + совпадения) вместо прохода на каждое слово.
+    Поиск без учета регистра, смещения совпадений - в исходном тексте.
+    value - произвольная метка ключа (тип, имя прибора).
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, object]] = None):
+        # Узел: переходы, suffix-ссылка, ключи, заканчивающиеся в узле
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self._values: Dict[str, object] = {}
+        self._built = True
+        for keyword, value in (keywords or {}).items():
+            self.add(keyword, value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, keyword: str, value: object = None):
+        keyword = fold_case(keyword)
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        if keyword not in self._out[node]:
+            self._out[node].append(keyword)
+        self._values[keyword] = value if value is not None else keyword
+        self._built = False
+
+    def build(self):
+        """Строит suffix-ссылки (BFS). Вызывается автоматически перед поиском."""
+        queue = deque()
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            queue.append(node)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Ключи suffix-узла тоже заканчиваются здесь
+                self._out[child] = self._out[child] + [
+                    kw
+                    for kw in self._out[self._fail[child]]
+                    if kw not in self._out[child]
+                ]
+        self._built = True
+
+    def find_all(
+        self, text: str, whole_words: bool = False, word_start: bool = False
+    ) -> List[KeywordMatch]:
+        """
+        Все вхождения (в том числе перекрывающиеся) в порядке окончания.
+        word_start - только с начала слова (ключи-основы: "скидк" без "оскидк").
+        """
+        if not self._built:
+            self.build()
+
+        matches = []
+        node = 0
+        lowered = fold_case(text)
+        for i, char in enumerate(lowered):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for keyword in self._out[node]:
+                start = i - len(keyword) + 1
+                if whole_words and not _is_word_bounded(lowered, start, i + 1):
+                    continue
+                if word_start and start > 0 and is_word_char(lowered[start - 1]):
+                    continue
+                matches.append(
+                    KeywordMatch(start, i + 1, keyword, self._values[keyword])
+                )
+        return matches
+
+    def find_longest(self, text: str, whole_words: bool = True) -> List[KeywordMatch]:
+        """Непересекающиеся вхождения: слева направо, при пересечении - самое длинное."""
+        matches = sorted(
+            self.find_all(text, whole_words), key=lambda m: (m.start, m.start - m.end)
+        )
+        result, pos = [], 0
+        for match in matches:
+            if match.start >= pos:
+                result.append(match)
+                pos = match.end
+        return result
+
+
+def fold_case(text: str) -> str:
+    """
+    lower() той же длины, что и text: у "İ" и подобных нижний регистр
+    длиннее, и смещения в исходном тексте съехали бы. Такие символы
+    остаются как есть.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(
+        low if len(low) == 1 else char for char, low in zip(text, map(str.lower, text))
+    )
+
+
+def is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _is_word_bounded(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not is_word_char(before) and not is_word_char(after)
@@ -0,0 +1,142 @@
+# app/services/parsing/device_catalog.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from app.config import settings
+
+from .automaton import KeywordAutomaton, is_word_char
+
+logger = logging.getLogger(__name__)
+
+
+class _CatalogState(NamedTuple):
+    names: KeywordAutomaton  # Имена и алиасы -> каноническое имя
+    serial_prefixes: KeywordAutomaton  # Префикс заводского номера -> имя
+    serial_length: int
+    mtime: float
+
+
+class DeviceCatalog:
+    """
+    Каталог приборов из JSON-файла (DEVICE_CATALOG_PATH), скомпилированный
+    в один автомат Ахо-Корасик по именам и алиасам. Один проход по тексту
+    находит все упоминания, стоимость не растет с размером каталога.
+    Файл перечитывается без рестарта при изменении mtime (проверка не чаще
+    DEVICE_CATALOG_RELOAD_INTERVAL секунд, в каждом процессе NER-пула своя).
+
+    Формат: {"serial_length": 9, "devices": [{"name": ..., "aliases": [...],
+    "serial_prefixes": [...]}]}
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.DEVICE_CATALOG_PATH
+        self._state: Optional[_CatalogState] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Читает и компилирует каталог. Текущий каталог заменяется целиком."""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        names = KeywordAutomaton()
+        serial_prefixes = KeywordAutomaton()
+        for device in data.get("devices", []):
+            name = device["name"]
+            for alias in [name] + list(device.get("aliases", [])):
+                names.add(alias, name)
+            for prefix in device.get("serial_prefixes", []):
+                serial_prefixes.add(str(prefix), name)
+        names.build()
+        serial_prefixes.build()
+
+        self._state = _CatalogState(
+            names=names,
+            serial_prefixes=serial_prefixes,
+            serial_length=int(data.get("serial_length", 9)),
+            mtime=mtime,
+        )
+        logger.info(
+            f"Device catalog loaded: {len(data.get('devices', []))} devices, "
+            f"{len(names)} names, {len(serial_prefixes)} serial prefixes"
+        )
+
+    def maybe_reload(self) -> bool:
+        """Перечитывает файл, если он изменился. Ошибка чтения не ломает старый каталог."""
+        now = time.monotonic()
+        if (
+            self._state
+            and now - self._last_check < settings.DEVICE_CATALOG_RELOAD_INTERVAL
+        ):
+            return False
+
+        with self._lock:
+            self._last_check = now
+            try:
+                if self._state and os.path.getmtime(self.path) == self._state.mtime:
+                    return False
+                self.load()
+                return True
+            except (OSError, ValueError, KeyError):
+                if self._state is None:
+                    raise
+                logger.exception("Device catalog reload failed. Keeping the old one.")
+                return False
+
+    @property
+    def state(self) -> _CatalogState:
+        self.maybe_reload()
+        return self._state
+
+    def find_devices(self, text: str) -> List[Dict]:
+        """Все упоминания моделей из каталога (по именам и алиасам)."""
+        return [
+            {
+                "type": "DEVICE",
+                "text": text[match.start : match.end],
+                "normal": match.value,
+                "start": match.start,
+                "end": match.end,
+            }
+            for match in self.state.names.find_longest(text, whole_words=True)
+        ]
+
+    def find_serials(self, text: str) -> List[Dict]:
+        """
+        Заводские номера, префикс которых есть в каталоге: префиксы ищутся
+        тем же автоматом с начала слова, на номер берется самый длинный.
+        """
+        state = self.state
+        longest: Dict[int, str] = {}
+        for match in state.serial_prefixes.find_all(text, word_start=True):
+            end = match.start + state.serial_length
+            number = text[match.start : end]
+            if (
+                len(number) != state.serial_length
+                or not number.isdecimal()
+                or (end < len(text) and is_word_char(text[end]))
+            ):
+                continue
+            # find_all отдает совпадения по окончанию: более длинный префикс позже
+            longest[match.start] = match.value
+
+        return [
+            {
+                "type": "DEVICE",
+                "text": text[start : start + state.serial_length],  # Номер в тексте
+                "normal": device,  # То, что это значит (имя прибора)
+                "serial": True,
+                "start": start,
+                "end": start + state.serial_length,
+            }
+            for start, device in sorted(longest.items())
+        ]
+
+
+# Синглтон
+device_catalog = DeviceCatalog()
@@ -0,0 +1,44 @@
+# app/services/parsing/morphology.py
+from typing import Dict, Iterable, Optional
+
+from app.config import settings
+from app.services.cache import MISSING, TTLCache
+from app.services.model_registry import model_registry
+
+# Фамилии и имена клиентов повторяются постоянно - разбор кэшируем
+_parse_cache = TTLCache(settings.MORPH_CACHE_SIZE, settings.MORPH_CACHE_TTL)
+_inflect_cache = TTLCache(settings.MORPH_CACHE_SIZE, settings.MORPH_CACHE_TTL)
+
+
+def parse(word: str):
+    """Наиболее вероятный разбор слова (pymorphy3 Parse)."""
+    parsed = _parse_cache.get(word)
+    if parsed is MISSING:
+        # Один анализатор на процесс (словари pymorphy3 занимают десятки МБ)
+        parsed = model_registry.get("morph").parse(word)[0]
+        _parse_cache.set(word, parsed)
+    return parsed
+
+
+def inflect(word: str, grammemes: Iterable[str]) -> Optional[str]:
+    """Слово в нужной форме или None, если pymorphy3 не смог просклонять."""
+    key: tuple = (word, frozenset(grammemes))
+    inflected = _inflect_cache.get(key)
+    if inflected is MISSING:
+        form = parse(word).inflect(set(key[1]))
+        inflected = form.word if form else None
+        _inflect_cache.set(key, inflected)
+    return inflected
+
+
+def detect_gender(word: str) -> str:
+    return "femn" if "femn" in parse(word).tag else "masc"
+
+
+def cache_stats() -> Dict[str, Dict]:
+    return {"parse": _parse_cache.stats, "inflect": _inflect_cache.stats}
+
+
+def clear_cache():
+    _parse_cache.clear()
+    _inflect_cache.clear()
@@ -1,27 +1,125 @@
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import pymorphy3
-from natasha import Doc, MorphVocab, NewsEmbedding, NewsNERTagger, Segmenter
+from app.services.model_registry import model_registry
 
+from .device_catalog import device_catalog
+from .morphology import detect_gender
 from .serial_parser import extract_device_from_serial
 
-# Инициализация (один раз при старте)
-segmenter = Segmenter()
-emb = NewsEmbedding()
-ner_tagger = NewsNERTagger(emb)
-morph_vocab = MorphVocab()
-morph_analyzer = pymorphy3.MorphAnalyzer()
+# Регулярки компилируются один раз и общие для всех текстов
+# Общий шаблон названия прибора (если модели нет в каталоге)
+DEVICE_PATTERN = re.compile(r"\b([А-ЯA-Z]{2,4}(?:\s*ЭРИС)?-\d{2,4}(?:-\d)?)\b")
+EMAIL_PATTERN = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
+PHONE_PATTERN = re.compile(
+    r"(?:\+7|8)[\s\-]?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}"
+)
+NON_DIGIT_PATTERN = re.compile(r"[^\d]")
 
 
 def extract_entities(text: str) -> List[Dict]:
+    return extract_entities_batch([text])[0]
+
+
+def extract_entities_batch(texts: List[str]) -> List[List[Dict]]:
+    """
+    Пакетное извлечение сущностей. NER-теггер прогоняет тексты пачками
+    по NER_BATCH_SIZE вместо отдельного вызова на каждый документ.
+    Каждая сущность содержит смещения start/end в исходном тексте.
+    """
+    non_empty = [text for text in texts if text.strip()]
+    markups = (
+        iter(model_registry.get("ner_tagger").map(non_empty)) if non_empty else iter([])
+    )
+
+    results = []
+    for text in texts:
+        markup = next(markups) if text.strip() else None
+        results.append(_collect_entities(text, markup))
+    return results
+
+
+def _collect_entities(text: str, markup) -> List[Dict]:
     entities = []
 
     # --- 1. Natasha NER (ФИО) ---
-    doc = Doc(text)
-    doc.segment(segmenter)
-    doc.tag_ner(ner_tagger)
+    entities.extend(_extract_names(text, markup))
+
+    # --- 2. Приборы (DEVICE): каталог, regex - для моделей вне каталога ---
+    devices = device_catalog.find_devices(text)
+    if not devices:
+        for match in DEVICE_PATTERN.finditer(text):
+            devices.append(
+                {
+                    "type": "DEVICE",
+                    "text": match.group(1),
+                    "normal": match.group(1),
+                    "start": match.start(1),
+                    "end": match.end(1),
+                }
+            )
+    entities.extend(devices)
+
+    # --- 3. Телефоны и Email ---
+    for match in EMAIL_PATTERN.finditer(text):
+        entities.append(
+            {
+                "type": "EMAIL",
+                "text": match.group(0),
+                "normal": match.group(0),
+                "start": match.start(),
+                "end": match.end(),
+            }
+        )
+
+    for match in PHONE_PATTERN.finditer(text):
+        raw_phone = match.group(0)
+        # ИСПРАВЛЕНИЕ: Очищаем номер от всего, кроме цифр
+        clean_phone = NON_DIGIT_PATTERN.sub("", raw_phone)
+
+        entities.append(
+            {
+                "type": "PHONE",
+                "text": raw_phone,
+                "normal": clean_phone,
+                "start": match.start(),
+                "end": match.end(),
+            }
+        )
+
+    # --- 4. Fallback: Serial -> Device ---
+    has_device = any(e["type"] == "DEVICE" for e in entities)
+
+    if not has_device:
+        serial_entity = extract_device_from_serial(text)
+        if serial_entity:
+            entities.append(serial_entity)
+
+    return entities
+
 
+def _extract_names(text: str, markup: Optional[object]) -> List[Dict]:
+    if markup is None:
+        return []
+    # Без имен сегментация и нормализация не нужны
+    per_spans = [span for span in markup.spans if span.type == "PER"]
+    if not per_spans:
+        return []
+
+    from natasha import Doc
+    from natasha.doc import DocSpan
+
+    # Doc нужен только для нормализации имен: спаны берем из пакетного markup
+    doc = Doc(text)
+    doc.segment(model_registry.get("segmenter"))
+    doc.spans = [
+        DocSpan(span.start, span.stop, span.type, text[span.start : span.stop])
+        for span in per_spans
+    ]
+    doc.envelop_span_tokens()
+
+    morph_vocab = model_registry.get("morph_vocab")
+    names = []
     found_names = set()
 
     for span in doc.spans:
@@ -31,51 +129,18 @@ def extract_entities(text: str) -> List[Dict]:
 
             if name not in found_names:
                 # Определяем пол
-                parsed = morph_analyzer.parse(name.split()[0])[0]
-                gender = "femn" if "femn" in parsed.tag else "masc"
+                gender = detect_gender(name.split()[0])
 
-                entities.append(
+                names.append(
                     {
                         "type": "NAME",
                         "text": span.text,
                         "normal": name,
                         "gender": gender,
+                        "start": span.start,
+                        "end": span.stop,
                     }
                 )
                 found_names.add(name)
 
-    # --- 2. Regex для Приборов (DEVICE) ---
-    # Ищем явные названия
-    device_pattern = re.compile(r"\b([А-ЯA-Z]{2,4}(?:\s*ЭРИС)?-\d{2,4}(?:-\d)?)\b")
-
-    for match in device_pattern.finditer(text):
-        entities.append(
-            {"type": "DEVICE", "text": match.group(1), "normal": match.group(1)}
-        )
-
-    # --- 3. Телефоны и Email ---
-    email_pattern = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
-    for match in email_pattern.finditer(text):
-        entities.append(
-            {"type": "EMAIL", "text": match.group(0), "normal": match.group(0)}
-        )
-
-    phone_pattern = re.compile(
-        r"(?:\+7|8)[\s\-]?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}"
-    )
-    for match in phone_pattern.finditer(text):
-        raw_phone = match.group(0)
-        # ИСПРАВЛЕНИЕ: Очищаем номер от всего, кроме цифр
-        clean_phone = re.sub(r"[^\d]", "", raw_phone)
-
-        entities.append({"type": "PHONE", "text": raw_phone, "normal": clean_phone})
-
-    # --- 4. Fallback: Serial -> Device ---
-    has_device = any(e["type"] == "DEVICE" for e in entities)
-
-    if not has_device:
-        serial_entity = extract_device_from_serial(text)
-        if serial_entity:
-            entities.append(serial_entity)
-
-    return entities
+    return names
@@ -0,0 +1,160 @@
+# app/services/parsing/ner_pool.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.model_registry import NER_MODELS, model_registry
+from app.services.parsing.ner_extractor import (
+    extract_entities,
+    extract_entities_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    """Инициализатор процесса: модели Natasha загружаются один раз на процесс."""
+    model_registry.prewarm_sync(NER_MODELS)
+
+    logger.info(f"NER worker {os.getpid()} ready")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class NerProcessPool:
+    """
+    Пул процессов для CPU-тяжелого NER (Natasha + pymorphy3).
+    В пуле потоков NER упирается в GIL и мешает IMAP/SMTP, в процессах -
+    масштабируется по ядрам. Воркеры пересоздаются каждые
+    NER_POOL_MAX_TASKS_PER_CHILD задач, упавший пул перезапускается.
+    При NER_POOL_WORKERS = 0 NER выполняется в пуле потоков, как раньше.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restart_lock = threading.Lock()
+        self._in_flight = 0
+        self._last_completed = time.monotonic()
+        self.restarts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(
+        self, workers: Optional[int] = None, max_tasks_per_child: Optional[int] = None
+    ):
+        self.workers = workers or settings.NER_POOL_WORKERS
+        self.max_tasks_per_child = (
+            max_tasks_per_child or settings.NER_POOL_MAX_TASKS_PER_CHILD
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # spawn: fork процесса с asyncio-циклом и потоками небезопасен
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+        logger.info(f"NER process pool started with {self.workers} workers")
+
+    async def warm_up(self):
+        """Поднимает все процессы заранее, чтобы модели загрузились до первого письма."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _ping) for _ in range(self.workers))
+        )
+
+    async def extract(self, text: str) -> List[Dict]:
+        if not self.enabled:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, extract_entities, text)
+        return await self._run(extract_entities, text)
+
+    async def extract_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """Пакет целиком уходит в один процесс: одна пересылка и один прогон теггера."""
+        if not self.enabled:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, extract_entities_batch, texts)
+        return await self._run(extract_entities_batch, texts)
+
+    async def _run(self, func: Callable, *args):
+        # Пул, в который ушла задача: его сбой не должен ронять уже новый пул
+        executor = self._executor
+        self._in_flight += 1
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(
+                executor, func, *args
+            )
+        except BrokenProcessPool:
+            logger.error("NER process pool is broken. Restarting.")
+            self._restart(executor)
+            raise
+        finally:
+            self._in_flight -= 1
+        self._last_completed = time.monotonic()
+        return result
+
+    async def health_check(self) -> bool:
+        """
+        Проверяет, что пул отвечает. Упавший пул перезапускается, зависшим
+        считается только тот, где при задачах в работе ни одна не завершилась
+        за NER_POOL_HANG_TIMEOUT: ping стоит в той же очереди, что и пакеты.
+        """
+        if not self.enabled:
+            return True
+        executor = self._executor
+        loop = asyncio.get_event_loop()
+        try:
+            await asyncio.wait_for(
+                loop.run_in_executor(executor, _ping),
+                timeout=settings.NER_POOL_HEALTH_TIMEOUT,
+            )
+            return True
+        except asyncio.TimeoutError:
+            idle = time.monotonic() - self._last_completed
+            if self._in_flight and idle < settings.NER_POOL_HANG_TIMEOUT:
+                logger.info("NER process pool is busy, health ping delayed")
+                return True
+            logger.error("NER process pool is not responding. Restarting.")
+        except BrokenProcessPool:
+            logger.error("NER process pool health check failed. Restarting.")
+        self._restart(executor)
+        return False
+
+    async def health_loop(self):
+        while True:
+            await asyncio.sleep(settings.NER_POOL_HEALTH_INTERVAL)
+            await self.health_check()
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, failed: Optional[ProcessPoolExecutor]):
+        """Перезапуск после сбоя failed; если пул уже заменен - ничего не делает."""
+        with self._restart_lock:
+            if failed is None or failed is not self._executor:
+                return
+            self.start(self.workers, self.max_tasks_per_child)
+            self._last_completed = time.monotonic()
+            self.restarts += 1
+        # Зависшие процессы старого пула нужно добить явно
+        for process in list((failed._processes or {}).values()):
+            process.terminate()
+        failed.shutdown(wait=False, cancel_futures=True)
+
+
+# Синглтон
+ner_pool = NerProcessPool()
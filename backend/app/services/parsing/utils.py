@@ -1,10 +1,7 @@
 import re
 from typing import Dict, List, Tuple
 
-import pymorphy3
-
-morph = pymorphy3.MorphAnalyzer()
-
+from .morphology import inflect
 
 # Маппинг тегов падежей от LLM -> теги Pymorphy
 CASE_MAP = {
@@ -27,60 +24,94 @@ def inflect_name(name_normal: str, case_tag: str, gender: str) -> str:
     inflected_parts = []
 
     for part in parts:
-        parsed = morph.parse(part)[0]
-        inflected = parsed.inflect({py_case})
+        inflected = inflect(part, {py_case})
         if inflected:
-            inflected_parts.append(inflected.word.capitalize())
+            inflected_parts.append(inflected.capitalize())
         else:
             inflected_parts.append(part)
 
     return " ".join(inflected_parts)
 
 
+# Паттерн плейсхолдера: <TYPE_ID> или <TYPE_ID_CASE>
+PLACEHOLDER_PATTERN = re.compile(r"<(NAME|DEVICE|PHONE|EMAIL)_(\d+)(?:_([A-Z]+))?>")
+
+# Типы, которые заменяются плейсхолдерами
+MASKED_TYPES = ("NAME", "PHONE", "EMAIL")
+
+
 def mask_pii(text: str, entities: List[Dict]) -> Tuple[str, Dict[str, Dict]]:
+    """
+    Маскирует сущности за один проход слева направо по смещениям start/end.
+    Сущности без смещений и повторные упоминания (NER отдает имя один раз)
+    ищутся одной общей регуляркой по границам слов. Одинаковые (type, normal)
+    получают общий плейсхолдер.
+    """
     entity_map = {}
-    masked_text = text
+    placeholders: Dict[Tuple[str, str], str] = {}
+    counters = {ent_type: 0 for ent_type in MASKED_TYPES}
 
-    counters = {"NAME": 0, "PHONE": 0, "EMAIL": 0}
-    # DEVICE не считаем отдельно, обрабатываем спец-логикой
+    # Текст сущности -> на что заменить
+    replacements: Dict[str, str] = {}
+    spans: List[Tuple[int, int, str]] = []
 
-    sorted_entities = sorted(entities, key=lambda x: len(x["text"]), reverse=True)
-
-    for ent in sorted_entities:
+    for ent in entities:
         ent_type = ent["type"]
+        normal = ent.get("normal", ent["text"])
 
         if ent_type in counters:
-            # Стандартная логика маскирования (NAME, PHONE, EMAIL)
-            counters[ent_type] += 1
-            idx = counters[ent_type]
-            placeholder_name = f"{ent_type}_{idx}"
-            placeholder = f"<{placeholder_name}>"
-
-            entity_map[placeholder_name] = {
-                "type": ent_type,
-                "text": ent["text"],
-                "normal": ent.get("normal", ent["text"]),
-                "gender": ent.get("gender", "masc"),
-            }
-            masked_text = masked_text.replace(ent["text"], placeholder)
-
-        elif ent_type == "DEVICE":
-            # Логика для приборов:
-            # Если text (номер) != normal (имя), значит это Smart Extraction.
-            # Заменяем номер на имя прибора (обогащение текста).
-            if ent["text"] != ent["normal"]:
-                masked_text = masked_text.replace(ent["text"], ent["normal"])
+            key = (ent_type, normal)
+            if key not in placeholders:
+                counters[ent_type] += 1
+                placeholder_name = f"{ent_type}_{counters[ent_type]}"
+                placeholders[key] = f"<{placeholder_name}>"
+                entity_map[placeholder_name] = {
+                    "type": ent_type,
+                    "text": ent["text"],
+                    "normal": normal,
+                    "gender": ent.get("gender", "masc"),
+                }
+            replacement = placeholders[key]
+        elif ent_type == "DEVICE" and ent["text"] != normal:
+            # Номер или алиас заменяем на имя прибора из каталога (обогащение текста).
             # Если text == normal, ничего не делаем (имя уже есть в тексте).
+            replacement = normal
+        else:
+            continue
+
+        replacements.setdefault(ent["text"], replacement)
+        if "start" in ent and text[ent["start"] : ent["end"]] == ent["text"]:
+            spans.append((ent["start"], ent["end"], replacement))
+
+    if replacements:
+        # Длинные варианты первыми: "Иван Иванов" раньше "Иван"
+        alternatives = sorted(replacements, key=len, reverse=True)
+        pattern = re.compile(
+            r"(?<!\w)(?:" + "|".join(map(re.escape, alternatives)) + r")(?!\w)"
+        )
+        for match in pattern.finditer(text):
+            spans.append((match.start(), match.end(), replacements[match.group(0)]))
+
+    # При пересечениях побеждает более ранний, затем более длинный спан
+    spans.sort(key=lambda span: (span[0], span[0] - span[1]))
+
+    parts = []
+    pos = 0
+    for start, end, replacement in spans:
+        if start < pos:
+            continue
+        parts.append(text[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(text[pos:])
 
-    return masked_text, entity_map
+    return "".join(parts), entity_map
 
 
 def unmask_pii(text: str, entity_map: Dict[str, Dict]) -> str:
     """
     Восстановление сущностей с учетом падежей.
     """
-    # Паттерн: <TYPE_ID_CASE>
-    pattern = re.compile(r"<(NAME|DEVICE|PHONE|EMAIL)_(\d+)(?:_([A-Z]+))?>")
 
     def replacer(match):
         ent_type = match.group(1)
@@ -102,4 +133,4 @@ def unmask_pii(text: str, entity_map: Dict[str, Dict]) -> str:
 
         return match.group(0)
 
-    return pattern.sub(replacer, text)
+    return PLACEHOLDER_PATTERN.sub(replacer, text)
@@ -0,0 +1,133 @@
+# app/services/pipeline.py
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Маркер остановки воркеров стадии
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """
+    Стадия конвейера. handler получает элемент и возвращает его (или новый)
+    для следующей стадии; None - элемент отфильтрован и дальше не идет.
+    При batch_size > 1 handler получает список (до batch_size элементов)
+    и возвращает список результатов той же длины.
+    """
+
+    name: str
+    handler: Callable[[Any], Awaitable[Optional[Any]]]
+    concurrency: int = 1
+    batch_size: int = 1
+
+
+class StagedPipeline:
+    """
+    Ограниченный asyncio-конвейер: у каждой стадии своя очередь и свои воркеры.
+    Очереди ограничены по размеру (backpressure), ошибка в одном элементе
+    логируется и не останавливает остальные.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 100):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats: Dict[str, Dict[str, int]] = {
+            stage.name: {"processed": 0, "filtered": 0, "failed": 0} for stage in stages
+        }
+
+    async def run(self, items: Iterable[Any]) -> List[Any]:
+        """Прогоняет элементы через все стадии. Возвращает результаты последней."""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: List[Any] = []
+
+        workers = [
+            [
+                asyncio.create_task(self._worker(i, queues, results))
+                for _ in range(max(1, stage.concurrency))
+            ]
+            for i, stage in enumerate(self.stages)
+        ]
+
+        try:
+            for item in items:
+                await queues[0].put(item)
+
+            # Останавливаем стадии по порядку: стадия i завершена,
+            # только когда все ее элементы переданы в стадию i + 1
+            for queue, stage_workers in zip(queues, workers):
+                await queue.join()
+                for _ in stage_workers:
+                    await queue.put(_STOP)
+                await asyncio.gather(*stage_workers)
+        finally:
+            for stage_workers in workers:
+                for task in stage_workers:
+                    task.cancel()
+
+        return results
+
+    async def _worker(self, index: int, queues: List[asyncio.Queue], results: List):
+        stage = self.stages[index]
+        queue = queues[index]
+
+        while True:
+            # Пакетная стадия забирает все, что уже накопилось в очереди
+            batch = [await queue.get()]
+            while (
+                batch[-1] is not _STOP
+                and len(batch) < stage.batch_size
+                and not queue.empty()
+            ):
+                batch.append(queue.get_nowait())
+
+            stop = batch[-1] is _STOP
+            items = batch[:-1] if stop else batch
+            try:
+                if items:
+                    await self._process(index, items, queues, results)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+            if stop:
+                return
+
+    async def _process(
+        self, index: int, items: List, queues: List[asyncio.Queue], results: List
+    ):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+
+        try:
+            if stage.batch_size > 1:
+                outs = await stage.handler(items)
+            else:
+                outs = [await stage.handler(items[0])]
+        except Exception:
+            if len(items) > 1:
+                # Ошибка пакета: повторяем поштучно, чтобы найти сбойный элемент
+                logger.exception(
+                    f"Pipeline stage '{stage.name}' batch failed. Retrying one by one"
+                )
+                for item in items:
+                    await self._process(index, [item], queues, results)
+                return
+            stats["failed"] += 1
+            logger.exception(f"Pipeline stage '{stage.name}' failed")
+            return
+
+        for out in outs:
+            if out is None:
+                stats["filtered"] += 1
+                continue
+
+            stats["processed"] += 1
+            if index == len(self.stages) - 1:
+                results.append(out)
+            else:
+                await queues[index + 1].put(out)
@@ -1,39 +1,137 @@
 import asyncio
+import fcntl
 import json
 import os
-from typing import List
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import IO, Callable, Dict, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
 
 from app.config import get_settings
+from app.services.embedding_service import EmbeddingService, embedding_service
 
 settings = get_settings()
 
+# Индекс прибора и тексты его фрагментов
+LoadedIndex = Tuple[faiss.Index, Dict[int, str]]
+
+# Версия файлов индекса на диске: (mtime_ns, размер) index.faiss и store.json
+FilesVersion = Tuple[int, int, int, int]
+
+
+def _files_version(index_file: str, store_file: str) -> Optional[FilesVersion]:
+    try:
+        index_stat, store_stat = os.stat(index_file), os.stat(store_file)
+    except OSError:
+        return None
+    return (
+        index_stat.st_mtime_ns,
+        index_stat.st_size,
+        store_stat.st_mtime_ns,
+        store_stat.st_size,
+    )
+
+
+class IndexCache:
+    """
+    LRU загруженных индексов и хранилищ фрагментов по приборам.
+    Ограничен суммарным объемом в памяти, а не числом записей: руководства
+    бывают на десятки и на тысячи страниц. Запись устаревает, если файлы
+    индекса на диске изменились (mtime или размер).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        self._data: "OrderedDict[str, Tuple[FilesVersion, LoadedIndex, int]]" = (
+            OrderedDict()
+        )
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, device_name: str, version: FilesVersion) -> Optional[LoadedIndex]:
+        entry = self._data.get(device_name)
+        if entry is not None:
+            if entry[0] == version:
+                self._data.move_to_end(device_name)
+                self.hits += 1
+                return entry[1]
+            self._remove(device_name)
+            self.invalidations += 1
+        self.misses += 1
+        return None
+
+    def put(self, device_name: str, version: FilesVersion, loaded: LoadedIndex):
+        if device_name in self._data:
+            self._remove(device_name)
+        # Векторы в памяти занимают примерно столько же, сколько index.faiss
+        size = version[1] + sum(sys.getsizeof(chunk) for chunk in loaded[1].values())
+        if size > self.max_bytes:
+            return
+        self._data[device_name] = (version, loaded, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove(self, device_name: str):
+        _, _, size = self._data.pop(device_name)
+        self.bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "devices": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
 
 class RAGEngine:
     def __init__(
         self,
         index_root: str = "data/faiss_index",
-        model_name: str = "intfloat/multilingual-e5-base",
+        embeddings: Optional[EmbeddingService] = None,
     ):
-        self.model = None
+        # Эмбеддинги E5 через общий сервис с батчингом (модель - из model_registry)
+        self.embeddings = embeddings or embedding_service
         self.index_root = index_root
-        self.model_name = model_name
-        self._model_lock = asyncio.Lock()  # Для безопасной загрузки модели
-
-    async def load_model(self):
-        """Ленивая загрузка модели в отдельном потоке."""
-        async with self._model_lock:
-            if self.model is None:
-                print(f"Loading embedding model {self.model_name}...")
-                # Загрузка модели - это IO/CPU тяжелая операция, делаем в треде
-                self.model = await asyncio.to_thread(
-                    SentenceTransformer, self.model_name
-                )
-                print("Model loaded.")
+        self.index_cache = IndexCache(settings.RAG_INDEX_CACHE_MB * 1024 * 1024)
+        # Сборки индексов в процессе: параллельные тикеты ждут одну
+        self._builds: Dict[str, asyncio.Task] = {}
+
+    def _index_paths(self, device_name: str) -> Tuple[str, str, str]:
+        index_dir = os.path.join(self.index_root, device_name)
+        return (
+            index_dir,
+            os.path.join(index_dir, "index.faiss"),
+            os.path.join(index_dir, "store.json"),
+        )
+
+    def has_index(self, device_name: str) -> bool:
+        """Индекс уже на диске - PDF для него не нужен."""
+        _, index_file, store_file = self._index_paths(device_name)
+        return os.path.exists(index_file) and os.path.exists(store_file)
 
     async def get_context(
         self, query: str, device_name: str, pdf_path: str, top_k: int = 3
@@ -43,43 +141,54 @@ class RAGEngine:
         Если индекс для device_name существует - загружает.
         Если нет - строит из pdf_path.
         """
-        await self.load_model()
+        loaded = await self.load_index(device_name, pdf_path)
+        if loaded is None:
+            return []
+        query_emb = await self.embed_query(query)
+        return await self.search(loaded, query_emb, top_k)
 
-        index_dir = os.path.join(self.index_root, device_name)
-        index_file = os.path.join(index_dir, "index.faiss")
-        store_file = os.path.join(index_dir, "store.json")
+    async def load_index(
+        self, device_name: str, pdf_path: Optional[str]
+    ) -> Optional[LoadedIndex]:
+        """Индекс прибора с диска, при его отсутствии - построенный из pdf_path."""
+        index_dir, index_file, store_file = self._index_paths(device_name)
 
-        # Структуры данных для текущего индекса
-        index = None
-        doc_store = {}
+        # 1. Индекс из памяти (если файлы не менялись) или с диска
+        version = _files_version(index_file, store_file)
+        if version:
+            loaded = self.index_cache.get(device_name, version)
+            if loaded is not None:
+                return loaded
 
-        # 1. Попытка загрузить готовый индекс с диска
-        if os.path.exists(index_file) and os.path.exists(store_file):
             print(f"Loading cached index for {device_name}...")
-            index = await asyncio.to_thread(faiss.read_index, index_file)
-            with open(store_file, "r", encoding="utf-8") as f:
-                raw_store = json.load(f)
-                doc_store = {int(k): v for k, v in raw_store.items()}
+            index, doc_store = await asyncio.to_thread(
+                _read_index, index_file, store_file
+            )
         else:
-            # 2. Если индекса нет, строим из PDF
+            # 2. Если индекса нет, строим из PDF (одна сборка на прибор)
             if not pdf_path or not os.path.exists(pdf_path):
-                return []
+                return None
 
-            print(f"Building new index for {device_name} from PDF...")
-            index, doc_store = await self._build_index_from_pdf(pdf_path, index_dir)
+            index, doc_store = await self._build_single_flight(device_name, pdf_path)
+            version = _files_version(index_file, store_file)
 
         if index is None or index.ntotal == 0:
-            return []
+            return None
+        loaded = (index, doc_store)
+        if version:
+            self.index_cache.put(device_name, version, loaded)
+        return loaded
 
-        # 3. Поиск (Embedding Query + Search)
-        # E5 требует префикс "query: " для поиска
-        query_emb = await asyncio.to_thread(
-            self.model.encode, [f"query: {query}"], normalize_embeddings=True
-        )
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Эмбеддинг запроса. Не зависит от индекса - можно считать параллельно."""
+        # Параллельные тикеты считаются одним батчем, повторные - из кэша
+        return await self.embeddings.embed_query(query)
 
-        distances, indices = await asyncio.to_thread(
-            index.search, np.array(query_emb), top_k
-        )
+    async def search(
+        self, loaded: LoadedIndex, query_emb: np.ndarray, top_k: int = 3
+    ) -> List[str]:
+        index, doc_store = loaded
+        distances, indices = await asyncio.to_thread(index.search, query_emb, top_k)
 
         results = []
         for idx in indices[0]:
@@ -88,6 +197,32 @@ class RAGEngine:
 
         return results
 
+    async def _build_single_flight(
+        self, device_name: str, pdf_path: str
+    ) -> Tuple[Optional[faiss.Index], Dict[int, str]]:
+        build = self._builds.get(device_name)
+        if build is None:
+            build = asyncio.create_task(self._build_locked(device_name, pdf_path))
+            self._builds[device_name] = build
+            build.add_done_callback(lambda _: self._builds.pop(device_name, None))
+        # shield: отмена одного тикета не отменяет сборку для остальных
+        return await asyncio.shield(build)
+
+    async def _build_locked(self, device_name: str, pdf_path: str):
+        """Сборка под файловой блокировкой: воркеры в других процессах ждут ее."""
+        index_dir, index_file, store_file = self._index_paths(device_name)
+        lock_path = os.path.join(self.index_root, ".locks", f"{device_name}.lock")
+        lock = await _acquire_file_lock(lock_path)
+        try:
+            # Пока ждали блокировку, индекс мог собрать другой процесс
+            if self.has_index(device_name):
+                return await asyncio.to_thread(_read_index, index_file, store_file)
+
+            print(f"Building new index for {device_name} from PDF...")
+            return await self._build_index_from_pdf(pdf_path, index_dir)
+        finally:
+            _release_file_lock(lock)
+
     async def _build_index_from_pdf(self, pdf_path: str, save_dir: str):
         """Парсит PDF, создает индекс и сохраняет на диск."""
 
@@ -97,22 +232,14 @@ class RAGEngine:
             text = ""
             for page in reader.pages:
                 text += page.extract_text() + "\n"
-
-            # Простой чанкер по символам/переносам строк (можно улучшить через LangChain)
-            # Бьем по параграфам
-            chunks = [p.strip() for p in text.split("\n") if len(p.strip()) > 50]
-            return chunks
+            return chunk_text(text)
 
         chunks = await asyncio.to_thread(parse_and_chunk)
         if not chunks:
             return None, {}
 
-        # Эмбеддинг (тяжелая операция)
-        # E5 требует префикс "passage: " для документов
-        passages = [f"passage: {c}" for c in chunks]
-        embeddings = await asyncio.to_thread(
-            self.model.encode, passages, normalize_embeddings=True
-        )
+        # Эмбеддинг (тяжелая операция): порциями, пропуская вперед запросы тикетов
+        embeddings = await self.embeddings.embed_passages(chunks)
 
         # Создание индекса FAISS
         d = embeddings.shape[1]  # Размерность вектора
@@ -121,16 +248,92 @@ class RAGEngine:
         )  # Inner Product (косинусная близость для нормализованных)
         await asyncio.to_thread(index.add, np.array(embeddings))
 
-        # Сохранение
-        os.makedirs(save_dir, exist_ok=True)
-        faiss.write_index(index, os.path.join(save_dir, "index.faiss"))
-
         doc_store = {i: chunks[i] for i in range(len(chunks))}
-        with open(os.path.join(save_dir, "store.json"), "w", encoding="utf-8") as f:
-            json.dump(doc_store, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(_write_index_atomic, save_dir, index, doc_store)
 
         return index, doc_store
 
 
+def _read_index(index_file: str, store_file: str) -> Tuple[faiss.Index, Dict[int, str]]:
+    index = faiss.read_index(index_file)
+    with open(store_file, "r", encoding="utf-8") as f:
+        raw_store = json.load(f)
+    return index, {int(k): v for k, v in raw_store.items()}
+
+
+def chunk_text(text: str) -> List[str]:
+    # Простой чанкер по символам/переносам строк (можно улучшить через LangChain)
+    # Бьем по параграфам
+    return [p.strip() for p in text.split("\n") if len(p.strip()) > 50]
+
+
+def _write_index_atomic(save_dir: str, index: faiss.Index, doc_store: Dict[int, str]):
+    def write(tmp_dir: str):
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+        with open(os.path.join(tmp_dir, "store.json"), "w", encoding="utf-8") as f:
+            json.dump(doc_store, f, ensure_ascii=False, indent=2)
+
+    write_dir_atomic(save_dir, write)
+
+
+def write_dir_atomic(save_dir: str, write: Callable[[str], None]):
+    """
+    Файлы пишутся во временный каталог рядом, прежний каталог отодвигается
+    в сторону и удаляется только после переименования нового. Каталог
+    всегда целый - прежний или новый, недописанного или наполовину
+    удаленного не бывает; между двумя rename его на мгновение нет.
+    Вызывается под файловой блокировкой (или из единственного процесса сборки).
+    """
+    parent = os.path.dirname(save_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".build-", dir=parent)
+    old_dir = None
+    try:
+        write(tmp_dir)
+        if os.path.isdir(save_dir):
+            # rename поверх пустого каталога атомарен
+            old_dir = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.rename(save_dir, old_dir)
+        os.rename(tmp_dir, save_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir and not os.path.exists(save_dir):
+            # Новый каталог не встал на место: возвращаем прежний
+            os.rename(old_dir, save_dir)
+            old_dir = None
+        raise
+    finally:
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+async def _acquire_file_lock(path: str) -> IO:
+    """
+    flock с опросом LOCK_NB: пока сборку ведет другой процесс, поток
+    общего пула не занят ожиданием. Не дождались за RAG_BUILD_LOCK_TIMEOUT -
+    TimeoutError (тикет обработается без руководства).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_file = open(path, "a")
+    deadline = time.monotonic() + settings.RAG_BUILD_LOCK_TIMEOUT
+    try:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Lock {path} is busy")
+                await asyncio.sleep(settings.RAG_BUILD_LOCK_POLL)
+    except BaseException:
+        lock_file.close()
+        raise
+
+
+def _release_file_lock(lock_file: IO):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
 # Синглтон
 rag_engine = RAGEngine()
@@ -0,0 +1,187 @@
+# app/services/semantic_cache.py
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.parsing.utils import PLACEHOLDER_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Что переиспользуется из ответа похожего тикета
+CACHED_FIELDS = ("category", "sentiment", "summary", "answer", "important")
+
+
+def _placeholders(text: str) -> set:
+    return {f"{m.group(1)}_{m.group(2)}" for m in PLACEHOLDER_PATTERN.finditer(text)}
+
+
+class SemanticCache:
+    """
+    Семантический кэш ответов LLM: маскированный текст -> эмбеддинг E5
+    (общий с RAGEngine embedding_service: поиск по руководству и кэш
+    считают вектор тикета один раз) -> ближайший уже
+    отвеченный тикет в FAISS. Выше порога SEMANTIC_CACHE_THRESHOLD
+    возвращаются категория, тональность и шаблон ответа с плейсхолдерами.
+    Индекс пополняется по мере ответов LLM, сохраняется на диск каждые
+    SEMANTIC_CACHE_SAVE_EVERY записей и при остановке, записи старше
+    SEMANTIC_CACHE_MAX_AGE вытесняются.
+    """
+
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+    ):
+        self.index_dir = index_dir or os.path.join(settings.DATA_DIR, "semantic_cache")
+        self._encoder = encoder
+        self._lock = asyncio.Lock()
+        self.index = None
+        self.entries: Dict[int, Dict] = {}
+        self._next_id = 0
+        self._unsaved = 0
+        self._last_eviction = 0.0
+        self.stats_counters = {"hits": 0, "misses": 0, "added": 0, "evicted": 0}
+
+    async def _encode(self, text: str) -> np.ndarray:
+        if self._encoder:
+            return np.asarray(self._encoder([text]), dtype="float32")
+        # Симметричная задача (текст-текст): E5 рекомендует префикс "query: "
+        return await embedding_service.embed_query(text)
+
+    def _new_index(self, dim: int):
+        # IDMap2 - чтобы удалять устаревшие записи по id
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    # --- Персистентность ---
+
+    def _paths(self):
+        return (
+            os.path.join(self.index_dir, "index.faiss"),
+            os.path.join(self.index_dir, "entries.json"),
+        )
+
+    def _load_sync(self):
+        index_file, entries_file = self._paths()
+        if not (os.path.exists(index_file) and os.path.exists(entries_file)):
+            return
+        self.index = faiss.read_index(index_file)
+        with open(entries_file, "r", encoding="utf-8") as f:
+            self.entries = {int(k): v for k, v in json.load(f).items()}
+        self._next_id = max(self.entries, default=-1) + 1
+        self._evict_sync()
+        logger.info(f"Semantic cache loaded: {len(self.entries)} entries")
+
+    def _save_sync(self):
+        if self.index is None:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_file, entries_file = self._paths()
+        # Пишем во временные файлы и подменяем, чтобы не оставить половину индекса
+        faiss.write_index(self.index, f"{index_file}.tmp")
+        with open(f"{entries_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(f"{index_file}.tmp", index_file)
+        os.replace(f"{entries_file}.tmp", entries_file)
+        self._unsaved = 0
+
+    async def load(self):
+        async with self._lock:
+            await asyncio.to_thread(self._load_sync)
+
+    async def save(self):
+        async with self._lock:
+            await asyncio.to_thread(self._save_sync)
+
+    # --- Поиск и пополнение ---
+
+    def _evict_sync(self):
+        """Удаляет записи старше SEMANTIC_CACHE_MAX_AGE."""
+        self._last_eviction = time.time()
+        deadline = self._last_eviction - settings.SEMANTIC_CACHE_MAX_AGE
+        expired = [i for i, e in self.entries.items() if e["created_at"] < deadline]
+        if not expired or self.index is None:
+            return
+        self.index.remove_ids(np.array(expired, dtype="int64"))
+        for entry_id in expired:
+            del self.entries[entry_id]
+        self.stats_counters["evicted"] += len(expired)
+        self._unsaved += len(expired)
+
+    def _lookup_sync(
+        self, vector: np.ndarray, masked_text: str, prompt_version: str
+    ) -> Optional[Dict]:
+        if self.index is None or self.index.ntotal == 0:
+            return None
+
+        scores, ids = self.index.search(vector, settings.SEMANTIC_CACHE_TOP_K)
+        available = _placeholders(masked_text)
+
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id == -1 or score < settings.SEMANTIC_CACHE_THRESHOLD:
+                break
+            entry = self.entries.get(int(entry_id))
+            if not entry or entry["prompt_version"] != prompt_version:
+                continue
+            # Шаблон ответа не должен ссылаться на данные, которых в тикете нет
+            template = f"{entry['result'].get('summary', '')} {entry['result'].get('answer') or ''}"
+            if not _placeholders(template) <= available:
+                continue
+            return {**entry["result"], "similarity": round(float(score), 4)}
+        return None
+
+    def _add_sync(self, vector: np.ndarray, result: Dict, prompt_version: str):
+        if self.index is None:
+            self.index = self._new_index(vector.shape[1])
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+        self.entries[entry_id] = {
+            "created_at": time.time(),
+            "prompt_version": prompt_version,
+            "result": {key: result.get(key) for key in CACHED_FIELDS},
+        }
+        self.stats_counters["added"] += 1
+        self._unsaved += 1
+
+        if time.time() - self._last_eviction >= settings.SEMANTIC_CACHE_EVICT_INTERVAL:
+            self._evict_sync()
+        if self._unsaved >= settings.SEMANTIC_CACHE_SAVE_EVERY:
+            self._save_sync()
+
+    async def lookup(self, masked_text: str, prompt_version: str) -> Optional[Dict]:
+        vector = await self._encode(masked_text)
+        async with self._lock:
+            hit = await asyncio.to_thread(
+                self._lookup_sync, vector, masked_text, prompt_version
+            )
+        self.stats_counters["hits" if hit else "misses"] += 1
+        return hit
+
+    async def add(self, masked_text: str, result: Dict, prompt_version: str):
+        vector = await self._encode(masked_text)
+        async with self._lock:
+            await asyncio.to_thread(self._add_sync, vector, result, prompt_version)
+
+    @property
+    def stats(self) -> Dict:
+        total = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "size": len(self.entries),
+            "hit_rate": (
+                round(self.stats_counters["hits"] / total, 4) if total else None
+            ),
+        }
+
+
+# Синглтон
+semantic_cache = SemanticCache()
@@ -0,0 +1,249 @@
+# app/services/spam_filter.py
+import email.header
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.db.repository import MessageRepository
+from app.services.parsing.automaton import KeywordAutomaton
+from app.services.utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Заголовки, которые нужны фильтру (остальные в очередь не попадают)
+FILTER_HEADERS = (
+    "Auto-Submitted",
+    "List-Unsubscribe",
+    "List-Id",
+    "Precedence",
+    "X-Autoreply",
+    "X-Autorespond",
+    "Subject",
+)
+
+# Цитаты ("> ...") и подписи не сканируются: в них чужой текст
+_QUOTED_LINE_RE = re.compile(r"^\s*>.*$", re.MULTILINE)
+# Начало подписи (RFC 3676 "-- ") или процитированной истории переписки
+_HISTORY_START_RE = re.compile(
+    r"^(?:-- ?|-{2,}\s*(?:original message|исходное сообщение|пересылаемое сообщение)"
+    r"\s*-{2,}|.{0,200}(?:пишет|написал\(а\)|написал|wrote):\s*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Отправители-роботы (bounce, рассылки)
+_ROBOT_SENDER_RE = re.compile(
+    r"^(mailer-daemon|postmaster|no-?reply|do-?not-?reply|bounces?)[@+.\-]",
+    re.IGNORECASE,
+)
+
+# Фразы в теме письма, по которым оно - автоответ (одного совпадения достаточно).
+# Тело не проверяется: клиенты цитируют автоответы и подписи рассылок
+AUTO_REPLY_PHRASES = [
+    "автоматический ответ",
+    "автоответ",
+    "я в отпуске",
+    "нахожусь в отпуске",
+    "out of office",
+    "auto-reply",
+    "automatic reply",
+    "undeliverable",
+    "delivery status notification",
+    "не может быть доставлено",
+]
+
+# Рекламная лексика (нужно несколько разных слов), ищется с начала слова:
+# "акция" не совпадает с "реакция", "кредит" - с "аккредитация"
+SPAM_KEYWORDS = [
+    "реклама",
+    "рекламн",
+    "спам",
+    "скидк",
+    "распродаж",
+    "акция",
+    "выгодное предложение",
+    "коммерческое предложение",
+    "вебинар",
+    "бесплатн",
+    "продвижение сайта",
+    "seo",
+    "заработок",
+    "кредит",
+    "казино",
+]
+
+
+class NaiveBayesClassifier:
+    """
+    Мультиномиальный наивный Байес на словах (линейная модель в лог-пространстве).
+    Обучается за секунды на истории тикетов: спам = category "спам" или is_relevant = FALSE.
+    """
+
+    def __init__(self):
+        self.trained = False
+        self._log_prior: Dict[bool, float] = {}
+        self._log_prob: Dict[bool, Dict[str, float]] = {}
+        self._log_unknown: Dict[bool, float] = {}
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return tokenize(text)
+
+    def train(self, samples: List[Tuple[str, bool]]):
+        counts = {True: Counter(), False: Counter()}
+        docs = Counter()
+        for text, is_spam in samples:
+            counts[is_spam].update(self.tokenize(text))
+            docs[is_spam] += 1
+
+        vocab = set(counts[True]) | set(counts[False])
+        for label in (True, False):
+            total = sum(counts[label].values()) + len(vocab)
+            self._log_prior[label] = math.log(docs[label] / len(samples))
+            # Сглаживание Лапласа
+            self._log_prob[label] = {
+                word: math.log((count + 1) / total)
+                for word, count in counts[label].items()
+            }
+            self._log_unknown[label] = math.log(1 / total)
+        self.trained = True
+
+    def spam_probability(self, text: str) -> float:
+        tokens = self.tokenize(text)
+        scores = {}
+        for label in (True, False):
+            probs, unknown = self._log_prob[label], self._log_unknown[label]
+            scores[label] = self._log_prior[label] + sum(
+                probs.get(token, unknown) for token in tokens
+            )
+        # softmax двух классов без переполнения
+        diff = scores[False] - scores[True]
+        if diff > 700:
+            return 0.0
+        return 1 / (1 + math.exp(diff))
+
+
+class SpamFilter:
+    """
+    Дешевый фильтр до NER: заголовки, автомат ключевых слов, классификатор.
+    Возвращает причину отказа или None. Отклоненные письма сразу
+    сохраняются с is_relevant = FALSE, без NER и LLM.
+    """
+
+    def __init__(self):
+        self.auto_reply = KeywordAutomaton(
+            {p: "auto_reply" for p in AUTO_REPLY_PHRASES}
+        )
+        self.spam_words = KeywordAutomaton({w: "spam_words" for w in SPAM_KEYWORDS})
+        self.classifier = NaiveBayesClassifier()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.checked = 0
+        self.rejected: Counter = Counter()
+
+    def check(
+        self, body: str, sender: Optional[str], headers: Optional[Dict] = None
+    ) -> Optional[str]:
+        self.checked += 1
+        reason = self._check(body, sender or "", headers or {})
+        if reason:
+            self.rejected[reason] += 1
+        return reason
+
+    def _check(self, body: str, sender: str, headers: Dict) -> Optional[str]:
+        reason = check_headers(headers, sender)
+        if reason:
+            return reason
+
+        subject = _decode_header(headers.get("Subject"))
+        if self.auto_reply.find_all(subject, word_start=True):
+            return "auto_reply"
+
+        text = own_text(body)
+        spam_hits = {m.keyword for m in self.spam_words.find_all(text, word_start=True)}
+        if len(spam_hits) >= settings.SPAM_KEYWORD_MIN_HITS:
+            return "spam_words"
+
+        if self.classifier.trained:
+            probability = self.classifier.spam_probability(text)
+            if probability >= settings.SPAM_CLASSIFIER_THRESHOLD:
+                return "classifier"
+        return None
+
+    async def train(self, repo: MessageRepository):
+        """Обучает классификатор на размеченных тикетах (без авто-отклоненных)."""
+        rows = await repo.get_classified_samples(settings.SPAM_TRAIN_LIMIT)
+        samples = [
+            (
+                row["original_message"] or "",
+                row["category"] == "спам" or not row["is_relevant"],
+            )
+            for row in rows
+        ]
+        spam_count = sum(1 for _, is_spam in samples if is_spam)
+        ham_count = len(samples) - spam_count
+        if min(spam_count, ham_count) < settings.SPAM_TRAIN_MIN_PER_CLASS:
+            logger.info(
+                f"Spam classifier not trained: {spam_count} spam / {ham_count} ham samples"
+            )
+            return
+        self.classifier.train(samples)
+        logger.info(
+            f"Spam classifier trained on {spam_count} spam / {ham_count} ham samples"
+        )
+
+    @property
+    def stats(self) -> Dict:
+        rejected = sum(self.rejected.values())
+        return {
+            "checked": self.checked,
+            "rejected": rejected,
+            "reject_rate": round(rejected / self.checked, 4) if self.checked else None,
+            "by_reason": dict(self.rejected),
+            "classifier_trained": self.classifier.trained,
+        }
+
+
+def own_text(body: str) -> str:
+    """
+    Текст автора письма: без цитат, подписи и истории переписки, не длиннее
+    SPAM_SCAN_MAX_CHARS (фильтр работает в event loop, тела бывают до 1 МБ).
+    """
+    body = body[: settings.SPAM_SCAN_MAX_CHARS]
+    history = _HISTORY_START_RE.search(body)
+    if history:
+        body = body[: history.start()]
+    return _QUOTED_LINE_RE.sub("", body)
+
+
+def _decode_header(value: Optional[str]) -> str:
+    """Тема в MIME encoded-words (=?utf-8?b?...?=) -> текст."""
+    if not value:
+        return ""
+    try:
+        return str(email.header.make_header(email.header.decode_header(value)))
+    except Exception:
+        return value
+
+
+def check_headers(headers: Dict, sender: str) -> Optional[str]:
+    """RFC 3834 (Auto-Submitted), RFC 2369 (List-*), bounce-отправители."""
+    auto_submitted = (headers.get("Auto-Submitted") or "").strip().lower()
+    if auto_submitted and auto_submitted != "no":
+        return "auto_submitted"
+    if headers.get("X-Autoreply") or headers.get("X-Autorespond"):
+        return "auto_submitted"
+    if headers.get("List-Unsubscribe") or headers.get("List-Id"):
+        return "mailing_list"
+    if (headers.get("Precedence") or "").strip().lower() in ("bulk", "list", "junk"):
+        return "mailing_list"
+    if _ROBOT_SENDER_RE.match(sender):
+        return "robot_sender"
+    return None
+
+
+# Синглтон
+spam_filter = SpamFilter()
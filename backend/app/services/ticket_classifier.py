@@ -0,0 +1,369 @@
+# app/services/ticket_classifier.py
+"""
+Быстрый локальный классификатор тикетов: category, sentiment, important.
+Метки ставятся за миллисекунды, LLM остается только генерация ответа.
+
+Переобучение и отчет о точности:
+    python -m app.services.ticket_classifier [--limit N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.db.repository import MessageRepository
+from app.services.utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Головы классификатора (поле тикета из истории -> метка)
+HEADS = ("category", "sentiment", "important")
+
+
+class TfidfVectorizer:
+    """Слова и биграммы слов, сублинейный tf, L2-нормировка. Вектор - dict."""
+
+    def __init__(self, min_df: int = 2, max_features: int = 20_000):
+        self.min_df = min_df
+        self.max_features = max_features
+        self.vocab: Dict[str, int] = {}
+        self.idf: List[float] = []
+
+    @staticmethod
+    def terms(text: str) -> List[str]:
+        words = tokenize(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def fit(self, texts: List[str]):
+        df = Counter()
+        for text in texts:
+            df.update(set(self.terms(text)))
+        common = [
+            term
+            for term, count in df.most_common(self.max_features)
+            if count >= self.min_df
+        ]
+        self.vocab = {term: i for i, term in enumerate(common)}
+        self.idf = [math.log((1 + len(texts)) / (1 + df[term])) + 1 for term in common]
+
+    def transform(self, text: str) -> Dict[int, float]:
+        counts = Counter(term for term in self.terms(text) if term in self.vocab)
+        vec = {
+            self.vocab[term]: (1 + math.log(count)) * self.idf[self.vocab[term]]
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {i: v / norm for i, v in vec.items()} if norm else vec
+
+
+class SoftmaxHead:
+    """
+    Мультиклассовая логистическая регрессия поверх TF-IDF (SGD).
+    Классы взвешены обратно частоте: редкие "важные" тикеты не тонут в обычных.
+    """
+
+    def __init__(self, classes: List):
+        self.classes = classes
+        self.weights: List[Dict[int, float]] = [{} for _ in classes]
+        self.bias = [0.0] * len(classes)
+
+    def predict_proba(self, vec: Dict[int, float]) -> List[float]:
+        scores = [
+            bias + sum(weights.get(i, 0.0) * v for i, v in vec.items())
+            for weights, bias in zip(self.weights, self.bias)
+        ]
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def fit(
+        self,
+        vectors: List[Dict[int, float]],
+        labels: List,
+        epochs: int,
+        learning_rate: float,
+    ):
+        index = {label: k for k, label in enumerate(self.classes)}
+        counts = Counter(labels)
+        class_weight = {
+            label: len(labels) / (len(self.classes) * count)
+            for label, count in counts.items()
+        }
+        order = list(range(len(vectors)))
+        rng = random.Random(0)
+
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            # Затухающий шаг вместо регуляризации: эпох немного
+            step = learning_rate / (1 + epoch)
+            for n in order:
+                vec, target = vectors[n], index[labels[n]]
+                weight = class_weight[labels[n]]
+                for k, prob in enumerate(self.predict_proba(vec)):
+                    grad = (prob - (k == target)) * weight * step
+                    if abs(grad) < 1e-6:
+                        continue
+                    weights = self.weights[k]
+                    for i, v in vec.items():
+                        weights[i] = weights.get(i, 0.0) - grad * v
+                    self.bias[k] -= grad
+
+    def to_dict(self) -> Dict:
+        return {
+            "classes": self.classes,
+            "bias": self.bias,
+            # Ключи JSON - строки
+            "weights": [{str(i): w for i, w in ws.items()} for ws in self.weights],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SoftmaxHead":
+        head = cls(data["classes"])
+        head.bias = data["bias"]
+        head.weights = [{int(i): w for i, w in ws.items()} for ws in data["weights"]]
+        return head
+
+
+def _is_holdout(text: str) -> bool:
+    """Детерминированное разбиение: тот же тикет всегда в той же части."""
+    digest = hashlib.md5(text.encode("utf-8")).digest()
+    return digest[0] / 256 < settings.TICKET_CLASSIFIER_HOLDOUT
+
+
+class TicketClassifier:
+    """
+    Обучается на истории tickets (метки, которые раньше ставил LLM).
+    classify() возвращает метки, только если все головы уверены,
+    иначе None - тикет целиком размечает LLM.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.heads: Dict[str, SoftmaxHead] = {}
+        self.report: Dict = {}
+
+    @property
+    def trained(self) -> bool:
+        return self.vectorizer is not None and all(h in self.heads for h in HEADS)
+
+    def predict(self, text: str) -> Dict[str, Tuple[object, float]]:
+        """Лучшая метка и ее вероятность по каждой голове."""
+        vec = self.vectorizer.transform(text)
+        result = {}
+        for name, head in self.heads.items():
+            probs = head.predict_proba(vec)
+            best = max(range(len(probs)), key=probs.__getitem__)
+            result[name] = (head.classes[best], probs[best])
+        return result
+
+    def classify(self, text: str) -> Optional[Dict]:
+        if not self.trained:
+            return None
+
+        vec = self.vectorizer.transform(text)
+        if not vec:
+            return None
+        labels = {}
+        for name in ("category", "sentiment"):
+            head = self.heads[name]
+            probs = head.predict_proba(vec)
+            best = max(range(len(probs)), key=probs.__getitem__)
+            if probs[best] < settings.TICKET_CLASSIFIER_THRESHOLD:
+                return None
+            labels[name] = head.classes[best]
+
+        # Важность - с низким порогом: пропустить утечку газа хуже лишней тревоги
+        head = self.heads["important"]
+        probs = head.predict_proba(vec)
+        important = probs[head.classes.index(True)] if True in head.classes else 0.0
+        labels["important"] = (
+            important >= settings.TICKET_CLASSIFIER_IMPORTANT_THRESHOLD
+        )
+        return labels
+
+    def fit(self, samples: List[Dict]) -> Dict:
+        """Обучение на (1 - HOLDOUT) выборки, отчет о точности на отложенной части."""
+        train = [s for s in samples if not _is_holdout(s["text"])]
+        test = [s for s in samples if _is_holdout(s["text"])]
+
+        vectorizer = TfidfVectorizer()
+        vectorizer.fit([s["text"] for s in train])
+        vectors = [vectorizer.transform(s["text"]) for s in train]
+
+        heads = {}
+        for name in HEADS:
+            counts = Counter(s[name] for s in train)
+            classes = sorted(
+                (
+                    c
+                    for c, n in counts.items()
+                    if n >= settings.TICKET_CLASSIFIER_MIN_PER_CLASS
+                ),
+                key=str,
+            )
+            if len(classes) < 2:
+                logger.info(f"Ticket classifier head '{name}' skipped: {dict(counts)}")
+                continue
+            rows = [
+                (vec, s[name]) for vec, s in zip(vectors, train) if s[name] in classes
+            ]
+            head = SoftmaxHead(classes)
+            head.fit(
+                [vec for vec, _ in rows],
+                [label for _, label in rows],
+                settings.TICKET_CLASSIFIER_EPOCHS,
+                settings.TICKET_CLASSIFIER_LEARNING_RATE,
+            )
+            heads[name] = head
+
+        self.vectorizer, self.heads = vectorizer, heads
+        self.report = self.evaluate(test)
+        self.report["train_samples"] = len(train)
+        return self.report
+
+    def evaluate(self, samples: List[Dict]) -> Dict:
+        """Точность по головам, precision/recall по классам и доля тикетов без LLM."""
+        report: Dict = {"test_samples": len(samples), "heads": {}}
+        if not samples:
+            return report
+
+        predictions = [self.predict(s["text"]) for s in samples]
+        for name, head in self.heads.items():
+            pairs = [(s[name], p[name][0]) for s, p in zip(samples, predictions)]
+            classes = {}
+            for label in head.classes:
+                tp = sum(1 for y, p in pairs if y == label and p == label)
+                predicted = sum(1 for _, p in pairs if p == label)
+                support = sum(1 for y, _ in pairs if y == label)
+                classes[str(label)] = {
+                    "precision": round(tp / predicted, 3) if predicted else None,
+                    "recall": round(tp / support, 3) if support else None,
+                    "support": support,
+                }
+            report["heads"][name] = {
+                "accuracy": round(sum(1 for y, p in pairs if y == p) / len(pairs), 3),
+                "classes": classes,
+            }
+
+        if self.trained:
+            covered = [
+                (s, labels)
+                for s, labels in ((s, self.classify(s["text"])) for s in samples)
+                if labels
+            ]
+            report["coverage"] = round(len(covered) / len(samples), 3)
+            report["covered_accuracy"] = {
+                name: (
+                    round(
+                        sum(1 for s, l in covered if s[name] == l[name]) / len(covered),
+                        3,
+                    )
+                    if covered
+                    else None
+                )
+                for name in HEADS
+            }
+        return report
+
+    async def train(self, repo: MessageRepository, limit: Optional[int] = None) -> Dict:
+        rows = await repo.get_labeled_tickets(
+            limit or settings.TICKET_CLASSIFIER_TRAIN_LIMIT
+        )
+        samples = [
+            {
+                "text": row["original_message"] or "",
+                "category": row["category"],
+                "sentiment": row["sentiment"],
+                "important": bool(row["is_important"]),
+            }
+            for row in rows
+        ]
+        if len(samples) < settings.TICKET_CLASSIFIER_MIN_SAMPLES:
+            logger.info(f"Ticket classifier not trained: {len(samples)} samples")
+            return {"train_samples": len(samples), "trained": False}
+
+        # Чистый Python: обучение в потоке, чтобы не держать event loop
+        report = await asyncio.to_thread(self.fit, samples)
+        if self.trained:
+            self.save()
+        logger.info(f"Ticket classifier trained: {json.dumps(report['heads'])}")
+        return {**report, "trained": self.trained}
+
+    async def load_or_train(self, repo: MessageRepository):
+        """Модель с диска (после команды переобучения), иначе обучение на истории."""
+        if not self.load():
+            await self.train(repo)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "vocab": self.vectorizer.vocab,
+            "idf": self.vectorizer.idf,
+            "heads": {name: head.to_dict() for name, head in self.heads.items()},
+            "report": self.report,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            vectorizer = TfidfVectorizer()
+            vectorizer.vocab, vectorizer.idf = data["vocab"], data["idf"]
+            heads = {
+                name: SoftmaxHead.from_dict(head)
+                for name, head in data["heads"].items()
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load ticket classifier from {self.path}: {e}")
+            return False
+        self.vectorizer, self.heads = vectorizer, heads
+        self.report = data.get("report", {})
+        logger.info(f"Ticket classifier loaded from {self.path}")
+        return True
+
+    @property
+    def stats(self) -> Dict:
+        return {"trained": self.trained, "path": self.path, "report": self.report}
+
+
+# Синглтон
+ticket_classifier = TicketClassifier(settings.TICKET_CLASSIFIER_PATH)
+
+
+async def _retrain(limit: int):
+    from app.db.database import create_db_pool
+
+    pool = await create_db_pool()
+    try:
+        report = await ticket_classifier.train(MessageRepository(pool), limit)
+    finally:
+        await pool.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Переобучение классификатора тикетов и отчет о точности"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=settings.TICKET_CLASSIFIER_TRAIN_LIMIT
+    )
+    args = parser.parse_args()
+    asyncio.run(_retrain(args.limit))
@@ -0,0 +1,10 @@
+# app/services/utils.py
+import re
+from typing import List
+
+# Слова от трех символов: общий токенизатор спам-фильтра и классификатора
+TOKEN_RE = re.compile(r"\w{3,}")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
@@ -1,20 +1,70 @@
 # app/workers/email_watcher.py
 import asyncio
 import logging
+from typing import Optional
 
 from app.config import settings
 from app.db.repository import MessageRepository
+from app.messaging.ingest_queue import IngestQueue
 from app.services.email_service import EmailService
+from app.services.imap_idle import ImapIdleSession
 
 logger = logging.getLogger(__name__)
 
 
-async def email_polling_worker(repo: MessageRepository):
+async def email_polling_worker(
+    repo: MessageRepository, ingest_queue: Optional[IngestQueue] = None
+):
     """Периодически опрашивает почту."""
-    service = EmailService(repo)
+    service = EmailService(repo, ingest_queue)
     while True:
         try:
             await service.process_and_save_emails()
         except Exception:
             logger.exception("Error in email polling")
         await asyncio.sleep(settings.POLLING_INTERVAL)
+
+
+async def email_idle_worker(
+    repo: MessageRepository, ingest_queue: Optional[IngestQueue] = None
+):
+    """
+    Push-режим: держит одну IMAP-сессию в IDLE и забирает почту сразу по EXISTS.
+    При обрыве переподключается, без поддержки IDLE - переходит на polling.
+    """
+    service = EmailService(repo, ingest_queue)
+    if not service.username or not service.password:
+        logger.warning("IMAP credentials missing. Falling back to polling.")
+        return await email_polling_worker(repo, ingest_queue)
+
+    loop = asyncio.get_event_loop()
+    while True:
+        session = ImapIdleSession(service)
+        try:
+            await loop.run_in_executor(None, session.connect)
+            if not session.supports_idle:
+                logger.warning("IMAP server has no IDLE. Falling back to polling.")
+                session.close()
+                return await email_polling_worker(repo, ingest_queue)
+
+            logger.info("IMAP IDLE session established")
+            # Забираем то, что пришло, пока сессии не было
+            await service.process_and_save_emails(imap=session.imap)
+
+            while True:
+                has_new = await loop.run_in_executor(
+                    None, session.idle, settings.IMAP_IDLE_TIMEOUT
+                )
+                if has_new:
+                    await service.process_and_save_emails(imap=session.imap)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                f"IMAP IDLE session failed. Reconnecting in "
+                f"{settings.IMAP_RECONNECT_DELAY}s"
+            )
+            await asyncio.sleep(settings.IMAP_RECONNECT_DELAY)
+        finally:
+            session.close()
@@ -0,0 +1,48 @@
+# app/workers/ingest_worker.py
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from app.config import settings
+from app.db.repository import MessageRepository
+from app.messaging.ingest_queue import IngestQueue
+from app.services.email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+def consumer_name(index: int) -> str:
+    """Уникальное имя консьюмера в группе: хост + pid + номер воркера."""
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+async def ingest_consumer_worker(
+    repo: MessageRepository, queue: IngestQueue, consumer: str
+):
+    """
+    Читает письма из Redis Stream и прогоняет их через конвейер обработки.
+    Периодически забирает зависшие записи упавших консьюмеров.
+    Таких воркеров может быть сколько угодно на любом числе реплик.
+    """
+    service = EmailService(repo, queue)
+    await queue.ensure_group()
+    logger.info(f"Ingest consumer {consumer} started")
+
+    last_claim = 0.0
+    while True:
+        try:
+            entries = []
+            if time.monotonic() - last_claim >= settings.INGEST_CLAIM_INTERVAL:
+                last_claim = time.monotonic()
+                entries = await queue.claim_stale(consumer)
+            if not entries:
+                entries = await queue.read(consumer)
+            if entries:
+                await service.process_queue_entries(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Error in ingest consumer {consumer}")
+            await asyncio.sleep(1)
@@ -0,0 +1,38 @@
+# app/workers/llm_retry_worker.py
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+from app.db.repository import MessageRepository
+from app.messaging.ingest_queue import IngestQueue
+from app.messaging.retry_queue import retry_queue
+from app.services.email_service import EmailService
+from app.services.llm_dispatcher import llm_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+async def llm_retry_worker(
+    repo: MessageRepository, ingest_queue: Optional[IngestQueue] = None
+):
+    """
+    Возвращает в обработку письма, отложенные из-за недоступности LLM.
+    Пока circuit breaker открыт, очередь не трогается.
+    """
+    service = EmailService(repo, ingest_queue)
+    while True:
+        try:
+            if llm_dispatcher.breaker.state != "open":
+                emails = await retry_queue.pop_due(settings.LLM_RETRY_BATCH)
+                if emails:
+                    logger.info(f"Retrying {len(emails)} parked emails")
+                    if ingest_queue:
+                        await ingest_queue.push_many(emails)
+                    else:
+                        await service._process_emails(emails)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error in LLM retry worker")
+        await asyncio.sleep(settings.LLM_RETRY_INTERVAL)
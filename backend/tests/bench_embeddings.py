@@ -0,0 +1,65 @@
+# backend/tests/bench_embeddings.py
+"""
+Пропускная способность эмбеддингов E5 под параллельной нагрузкой.
+Запуск: python -m tests.bench_embeddings
+Сравнивает encode по одному запросу в потоке (прежний RAGEngine.embed_query)
+с динамическим батчингом embedding_service.
+"""
+
+import asyncio
+import time
+
+from app.services.embedding_service import EmbeddingService
+from app.services.model_registry import model_registry
+
+CONCURRENCY = 64
+ROUNDS = 4
+
+
+def make_queries(n: int):
+    # Разные тексты: кэш запросов не должен влиять на замер
+    return [
+        f"<NAME_1>: на приборе <DEVICE_1> горит ошибка E{i}, датчик не работает"
+        for i in range(n)
+    ]
+
+
+async def one_by_one(model, queries):
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                model.encode, [f"query: {query}"], normalize_embeddings=True
+            )
+            for query in queries
+        )
+    )
+
+
+async def batched(queries):
+    service = EmbeddingService()
+    await asyncio.gather(*(service.embed_query(query) for query in queries))
+    stats = service.stats
+    await service.close()
+    return stats
+
+
+async def main():
+    model = model_registry.get("embedding")
+    model.encode(["query: прогрев"], normalize_embeddings=True)
+
+    for name, run in (
+        ("one_by_one", lambda q: one_by_one(model, q)),
+        ("batched", batched),
+    ):
+        started = time.perf_counter()
+        for n in range(ROUNDS):
+            result = await run(make_queries(CONCURRENCY * (n + 1))[-CONCURRENCY:])
+        elapsed = time.perf_counter() - started
+        rate = CONCURRENCY * ROUNDS / elapsed
+        print(f"{name:<12} {rate:8.1f} queries/s")
+        if name == "batched":
+            print(f"{'':<12} avg batch {result['avg_query_batch']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
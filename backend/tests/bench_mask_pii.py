@@ -0,0 +1,72 @@
+# backend/tests/bench_mask_pii.py
+"""
+Бенчмарк маскирования на длинных письмах (~100 КБ с цитатами).
+Запуск: python -m tests.bench_mask_pii
+Сравнивает однопроходный mask_pii со старой схемой str.replace на сущность.
+"""
+
+import time
+from typing import Dict, List
+
+from app.services.parsing.utils import mask_pii, unmask_pii
+
+BODY_SIZE = 100_000
+ENTITY_COUNT = 200
+RUNS = 20
+
+
+def legacy_mask(text: str, entities: List[Dict]) -> str:
+    """Прежняя реализация: полный проход по тексту на каждую сущность."""
+    for ent in sorted(entities, key=lambda x: len(x["text"]), reverse=True):
+        text = text.replace(ent["text"], f"<{ent['type']}>")
+    return text
+
+
+def make_body():
+    chunks, entities = [], []
+    pos = 0
+    i = 0
+    while pos < BODY_SIZE:
+        if i < ENTITY_COUNT:
+            email = f"user{i}@example.ru"
+            chunk = f"> Пишет {email}: прибор снова не работает. "
+            start = pos + chunk.index(email)
+            entities.append(
+                {
+                    "type": "EMAIL",
+                    "text": email,
+                    "normal": email,
+                    "start": start,
+                    "end": start + len(email),
+                }
+            )
+        else:
+            chunk = "> Цитата предыдущего письма без персональных данных. "
+        chunks.append(chunk)
+        pos += len(chunk)
+        i += 1
+    return "".join(chunks), entities
+
+
+def bench(name, func):
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        func()
+    elapsed = (time.perf_counter() - started) / RUNS * 1000
+    print(f"{name:<12} {elapsed:8.2f} ms")
+
+
+def main():
+    body, entities = make_body()
+    print(f"body: {len(body)} chars, entities: {len(entities)}")
+
+    masked, entity_map = mask_pii(body, entities)
+    assert unmask_pii(masked, entity_map) == body
+
+    bench("legacy", lambda: legacy_mask(body, entities))
+    bench("mask_pii", lambda: mask_pii(body, entities))
+    bench("unmask_pii", lambda: unmask_pii(masked, entity_map))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import pytest_asyncio
 from app.api.deps import get_repository
 from app.db.repository import MessageRepository
 from app.main import app
+from app.services.dedup import dedup_index
 from httpx import ASGITransport, AsyncClient  # Важно: импортируем ASGITransport
 
 # --- Глобальные настройки ---
@@ -14,8 +15,11 @@ from httpx import ASGITransport, AsyncClient  # Важно: импортируе
 
 @pytest.fixture(scope="session", autouse=True)
 def set_test_env():
-    # Принудительно включаем мок режим
-    with patch("app.config.settings.USE_MOCK_AI", True):
+    # Принудительно включаем мок режим, руководства приборов не скачиваем
+    with (
+        patch("app.config.settings.USE_MOCK_AI", True),
+        patch("app.config.settings.RAG_ENABLED", False),
+    ):
         yield
 
 
@@ -26,6 +30,13 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def reset_dedup_index():
+    # Индекс дубликатов - синглтон, между тестами его нужно чистить
+    dedup_index.clear()
+    yield
+
+
 # --- Моки БД ---
 
 
@@ -0,0 +1,209 @@
+# backend/tests/fake_imap.py
+"""
+Минимальный IMAP-сервер для тестов (без SSL).
+Поддерживает LOGIN, SELECT, UID SEARCH/FETCH/STORE, IDLE, NOOP, LOGOUT.
+"""
+
+import re
+import select
+import socketserver
+import threading
+from email.message import EmailMessage
+from typing import List, Optional, Set, Tuple
+
+
+def make_raw_email(body: str, sender: str = "Клиент <client@test.ru>") -> bytes:
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = "support@test.ru"
+    msg["Subject"] = "Обращение"
+    msg.set_content(body)
+    return msg.as_bytes()
+
+
+class _FakeImapHandler(socketserver.StreamRequestHandler):
+    server: "FakeImapServer"
+
+    def send(self, line: bytes):
+        self.wfile.write(line)
+        self.wfile.flush()
+
+    def handle(self):
+        self.send(b"* OK Fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().rstrip("\r\n").split(" ", 2)
+            tag = parts[0].encode()
+            command = parts[1].upper() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else ""
+            self.server.log_command(command, args)
+
+            handler = getattr(self, f"cmd_{command.lower()}", None)
+            if handler is None:
+                self.send(tag + b" BAD unknown command\r\n")
+                continue
+            if handler(tag, args) is False:
+                return
+
+    # --- Команды ---
+
+    def cmd_capability(self, tag, args):
+        caps = "IMAP4rev1 IDLE" if self.server.support_idle else "IMAP4rev1"
+        self.send(f"* CAPABILITY {caps}\r\n".encode())
+        self.send(tag + b" OK CAPABILITY completed\r\n")
+
+    def cmd_login(self, tag, args):
+        self.send(tag + b" OK LOGIN completed\r\n")
+
+    def cmd_select(self, tag, args):
+        self.send(f"* {self.server.count()} EXISTS\r\n".encode())
+        self.send(f"* OK [UIDVALIDITY {self.server.uid_validity}]\r\n".encode())
+        self.send(f"* OK [UIDNEXT {self.server.uid_next}]\r\n".encode())
+        self.send(tag + b" OK [READ-WRITE] SELECT completed\r\n")
+
+    def cmd_noop(self, tag, args):
+        self.send(tag + b" OK NOOP completed\r\n")
+
+    def cmd_uid(self, tag, args):
+        command, _, rest = args.partition(" ")
+        handler = getattr(self, f"uid_{command.lower()}", None)
+        if handler is None:
+            self.send(tag + b" BAD unknown UID command\r\n")
+            return
+        if handler(rest) is False:
+            self.send(tag + f" NO UID {command.upper()} failed\r\n".encode())
+            return
+        self.send(tag + f" OK UID {command.upper()} completed\r\n".encode())
+
+    def uid_search(self, criteria):
+        messages = self.server.snapshot()
+        criteria = criteria.upper()
+        if criteria.startswith("UID "):
+            wanted = self.server.parse_uid_set(criteria[4:])
+            uids = [m["uid"] for m in messages if m["uid"] in wanted]
+            # RFC 3501: "N:*" всегда включает последнее письмо
+            if messages and criteria.endswith(":*") and not uids:
+                uids = [messages[-1]["uid"]]
+        elif criteria == "UNSEEN":
+            uids = [m["uid"] for m in messages if "\\Seen" not in m["flags"]]
+        else:
+            uids = [m["uid"] for m in messages]
+        line = "* SEARCH " + " ".join(str(uid) for uid in uids)
+        self.send(line.rstrip().encode() + b"\r\n")
+
+    def uid_fetch(self, rest):
+        uid_set, _, items = rest.partition(" ")
+        limit = re.search(r"BODY\.PEEK\[\]<0\.(\d+)>", items)
+        if uid_set in self.server.failing_fetches:
+            return False
+        wanted = self.server.parse_uid_set(uid_set)
+        for seq, msg in enumerate(self.server.snapshot(), start=1):
+            if msg["uid"] not in wanted:
+                continue
+            raw = msg["raw"][: int(limit.group(1))] if limit else msg["raw"]
+            head = f"* {seq} FETCH (UID {msg['uid']} BODY[]<0> {{{len(raw)}}}\r\n"
+            self.send(head.encode() + raw + b")\r\n")
+
+    def uid_store(self, rest):
+        uid_set, _, flags = rest.partition(" ")
+        wanted = self.server.parse_uid_set(uid_set)
+        for msg in self.server.snapshot():
+            if msg["uid"] in wanted and "\\Seen" in flags:
+                msg["flags"].add("\\Seen")
+
+    def cmd_idle(self, tag, args):
+        if not self.server.support_idle:
+            self.send(tag + b" BAD IDLE not supported\r\n")
+            return
+        known = self.server.count()
+        if self.server.exists_with_continuation:
+            # EXISTS одним пакетом с continuation: клиент прочитает его в буфер
+            self.send(f"+ idling\r\n* {known} EXISTS\r\n".encode())
+        else:
+            self.send(b"+ idling\r\n")
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self.send(tag + b" OK IDLE terminated\r\n")
+                    return
+            current = self.server.count()
+            if current != known:
+                known = current
+                self.send(f"* {current} EXISTS\r\n".encode())
+
+    def cmd_logout(self, tag, args):
+        self.send(b"* BYE Fake IMAP closing\r\n")
+        self.send(tag + b" OK LOGOUT completed\r\n")
+        return False
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, support_idle: bool = True):
+        super().__init__(("127.0.0.1", 0), _FakeImapHandler)
+        self.support_idle = support_idle
+        self.uid_validity = 1
+        self.uid_next = 1
+        self.commands: List[Tuple[str, str]] = []
+        # UID FETCH этих sequence-set отвечает NO
+        self.failing_fetches: Set[str] = set()
+        self.exists_with_continuation = False
+        self._messages: List[dict] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeImapServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def add_message(self, raw: bytes):
+        with self._lock:
+            self._messages.append({"uid": self.uid_next, "raw": raw, "flags": set()})
+            self.uid_next += 1
+
+    def parse_uid_set(self, uid_set: str) -> Set[int]:
+        uids: Set[int] = set()
+        for part in uid_set.split(","):
+            start, _, end = part.partition(":")
+            last = self.uid_next - 1
+            lo = last if start == "*" else int(start)
+            hi = lo if not end else (last if end == "*" else int(end))
+            uids.update(range(min(lo, hi), max(lo, hi) + 1))
+        return uids
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._messages)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return list(self._messages)
+
+    def log_command(self, command: str, args: str):
+        with self._lock:
+            self.commands.append((command, args))
+
+    def command_count(self, command: str, prefix: str = "") -> int:
+        with self._lock:
+            return sum(
+                1
+                for cmd, args in self.commands
+                if cmd == command and args.upper().startswith(prefix)
+            )
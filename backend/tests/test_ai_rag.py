@@ -0,0 +1,220 @@
+# backend/tests/test_ai_rag.py
+import asyncio
+from contextlib import ExitStack, contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.services import ai_processor
+from app.services.email_service import EmailService
+from app.services.metrics import LatencyTracker
+
+LLM_RESULT = {"summary": "Ошибка датчика", "answer": "Перезагрузите прибор"}
+CHUNK = "При ошибке E3 перезагрузите прибор и проверьте сенсор."
+
+
+def fake_rag(index_delay: float = 0.0):
+    async def load_index(device_name, pdf_path):
+        await asyncio.sleep(index_delay)
+        return "index", {0: CHUNK}
+
+    rag = MagicMock()
+    rag.has_index.return_value = False
+    rag.load_index = AsyncMock(side_effect=load_index)
+    rag.embed_query = AsyncMock(return_value="query-emb")
+    rag.search = AsyncMock(return_value=[CHUNK])
+    return rag
+
+
+@contextmanager
+def rag_env(rag, tracker, budget=1.0):
+    """Реальный process_ticket_ai с подмененными поиском, скачиванием и LLM."""
+    settings = {
+        "USE_MOCK_AI": False,
+        "RAG_ENABLED": True,
+        "RAG_LATENCY_BUDGET": budget,
+        "LLM_CACHE_ENABLED": False,
+        "SEMANTIC_CACHE_ENABLED": False,
+    }
+    with ExitStack() as stack:
+        for name, value in settings.items():
+            stack.enter_context(patch.object(ai_processor.settings, name, value))
+        stack.enter_context(patch.object(ai_processor, "rag_engine", rag))
+        stack.enter_context(patch.object(ai_processor, "ticket_latency", tracker))
+        mock_fetch = stack.enter_context(
+            patch.object(
+                ai_processor,
+                "find_and_download_pdf",
+                AsyncMock(return_value="/data/knowledge_base/ДГС ЭРИС-230.pdf"),
+            )
+        )
+        mock_llm = stack.enter_context(
+            patch.object(ai_processor, "_call_llm", AsyncMock(return_value=LLM_RESULT))
+        )
+        yield mock_fetch, mock_llm
+
+
+@pytest.mark.asyncio
+async def test_manual_context_reaches_prompt():
+    rag, tracker = fake_rag(), LatencyTracker()
+    with rag_env(rag, tracker) as (mock_fetch, mock_llm):
+        result = await ai_processor.process_ticket_ai(
+            "<NAME_1>: ошибка E3 на <DEVICE_1>", "ДГС ЭРИС-230"
+        )
+
+    assert result["answer"] == "Перезагрузите прибор"
+    mock_fetch.assert_awaited_once_with("ДГС ЭРИС-230")
+    rag.load_index.assert_awaited_once_with(
+        "ДГС ЭРИС-230", "/data/knowledge_base/ДГС ЭРИС-230.pdf"
+    )
+    assert CHUNK in mock_llm.await_args.args[0]
+
+    steps = tracker.stats["steps"]
+    for step in ("fetch_pdf", "rag_index", "rag_embed", "rag_search", "llm", "total"):
+        assert steps[step]["count"] == 1
+    assert "rag_timeout" not in tracker.events
+
+
+@pytest.mark.asyncio
+async def test_slow_retrieval_does_not_stall_generation():
+    rag, tracker = fake_rag(index_delay=0.3), LatencyTracker()
+    with rag_env(rag, tracker, budget=0.05) as (_, mock_llm):
+        started = asyncio.get_running_loop().time()
+        await ai_processor.process_ticket_ai("ошибка на <DEVICE_1>", "ДГС ЭРИС-230")
+        elapsed = asyncio.get_running_loop().time() - started
+
+        assert elapsed < 0.25
+        assert mock_llm.await_args.args[0] == ai_processor.PROMPT_GENERATE_ANSWER
+        assert tracker.events["rag_timeout"] == 1
+
+        # Поиск не отменен: индекс достраивается в фоне для следующих тикетов
+        await asyncio.gather(*ai_processor._background_tasks)
+
+    rag.search.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_ticket_without_device_skips_retrieval():
+    rag, tracker = fake_rag(), LatencyTracker()
+    with rag_env(rag, tracker) as (mock_fetch, _):
+        await ai_processor.process_ticket_ai("Прибор не работает", None)
+
+    mock_fetch.assert_not_awaited()
+    rag.embed_query.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_mask_stage_starts_retrieval_before_classify():
+    rag, tracker = fake_rag(), LatencyTracker()
+    service = EmailService(repo=MagicMock())
+    item = {
+        "body": "Я Петр Петров, ошибка E3 на ДГС ЭРИС-230",
+        "sender": "a@b.ru",
+        "entities": [
+            {"type": "NAME", "text": "Петр Петров", "normal": "Петр Петров"},
+            {"type": "DEVICE", "text": "ДГС ЭРИС-230", "normal": "ДГС ЭРИС-230"},
+        ],
+    }
+    labels = {"category": "неисправность", "sentiment": "negative", "important": False}
+    classifier = MagicMock()
+    classifier.classify.return_value = labels
+
+    with (
+        rag_env(rag, tracker) as (mock_fetch, mock_llm),
+        patch("app.services.email_service.ticket_classifier", classifier),
+        patch("app.services.email_service.settings.TICKET_CLASSIFIER_ENABLED", True),
+    ):
+        item = await service._stage_mask(item)
+        retrieval = item["retrieval"]
+        assert retrieval is not None
+        item = await service._stage_classify(item)
+        item = await service._stage_ai(item)
+
+    # Поиск запущен один раз - на стадии маскирования
+    mock_fetch.assert_awaited_once_with("ДГС ЭРИС-230")
+    assert retrieval.done()
+    assert CHUNK in mock_llm.await_args.args[0]
+    assert {"fetch_pdf", "rag_total", "llm", "total"} <= set(item["timings"])
+
+
+@pytest.mark.asyncio
+async def test_classified_spam_cancels_retrieval():
+    rag, tracker = fake_rag(index_delay=1), LatencyTracker()
+    service = EmailService(repo=MagicMock())
+    item = {
+        "body": "Вебинар по заработку, ДГС ЭРИС-230",
+        "sender": "a@b.ru",
+        "entities": [
+            {"type": "DEVICE", "text": "ДГС ЭРИС-230", "normal": "ДГС ЭРИС-230"}
+        ],
+    }
+    classifier = MagicMock()
+    classifier.classify.return_value = {"category": "спам"}
+
+    with (
+        rag_env(rag, tracker),
+        patch("app.services.email_service.ticket_classifier", classifier),
+        patch("app.services.email_service.settings.TICKET_CLASSIFIER_ENABLED", True),
+    ):
+        item = await service._stage_mask(item)
+        await asyncio.sleep(0.01)
+        item = await service._stage_classify(item)
+        with pytest.raises(asyncio.CancelledError):
+            await item["retrieval"]
+
+    assert item["ticket"]["filtered_by"] == "ticket_classifier"
+    rag.search.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_cancels_retrieval():
+    rag, tracker = fake_rag(index_delay=1), LatencyTracker()
+    cache = MagicMock()
+    cache.get = AsyncMock(return_value={**LLM_RESULT, "manual_required": False})
+
+    with (
+        rag_env(rag, tracker) as (_, mock_llm),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", True),
+        patch.object(ai_processor, "llm_cache", cache),
+    ):
+        retrieval = ai_processor.start_retrieval("ошибка E3", "ДГС ЭРИС-230", {})
+        await asyncio.sleep(0.01)
+        result = await ai_processor.process_ticket_ai(
+            "ошибка E3", "ДГС ЭРИС-230", retrieval=retrieval
+        )
+        with pytest.raises(asyncio.CancelledError):
+            await retrieval
+
+    assert result["answer"] == LLM_RESULT["answer"]
+    mock_llm.assert_not_awaited()
+    rag.search.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_retrievals_are_bounded():
+    rag, tracker = fake_rag(index_delay=0.2), LatencyTracker()
+
+    with (
+        rag_env(rag, tracker),
+        patch.object(ai_processor, "_retrieval_slots", asyncio.Semaphore(1)),
+    ):
+        first = ai_processor.start_retrieval("ошибка E3", "ДГС ЭРИС-230", {})
+        await asyncio.sleep(0.01)
+        # Слот занят сборкой: второй тикет не ставит в очередь еще одну
+        assert ai_processor.start_retrieval("ошибка E4", "ПГ ЭРИС-414", {}) is None
+        assert await first == [CHUNK]
+        assert await ai_processor.start_retrieval("ошибка E4", "ПГ ЭРИС-414", {})
+
+    assert tracker.events["rag_skipped"] == 1
+
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=100)
+    for ms in range(1, 101):
+        tracker.record("llm", ms / 1000)
+
+    stats = tracker.stats["steps"]["llm"]
+
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == 51.0
+    assert stats["p95_ms"] == 96.0
+    assert stats["max_ms"] == 100.0
@@ -0,0 +1,52 @@
+# backend/tests/test_cache.py
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from app.services.cache import MISSING, TTLCache
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+
+
+def test_ttl_expiry():
+    cache = TTLCache(maxsize=10, ttl=5)
+    with patch("app.services.cache.time.monotonic", return_value=100):
+        cache.set("a", None)
+        assert cache.get("a") is None
+    with patch("app.services.cache.time.monotonic", return_value=106):
+        assert cache.get("a") is MISSING
+
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+    assert len(cache) == 0
+
+
+def test_concurrent_threads_share_cache():
+    """Как кэши морфологии: потоки NER вытесняют ключи, которые читают другие."""
+    cache = TTLCache(maxsize=8, ttl=60)
+
+    def hammer(worker: int):
+        for i in range(20_000):
+            key = (worker + i) % 16
+            if cache.get(key) is MISSING:
+                cache.set(key, i)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(hammer, range(4)))
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert len(cache) <= 8
+    assert cache.stats["hits"] + cache.stats["misses"] == 80_000
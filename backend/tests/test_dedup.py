@@ -0,0 +1,117 @@
+# backend/tests/test_dedup.py
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import asyncpg
+import pytest
+from app.services.dedup import BloomFilter, body_hash, dedup_index
+from app.services.email_service import EmailService
+from app.services.parsing.ner_pool import ner_pool
+
+BODY = "Я Петр Петров. Сломался прибор ДГС ЭРИС-230."
+
+
+def test_body_hash_normalization():
+    quoted = f"  {BODY.upper()}\n\n> Ранее вы писали:\n> старый текст"
+    assert body_hash(quoted, "A@B.ru") == body_hash(BODY, "a@b.ru")
+    assert body_hash(BODY, "a@b.ru") != body_hash(BODY, "other@b.ru")
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"key-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+
+@pytest.fixture
+def repo():
+    """Уникальные индексы message_id и body_hash, как в БД."""
+    saved = {}
+
+    async def create_ticket(ticket):
+        keys = {("mid", ticket["message_id"]), ("hash", ticket["body_hash"])}
+        if keys & saved.keys():
+            raise asyncpg.UniqueViolationError("duplicate key")
+        ticket_id = uuid4()
+        saved.update(dict.fromkeys(keys, ticket_id))
+        return ticket_id
+
+    repo = MagicMock()
+    repo.create_ticket = AsyncMock(side_effect=create_ticket)
+    repo.find_duplicate = AsyncMock(return_value=None)
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_duplicates_in_batch_saved_once(repo, mock_ai_processor):
+    emails = [
+        {"body": BODY, "email_addr": "a@b.ru", "message_id": "<1@mail>"},
+        {"body": BODY + "  ", "email_addr": "a@b.ru", "message_id": "<2@mail>"},
+        {"body": BODY, "email_addr": "a@b.ru", "message_id": "<1@mail>"},
+    ]
+    with patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock):
+        results = await EmailService(repo)._process_emails(emails)
+
+    assert len(results) == 1
+    saved = results[0]["ticket"]
+    assert saved["body_hash"] == body_hash(BODY, "a@b.ru")
+
+    # Сохраненный тикет помнится: следующий повтор отсекается до NER
+    later = [{"body": BODY, "email_addr": "a@b.ru", "message_id": "<3@mail>"}]
+    with patch.object(ner_pool, "extract_batch", new_callable=AsyncMock) as mock_ner:
+        assert await EmailService(repo)._process_emails(later) == []
+    mock_ner.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_persist_is_not_a_duplicate_on_redelivery(repo, mock_ai_processor):
+    queue = MagicMock()
+    queue.ack = AsyncMock()
+    email = {
+        "body": BODY,
+        "email_addr": "a@b.ru",
+        "message_id": "<1@mail>",
+        "entry_id": "1-0",
+    }
+    create_ticket = repo.create_ticket.side_effect
+
+    async def fail_once(ticket):
+        if repo.create_ticket.await_count == 1:
+            raise ConnectionError("db down")
+        return await create_ticket(ticket)
+
+    repo.create_ticket.side_effect = fail_once
+
+    with patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock):
+        assert await EmailService(repo, queue)._process_emails([email]) == []
+        queue.ack.assert_not_awaited()
+
+        # XAUTOCLAIM вернул запись: она обрабатывается заново, а не теряется
+        results = await EmailService(repo, queue)._process_emails([email])
+
+    assert len(results) == 1
+    assert repo.create_ticket.await_count == 2
+    queue.ack.assert_awaited_once_with("1-0")
+
+
+@pytest.mark.asyncio
+async def test_known_message_id_skips_ner(repo):
+    existing = uuid4()
+    repo.get_dedup_keys = AsyncMock(
+        return_value=[{"message_id": "<old@mail>", "body_hash": None}]
+    )
+    repo.find_duplicate = AsyncMock(return_value=existing)
+    await dedup_index.warm_up(repo)
+
+    emails = [{"body": "Повтор", "email_addr": "a@b.ru", "message_id": "<old@mail>"}]
+    with patch.object(ner_pool, "extract_batch", new_callable=AsyncMock) as mock_ner:
+        results = await EmailService(repo)._process_emails(emails)
+
+    assert results == []
+    mock_ner.assert_not_awaited()
+    repo.create_ticket.assert_not_awaited()
+    assert dedup_index.stats["duplicates"] == 1
@@ -0,0 +1,118 @@
+# backend/tests/test_device_catalog.py
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from app.services.parsing.device_catalog import DeviceCatalog
+from app.services.parsing.ner_extractor import extract_entities
+
+
+def write_catalog(path, devices, mtime=None):
+    path.write_text(
+        json.dumps({"serial_length": 9, "devices": devices}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    if mtime:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    path = tmp_path / "devices.json"
+    write_catalog(
+        path,
+        [
+            {
+                "name": "ДГС ЭРИС-230",
+                "aliases": ["ДГС-230"],
+                "serial_prefixes": ["230"],
+            },
+            {"name": "СГОЭС", "aliases": ["СГОЭС-М"], "serial_prefixes": ["5510"]},
+        ],
+        mtime=1_000_000,
+    )
+    return path
+
+
+def test_single_scan_finds_all_mentions(catalog_file):
+    catalog = DeviceCatalog(str(catalog_file))
+    text = "Сломались дгс-230 и СГОЭС-М, а ДГС ЭРИС-2300 в порядке"
+
+    devices = catalog.find_devices(text)
+
+    assert [(d["text"], d["normal"]) for d in devices] == [
+        ("дгс-230", "ДГС ЭРИС-230"),
+        ("СГОЭС-М", "СГОЭС"),
+    ]
+    for device in devices:
+        assert text[device["start"] : device["end"]] == device["text"]
+
+
+def test_serial_uses_longest_prefix(catalog_file):
+    catalog = DeviceCatalog(str(catalog_file))
+
+    serials = catalog.find_serials("Номера 551012345 и 230201384, телефон 1234")
+
+    assert [(s["text"], s["normal"]) for s in serials] == [
+        ("551012345", "СГОЭС"),
+        ("230201384", "ДГС ЭРИС-230"),
+    ]
+    assert all(s["serial"] for s in serials)
+
+
+def test_serial_prefers_longer_overlapping_prefix(tmp_path):
+    path = tmp_path / "devices.json"
+    write_catalog(
+        path,
+        [
+            {"name": "Общий", "serial_prefixes": ["23"]},
+            {"name": "ДГС ЭРИС-230", "serial_prefixes": ["230"]},
+        ],
+    )
+    catalog = DeviceCatalog(str(path))
+
+    serials = catalog.find_serials("230201384, 231000000, 2302013840 и 23020138")
+
+    assert [(s["text"], s["normal"]) for s in serials] == [
+        ("230201384", "ДГС ЭРИС-230"),
+        ("231000000", "Общий"),
+    ]
+
+
+def test_offsets_survive_case_folding_length_change(catalog_file):
+    catalog = DeviceCatalog(str(catalog_file))
+    # "İ".lower() - два символа, смещения не должны съезжать
+    text = "İİ дгс-230, номер 230201384"
+
+    devices = catalog.find_devices(text) + catalog.find_serials(text)
+
+    assert [d["text"] for d in devices] == ["дгс-230", "230201384"]
+    for device in devices:
+        assert text[device["start"] : device["end"]] == device["text"]
+
+
+def test_hot_reload_on_file_change(catalog_file):
+    catalog = DeviceCatalog(str(catalog_file))
+    assert catalog.find_devices("Прибор Сенсон-СВ-5022") == []
+
+    write_catalog(catalog_file, [{"name": "Сенсон-СВ-5022"}], mtime=2_000_000)
+    with patch(
+        "app.services.parsing.device_catalog.settings.DEVICE_CATALOG_RELOAD_INTERVAL", 0
+    ):
+        assert catalog.find_devices("Прибор Сенсон-СВ-5022")[0]["normal"] == (
+            "Сенсон-СВ-5022"
+        )
+
+        # Битый файл не ломает уже загруженный каталог
+        catalog_file.write_text("{", encoding="utf-8")
+        os.utime(catalog_file, (3_000_000, 3_000_000))
+        assert catalog.find_devices("Прибор Сенсон-СВ-5022")
+
+
+def test_extract_entities_uses_catalog_aliases():
+    entities = extract_entities("Не работает ДГС-230, зав. номер 414555666")
+    devices = [e for e in entities if e["type"] == "DEVICE"]
+
+    assert devices[0]["normal"] == "ДГС ЭРИС-230"
+    assert devices[0]["text"] == "ДГС-230"
@@ -0,0 +1,120 @@
+# backend/tests/test_embedding_service.py
+import asyncio
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from app.services import embedding_service as embedding_module
+from app.services.embedding_service import EmbeddingService
+
+DIM = 4
+
+
+def text_vector(text: str) -> np.ndarray:
+    return np.full(DIM, float(sum(map(ord, text))), dtype="float32")
+
+
+def recording_encoder(delay: float = 0.0, fail: bool = False):
+    """Вектор зависит только от текста; calls - тексты каждого encode."""
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("model crashed")
+        return np.stack([text_vector(text) for text in texts])
+
+    return encode, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_encode():
+    encode, calls = recording_encoder()
+    service = EmbeddingService(encode)
+    texts = [f"ошибка E{i} на приборе" for i in range(10)]
+
+    vectors = await asyncio.gather(*(service.embed_query(text) for text in texts))
+    await service.close()
+
+    assert calls == [[f"query: {text}" for text in texts]]
+    for text, vector in zip(texts, vectors):
+        assert vector.shape == (1, DIM)
+        assert np.array_equal(vector[0], text_vector(f"query: {text}"))
+    assert service.stats["avg_query_batch"] == 10
+
+
+@pytest.mark.asyncio
+async def test_batch_is_capped_by_size():
+    encode, calls = recording_encoder()
+    service = EmbeddingService(encode)
+
+    with patch.object(embedding_module.settings, "EMBEDDING_MAX_BATCH", 4):
+        await asyncio.gather(*(service.embed_query(f"тикет {i}") for i in range(10)))
+    await service.close()
+
+    assert [len(batch) for batch in calls] == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_served_from_cache():
+    encode, calls = recording_encoder()
+    service = EmbeddingService(encode)
+
+    # Одинаковые тексты в одном окне считаются один раз
+    first, same = await asyncio.gather(
+        service.embed_query("датчик не работает"),
+        service.embed_query("датчик не работает"),
+    )
+    again = await service.embed_query("датчик не работает")
+    await service.close()
+
+    assert calls == [["query: датчик не работает"]]
+    assert first is same is again
+    assert not again.flags.writeable
+    assert service.stats["cache"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queries_overtake_passage_indexing():
+    encode, calls = recording_encoder(delay=0.05)
+    service = EmbeddingService(encode)
+    passages = [f"Раздел {i}" for i in range(6)]
+
+    with patch.object(embedding_module.settings, "EMBEDDING_PASSAGE_BATCH", 2):
+        build = asyncio.create_task(service.embed_passages(passages))
+        # Запрос приходит, пока считается первая порция фрагментов
+        await asyncio.sleep(0.02)
+        query = await service.embed_query("ошибка E3")
+        vectors = await build
+    await service.close()
+
+    assert calls == [
+        ["passage: Раздел 0", "passage: Раздел 1"],
+        ["query: ошибка E3"],
+        ["passage: Раздел 2", "passage: Раздел 3"],
+        ["passage: Раздел 4", "passage: Раздел 5"],
+    ]
+    assert query.shape == (1, DIM)
+    assert vectors.shape == (6, DIM)
+    assert np.array_equal(vectors[5], text_vector("passage: Раздел 5"))
+
+
+@pytest.mark.asyncio
+async def test_encode_error_reaches_every_waiter():
+    encode, _ = recording_encoder(fail=True)
+    service = EmbeddingService(encode)
+
+    results = await asyncio.gather(
+        service.embed_query("первый"),
+        service.embed_query("второй"),
+        return_exceptions=True,
+    )
+    with pytest.raises(RuntimeError):
+        await service.embed_passages(["Раздел 1"])
+    await service.close()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert service.stats["errors"] == 2
+    assert service.stats["cache"]["size"] == 0
@@ -0,0 +1,50 @@
+# backend/tests/test_fetcher.py
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from app.services import fetcher
+from app.services.cache import TTLCache
+
+EMPTY_SEARCH = "<html><body><div class='results'></div></body></html>"
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Сайт без найденных приборов; requests - пути всех запросов."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, text=EMPTY_SEARCH)
+
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs):
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    with (
+        patch.object(fetcher.settings, "DATA_DIR", str(tmp_path)),
+        patch.object(fetcher, "missing_manuals", TTLCache(100, 60)),
+        patch.object(fetcher.httpx, "AsyncClient", side_effect=client),
+    ):
+        yield requests
+
+
+@pytest.mark.asyncio
+async def test_missing_manual_is_not_searched_again(site):
+    assert await fetcher.find_and_download_pdf("ДГС ЭРИС-999") is None
+    assert await fetcher.find_and_download_pdf("ДГС ЭРИС-999") is None
+
+    assert site == ["/ru/products"]
+
+
+@pytest.mark.asyncio
+async def test_missing_manual_is_searched_after_ttl(site):
+    with patch.object(fetcher, "missing_manuals", TTLCache(100, 0.01)):
+        await fetcher.find_and_download_pdf("ДГС ЭРИС-999")
+        await asyncio.sleep(0.02)
+        await fetcher.find_and_download_pdf("ДГС ЭРИС-999")
+
+    assert site == ["/ru/products", "/ru/products"]
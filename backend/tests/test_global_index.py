@@ -0,0 +1,95 @@
+# backend/tests/test_global_index.py
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+from app.services import ai_processor
+from app.services.global_index import GlobalVectorIndex, benchmark
+
+DIM = 32
+DEVICES = ["ДГС ЭРИС-230", "ПГ ЭРИС-414", "СГОЭС"]
+
+
+def make_corpus(per_device: int = 300):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((per_device * len(DEVICES), DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [
+        {
+            "device": DEVICES[i // per_device],
+            "document": f"{DEVICES[i // per_device]}.pdf",
+            "page": i % per_device // 10 + 1,
+            "text": f"Фрагмент {i}",
+        }
+        for i in range(len(vectors))
+    ]
+    return vectors, chunks
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf", "flat"])
+def test_device_filter_and_global_search(index_type, tmp_path):
+    vectors, chunks = make_corpus()
+    index = GlobalVectorIndex(str(tmp_path / "global"))
+    index.build(vectors, chunks, index_type)
+
+    own = index.search_sync(vectors[10], 3)
+    filtered = index.search_sync(vectors[10], 5, "ПГ ЭРИС-414")
+
+    assert own[0]["id"] == 10
+    assert own[0]["device"] == "ДГС ЭРИС-230" and own[0]["page"] == 2
+    assert len(filtered) == 5
+    assert {chunk["device"] for chunk in filtered} == {"ПГ ЭРИС-414"}
+    # Неизвестный прибор - поиск по всей базе
+    assert index.search_sync(vectors[10], 3, "Неизвестный")[0]["id"] == 10
+
+
+def test_index_survives_save_and_load(tmp_path):
+    vectors, chunks = make_corpus(50)
+    index = GlobalVectorIndex(str(tmp_path / "global"))
+    index.build(vectors, chunks, "hnsw")
+    index.save()
+
+    loaded = GlobalVectorIndex(index.index_dir)
+
+    assert loaded.load()
+    assert loaded.stats == {"ready": True, "type": "hnsw", "chunks": 150, "devices": 3}
+    assert loaded.search_sync(vectors[42], 1)[0]["text"] == "Фрагмент 42"
+
+
+def test_benchmark_reports_recall_against_flat(tmp_path):
+    vectors, chunks = make_corpus()
+    index = GlobalVectorIndex(str(tmp_path / "global"))
+    index.build(vectors, chunks, "hnsw")
+    queries = vectors[::30] + 0.05
+
+    report = benchmark(index, queries, [c["device"] for c in chunks[::30]], k=5)
+
+    assert report["global"]["recall"] >= 0.9
+    assert report["device"]["recall"] == 1.0
+    assert set(report["global"]) == {"recall", "index", "flat_baseline"}
+
+
+@pytest.mark.asyncio
+async def test_ticket_without_device_gets_global_context(tmp_path):
+    vectors, chunks = make_corpus(50)
+    index = GlobalVectorIndex(str(tmp_path / "global"))
+    index.build(vectors, chunks, "flat")
+    rag = MagicMock()
+    rag.embed_query = AsyncMock(return_value=vectors[7])
+    llm = AsyncMock(return_value={"summary": "ok", "answer": "ok"})
+
+    with (
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor.settings, "RAG_ENABLED", True),
+        patch.object(ai_processor.settings, "RAG_GLOBAL_INDEX", True),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", False),
+        patch.object(ai_processor.settings, "SEMANTIC_CACHE_ENABLED", False),
+        patch.object(ai_processor, "global_index", index),
+        patch.object(ai_processor, "rag_engine", rag),
+        patch.object(ai_processor, "find_and_download_pdf", AsyncMock()) as fetch,
+        patch.object(ai_processor, "_call_llm", llm),
+    ):
+        await ai_processor.process_ticket_ai("Прибор не работает", None)
+
+    fetch.assert_not_awaited()
+    assert "Фрагмент 7" in llm.await_args.args[0]
@@ -0,0 +1,135 @@
+# backend/tests/test_imap_fetch.py
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.config import settings
+from app.services.email_service import EmailService, _compress_uid_set
+
+from tests.fake_imap import FakeImapServer, make_raw_email
+
+
+@pytest.fixture
+def imap_server():
+    server = FakeImapServer().start()
+    with patch.multiple(
+        settings,
+        IMAP_HOST="127.0.0.1",
+        IMAP_PORT=server.port,
+        IMAP_SSL=False,
+        IMAP_USER="support@test.ru",
+        IMAP_PASSWORD="secret",
+        IMAP_FETCH_BATCH_SIZE=2,
+    ):
+        yield server
+    server.stop()
+
+
+def make_service(state=None) -> EmailService:
+    repo = MagicMock()
+    repo.get_sync_state = AsyncMock(return_value=state)
+    repo.save_sync_state = AsyncMock()
+    return EmailService(repo=repo)
+
+
+def test_compress_uid_set():
+    assert _compress_uid_set([1, 2, 3, 5, 7, 8]) == "1:3,5,7:8"
+    assert _compress_uid_set([4]) == "4"
+
+
+@pytest.mark.asyncio
+async def test_fetch_in_batches(imap_server):
+    for i in range(5):
+        imap_server.add_message(make_raw_email(f"Письмо номер {i}"))
+
+    emails, checkpoint = await make_service().fetch_new_emails()
+
+    assert [e["uid"] for e in emails] == [1, 2, 3, 4, 5]
+    assert checkpoint == {"mailbox": "INBOX", "uid_validity": 1, "last_uid": 5}
+    # 5 писем пачками по 2: три FETCH и три STORE вместо пяти пар
+    assert imap_server.command_count("UID", "FETCH") == 3
+    assert imap_server.command_count("UID", "STORE") == 3
+    assert all("\\Seen" in m["flags"] for m in imap_server.snapshot())
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_stops_checkpoint(imap_server):
+    for i in range(5):
+        imap_server.add_message(make_raw_email(f"Письмо номер {i}"))
+    imap_server.failing_fetches.add("3:4")
+
+    service = make_service()
+    emails, checkpoint = await service.fetch_new_emails()
+
+    # Пятое письмо не забираем: иначе чекпоинт перескочил бы 3 и 4
+    assert [e["uid"] for e in emails] == [1, 2]
+    assert checkpoint["last_uid"] == 2
+
+    imap_server.failing_fetches.clear()
+    service = make_service(state={"uid_validity": 1, "last_uid": 2})
+    emails, checkpoint = await service.fetch_new_emails()
+
+    assert [e["uid"] for e in emails] == [3, 4, 5]
+    assert checkpoint["last_uid"] == 5
+
+
+@pytest.mark.asyncio
+async def test_failed_first_batch_keeps_checkpoint(imap_server):
+    for i in range(3):
+        imap_server.add_message(make_raw_email(f"Письмо номер {i}"))
+    imap_server.failing_fetches.add("3")
+
+    service = make_service(state={"uid_validity": 1, "last_uid": 2})
+    emails, checkpoint = await service.fetch_new_emails()
+
+    assert emails == []
+    assert checkpoint is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_from_checkpoint_ignores_seen_flag(imap_server):
+    for i in range(4):
+        imap_server.add_message(make_raw_email(f"Письмо номер {i}"))
+    # Кто-то прочитал письмо в почтовом клиенте - оно все равно должно прийти
+    imap_server.snapshot()[3]["flags"].add("\\Seen")
+
+    service = make_service(state={"uid_validity": 1, "last_uid": 2})
+    emails, checkpoint = await service.fetch_new_emails()
+
+    assert [e["uid"] for e in emails] == [3, 4]
+    assert checkpoint["last_uid"] == 4
+
+
+@pytest.mark.asyncio
+async def test_fetch_nothing_new(imap_server):
+    imap_server.add_message(make_raw_email("Старое письмо"))
+
+    service = make_service(state={"uid_validity": 1, "last_uid": 1})
+    emails, checkpoint = await service.fetch_new_emails()
+
+    assert emails == []
+    assert checkpoint is None
+
+
+@pytest.mark.asyncio
+async def test_uidvalidity_change_resyncs_unseen(imap_server):
+    imap_server.add_message(make_raw_email("Прочитанное письмо"))
+    imap_server.add_message(make_raw_email("Новое письмо"))
+    imap_server.snapshot()[0]["flags"].add("\\Seen")
+    imap_server.uid_validity = 7
+
+    service = make_service(state={"uid_validity": 1, "last_uid": 100})
+    emails, checkpoint = await service.fetch_new_emails()
+
+    assert [e["uid"] for e in emails] == [2]
+    assert checkpoint == {"mailbox": "INBOX", "uid_validity": 7, "last_uid": 2}
+
+
+@pytest.mark.asyncio
+async def test_fetch_size_cap(imap_server):
+    imap_server.add_message(make_raw_email("Текст письма. " + "x" * 50_000))
+
+    with patch.object(settings, "IMAP_MAX_FETCH_BYTES", 2_000):
+        emails, _ = await make_service().fetch_new_emails()
+
+    assert emails[0]["body"].startswith("Текст письма.")
+    assert len(emails[0]["body"]) < 2_000
@@ -0,0 +1,105 @@
+# backend/tests/test_imap_idle.py
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.config import settings
+from app.services.email_service import EmailService
+from app.services.imap_idle import ImapIdleSession
+from app.workers.email_watcher import email_idle_worker
+
+from tests.fake_imap import FakeImapServer, make_raw_email
+
+
+@pytest.fixture
+def imap_server():
+    server = FakeImapServer().start()
+    with patch.multiple(
+        settings,
+        IMAP_HOST="127.0.0.1",
+        IMAP_PORT=server.port,
+        IMAP_SSL=False,
+        IMAP_USER="support@test.ru",
+        IMAP_PASSWORD="secret",
+        IMAP_RECONNECT_DELAY=0,
+    ):
+        yield server
+    server.stop()
+
+
+def test_idle_returns_on_exists(imap_server):
+    session = ImapIdleSession(EmailService(repo=MagicMock()))
+    session.connect()
+    assert session.supports_idle
+
+    timer = threading.Timer(0.2, imap_server.add_message, [make_raw_email("Тест")])
+    timer.start()
+    try:
+        assert session.idle(timeout=5) is True
+    finally:
+        session.close()
+
+
+def test_idle_sees_exists_sent_with_continuation(imap_server):
+    imap_server.add_message(make_raw_email("Тест"))
+    imap_server.exists_with_continuation = True
+    session = ImapIdleSession(EmailService(repo=MagicMock()))
+    session.connect()
+    try:
+        started = time.monotonic()
+        assert session.idle(timeout=3) is True
+        # EXISTS уже в буфере imaplib: ждать таймаут IDLE не нужно
+        assert time.monotonic() - started < 1
+    finally:
+        session.close()
+
+
+def test_idle_timeout_without_mail(imap_server):
+    session = ImapIdleSession(EmailService(repo=MagicMock()))
+    session.connect()
+    try:
+        assert session.idle(timeout=0.2) is False
+        # Сессия остается рабочей после выхода из IDLE
+        assert session.idle(timeout=0.2) is False
+    finally:
+        session.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_worker_fetches_pushed_email(imap_server, mock_ai_processor):
+    mock_repo = MagicMock()
+    mock_repo.create_ticket = AsyncMock(return_value="new-uuid")
+    mock_repo.get_sync_state = AsyncMock(return_value=None)
+    mock_repo.save_sync_state = AsyncMock()
+
+    with patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock):
+        task = asyncio.create_task(email_idle_worker(mock_repo))
+        await asyncio.sleep(0.3)
+        imap_server.add_message(
+            make_raw_email("Здравствуйте! Я Петр Петров. Сломался прибор ДГС ЭРИС-230.")
+        )
+        for _ in range(100):
+            if mock_repo.create_ticket.await_count:
+                break
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    mock_repo.create_ticket.assert_awaited_once()
+    ticket = mock_repo.create_ticket.await_args[0][0]
+    assert "ДГС ЭРИС-230" in ticket["original_message"]
+    # Одна сессия на все время работы
+    assert imap_server.command_count("LOGIN") == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_worker_falls_back_to_polling(imap_server):
+    imap_server.support_idle = False
+    with patch(
+        "app.workers.email_watcher.email_polling_worker", new_callable=AsyncMock
+    ) as mock_polling:
+        await email_idle_worker(MagicMock())
+    mock_polling.assert_awaited_once()
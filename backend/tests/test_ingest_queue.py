@@ -0,0 +1,92 @@
+# backend/tests/test_ingest_queue.py
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.config import settings
+from app.messaging.ingest_queue import IngestQueue
+from app.services.email_service import EmailService
+
+
+def make_queue() -> IngestQueue:
+    return IngestQueue(redis_client=AsyncMock())
+
+
+def payload(body: str) -> dict:
+    return {"payload": json.dumps({"body": body, "email_addr": "a@b.ru"})}
+
+
+@pytest.mark.asyncio
+async def test_reader_queues_emails_before_checkpoint():
+    calls = MagicMock()
+    queue = make_queue()
+    queue.push_many = AsyncMock(side_effect=lambda e: calls.push(e))
+    repo = MagicMock()
+    repo.save_sync_state = AsyncMock(side_effect=lambda **kw: calls.checkpoint(kw))
+
+    service = EmailService(repo, queue)
+    emails = [{"body": "Письмо", "email_addr": "a@b.ru", "uid": 7}]
+    checkpoint = {"mailbox": "INBOX", "uid_validity": 1, "last_uid": 7}
+    with (
+        patch.object(
+            service, "fetch_new_emails", AsyncMock(return_value=(emails, checkpoint))
+        ),
+        patch.object(service, "_process_emails", AsyncMock()) as mock_process,
+    ):
+        await service.process_and_save_emails()
+
+    mock_process.assert_not_awaited()
+    assert [c[0] for c in calls.mock_calls] == ["push", "checkpoint"]
+
+
+@pytest.mark.asyncio
+async def test_consumer_acks_only_persisted(mock_ai_processor):
+    queue = make_queue()
+    repo = MagicMock()
+
+    async def create_ticket(ticket):
+        if "Смирнова" in ticket["original_message"]:
+            raise RuntimeError("db down")
+        return "uuid-1"
+
+    repo.create_ticket = AsyncMock(side_effect=create_ticket)
+    entries = [
+        (
+            "1-0",
+            {"body": "Я Петр Петров. Сломался ДГС ЭРИС-230.", "email_addr": "a@b.ru"},
+        ),
+        (
+            "2-0",
+            {"body": "Я Анна Смирнова. Сломался ПГ ЭРИС-414.", "email_addr": "c@d.ru"},
+        ),
+    ]
+
+    with patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock):
+        results = await EmailService(repo, queue).process_queue_entries(entries)
+
+    assert len(results) == 1
+    queue.redis.xack.assert_awaited_once_with(
+        settings.INGEST_STREAM, settings.INGEST_GROUP, "1-0"
+    )
+
+
+@pytest.mark.asyncio
+async def test_claim_stale_drops_poisoned_entries():
+    queue = make_queue()
+    queue.redis.xautoclaim.return_value = [
+        "0-0",
+        [("1-0", payload("Живое")), ("2-0", payload("Отравленное"))],
+        [],
+    ]
+    queue.redis.xpending_range.return_value = [
+        {"message_id": "1-0", "times_delivered": 2},
+        {"message_id": "2-0", "times_delivered": settings.INGEST_MAX_DELIVERIES + 1},
+    ]
+
+    entries = await queue.claim_stale("worker-1")
+
+    assert [entry_id for entry_id, _ in entries] == ["1-0"]
+    assert entries[0][1]["body"] == "Живое"
+    queue.redis.xack.assert_awaited_once_with(
+        settings.INGEST_STREAM, settings.INGEST_GROUP, "2-0"
+    )
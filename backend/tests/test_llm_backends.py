@@ -0,0 +1,173 @@
+# backend/tests/test_llm_backends.py
+import asyncio
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from app.services import ai_processor
+from app.services.llm_backends import (
+    ANSWER_ONLY_SCHEMA,
+    ANSWER_SCHEMA,
+    LLMBackend,
+    LlamaCppBackend,
+    create_backend,
+)
+from app.services.llm_dispatcher import LLMUnavailableError
+
+ANSWER = {
+    "sentiment": "negative",
+    "category": "неисправность",
+    "important": True,
+    "summary": "Утечка газа",
+    "answer": "Уважаемый <NAME_1_NOM>, выезжаем.",
+}
+
+
+def make_backend() -> LlamaCppBackend:
+    backend = LlamaCppBackend()
+    # Грамматика собирается из llama_cpp, которого в тестах нет
+    backend.compiled = []
+
+    def compile_grammar(schema_json):
+        backend.compiled.append(schema_json)
+        return f"grammar:{','.join(json.loads(schema_json)['required'])}"
+
+    backend._compile_grammar = compile_grammar
+    return backend
+
+
+def fake_model(content: str = json.dumps(ANSWER, ensure_ascii=False)):
+    model = MagicMock()
+    model.create_chat_completion.return_value = {
+        "choices": [{"message": {"content": content}}]
+    }
+    return model
+
+
+@pytest.mark.asyncio
+async def test_local_backend_generates_with_grammar():
+    model = fake_model()
+    backend = make_backend()
+
+    with patch("app.services.llm_backends.model_registry.get", return_value=model):
+        result = await backend.generate("prompt", "Утечка у <NAME_1>")
+
+    assert result == ANSWER
+    kwargs = model.create_chat_completion.call_args.kwargs
+    assert kwargs["grammar"] == "grammar:" + ",".join(ANSWER_SCHEMA["required"])
+    assert kwargs["messages"][0] == {"role": "system", "content": "prompt"}
+    assert "<NAME_1>" in kwargs["messages"][1]["content"]
+    assert backend.stats["generated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_backend_compiles_one_grammar_per_schema():
+    model = fake_model(json.dumps({"summary": "Утечка", "answer": "Выезжаем"}))
+    backend = make_backend()
+
+    with patch("app.services.llm_backends.model_registry.get", return_value=model):
+        for _ in range(2):
+            await backend.generate("prompt", "text", ANSWER_ONLY_SCHEMA)
+        await backend.generate("prompt", "text", ANSWER_SCHEMA)
+
+    grammars = [
+        call.kwargs["grammar"] for call in model.create_chat_completion.call_args_list
+    ]
+    assert grammars[:2] == ["grammar:summary,answer"] * 2
+    assert grammars[2] == "grammar:" + ",".join(ANSWER_SCHEMA["required"])
+    assert len(backend.compiled) == 2
+
+
+@pytest.mark.asyncio
+async def test_local_backend_returns_none_on_broken_output():
+    model = fake_model("{не JSON}")
+    backend = make_backend()
+
+    with patch("app.services.llm_backends.model_registry.get", return_value=model):
+        assert await backend.generate("prompt", "text") is None
+
+    assert backend.stats["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_backend_rejects_when_queue_is_full():
+    release = threading.Event()
+    model = fake_model()
+    model.create_chat_completion.side_effect = lambda **kw: (
+        release.wait(5),
+        {"choices": [{"message": {"content": json.dumps(ANSWER)}}]},
+    )[1]
+    backend = make_backend()
+
+    with (
+        patch("app.services.llm_backends.model_registry.get", return_value=model),
+        patch("app.services.llm_backends.settings.LLM_LOCAL_QUEUE_SIZE", 1),
+    ):
+        running = asyncio.create_task(backend.generate("prompt", "first"))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(backend.generate("prompt", "second"))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(LLMUnavailableError):
+            await backend.generate("prompt", "third")
+
+        release.set()
+        results = await asyncio.gather(running, waiting)
+
+    assert results == [ANSWER, ANSWER]
+    assert backend.stats["rejected"] == 1
+    assert backend.stats["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_process_ticket_uses_local_backend():
+    model = fake_model()
+    backend = make_backend()
+
+    with (
+        patch("app.services.ai_processor.llm_backend", backend),
+        patch("app.services.llm_backends.model_registry.get", return_value=model),
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", False),
+        patch.object(ai_processor.settings, "SEMANTIC_CACHE_ENABLED", False),
+    ):
+        result = await ai_processor.process_ticket_ai("Утечка у <NAME_1>", None)
+
+    assert result["category"] == "неисправность"
+    assert result["manual_required"] is False
+
+
+@pytest.mark.asyncio
+async def test_labeled_ticket_uses_answer_only_grammar():
+    model = fake_model(json.dumps({"summary": "Утечка", "answer": "Выезжаем"}))
+    backend = make_backend()
+    labels = {"category": "неисправность", "sentiment": "negative", "important": True}
+
+    with (
+        patch("app.services.ai_processor.llm_backend", backend),
+        patch("app.services.llm_backends.model_registry.get", return_value=model),
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", False),
+        patch.object(ai_processor.settings, "SEMANTIC_CACHE_ENABLED", False),
+    ):
+        result = await ai_processor.process_ticket_ai(
+            "Утечка у <NAME_1>", None, labels=labels
+        )
+
+    kwargs = model.create_chat_completion.call_args.kwargs
+    assert kwargs["grammar"] == "grammar:summary,answer"
+    assert result["answer"] == "Выезжаем"
+
+
+def test_backend_must_implement_generate():
+    class NoGenerate(LLMBackend):
+        name = "broken"
+
+    with pytest.raises(TypeError):
+        NoGenerate()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_backend("openai")
@@ -0,0 +1,112 @@
+# backend/tests/test_llm_cache.py
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from app.services import ai_processor
+from app.services.llm_cache import LLMCache, make_key
+from app.services.parsing.utils import unmask_pii
+
+
+class FakeRedis:
+    """Минимум команд Redis, которые использует LLMCache."""
+
+    def __init__(self):
+        self.values = {}
+        self.index = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def zpopmin(self, name, count):
+        popped = sorted(self.index.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del self.index[member]
+        return popped
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def set(self, key, value, ex=None):
+        self.redis.values[key] = value
+        self.results.append(True)
+
+    def zadd(self, name, mapping):
+        self.redis.index.update(mapping)
+        self.results.append(len(mapping))
+
+    def zcard(self, name):
+        self.results.append(len(self.redis.index))
+
+    async def execute(self):
+        return self.results
+
+
+def test_key_normalizes_whitespace_and_case():
+    assert make_key("<NAME_1>,  Датчик\nне работает", "v1") == make_key(
+        "<name_1>, датчик не работает ", "v1"
+    )
+    assert make_key("текст", "v1") != make_key("текст", "v2")
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shared_between_processes():
+    redis = FakeRedis()
+    writer, reader = LLMCache(redis), LLMCache(redis)
+
+    await writer.set("k", {"answer": "<NAME_1>, заявка принята"})
+    assert await reader.get("k") == {"answer": "<NAME_1>, заявка принята"}
+    assert await reader.get("k") == {"answer": "<NAME_1>, заявка принята"}
+    assert await reader.get("other") is None
+
+    assert reader.stats["redis_hits"] == 1
+    assert reader.stats["memory_hits"] == 1
+    assert reader.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_size_eviction():
+    redis = FakeRedis()
+    cache = LLMCache(redis)
+    with patch("app.services.llm_cache.settings.LLM_CACHE_REDIS_MAX_ENTRIES", 2):
+        for i in range(3):
+            await cache.set(f"k{i}", {"i": i})
+
+    assert "llm_cache:k0" not in redis.values
+    assert set(redis.index) == {"k1", "k2"}
+
+
+@pytest.mark.asyncio
+async def test_identical_masked_text_calls_llm_once():
+    cache = LLMCache(FakeRedis())
+    llm_result = {"summary": "Не работает датчик", "answer": "<NAME_1_NOM>, примем"}
+    entity_maps = [
+        {"NAME_1": {"type": "NAME", "normal": "Иван Петров", "gender": "masc"}},
+        {"NAME_1": {"type": "NAME", "normal": "Анна Смирнова", "gender": "femn"}},
+    ]
+
+    with (
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor, "llm_cache", cache),
+        patch.object(
+            ai_processor, "_call_llm", AsyncMock(return_value=llm_result)
+        ) as mock_llm,
+    ):
+        answers = []
+        for entity_map in entity_maps:
+            result = await ai_processor.process_ticket_ai(
+                "<NAME_1>, датчик ПГ ЭРИС-414 не работает", "ПГ ЭРИС-414"
+            )
+            answers.append(unmask_pii(result["answer"], entity_map))
+
+    mock_llm.assert_awaited_once()
+    assert answers == ["Иван Петров, примем", "Анна Смирнова, примем"]
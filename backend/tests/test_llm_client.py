@@ -0,0 +1,63 @@
+# backend/tests/test_llm_client.py
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from app.services import ai_processor
+from app.services.llm_client import LLMClient, _normalize_hf_url
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        (
+            " meta-llama/Llama-3 \n",
+            "https://router.huggingface.co/hf-inference/models/meta-llama/Llama-3",
+        ),
+        (
+            "https://api-inference.huggingface.co/models/org/model",
+            "https://router.huggingface.co/hf-inference/models/org/model",
+        ),
+        ("https://llm.local/v1/generate/", "https://llm.local/v1/generate"),
+        ("llm.local", None),
+        ("", None),
+    ],
+)
+def test_normalize_hf_url(raw, expected):
+    assert _normalize_hf_url(raw) == expected
+
+
+@pytest.mark.asyncio
+async def test_client_is_reused_across_calls():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        text = json.dumps({"summary": "ok", "sentiment": "neutral"})
+        return httpx.Response(200, json=[{"generated_text": text}])
+
+    client = LLMClient()
+    with (
+        patch("app.services.llm_client.settings.HF_API_URL", "org/model"),
+        patch("app.services.llm_client.settings.HF_API_TOKEN", "secret"),
+        patch("app.services.llm_dispatcher.llm_client", client),
+    ):
+        client.start()
+        # Подменяем транспорт, сохраняя настройки клиента (заголовки, таймауты)
+        client._client._transport = httpx.MockTransport(handler)
+        http_client = client.client
+
+        first = await ai_processor._call_llm("prompt", "text 1")
+        second = await ai_processor._call_llm("prompt", "text 2")
+
+        assert client.client is http_client
+
+    assert first["summary"] == second["summary"] == "ok"
+    assert [str(r.url) for r in requests] == [
+        "https://router.huggingface.co/hf-inference/models/org/model"
+    ] * 2
+    assert requests[0].headers["Authorization"] == "Bearer secret"
+
+    await client.close()
+    assert client._client is None
@@ -0,0 +1,210 @@
+# backend/tests/test_llm_dispatcher.py
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from app.services import llm_dispatcher as dispatcher_module
+from app.services.email_service import EmailService
+from app.services.llm_dispatcher import (
+    CircuitBreaker,
+    LLMDispatcher,
+    LLMUnavailableError,
+    TokenBucket,
+)
+
+REQUEST = httpx.Request("POST", "https://llm.local")
+
+
+def response(status, headers=None):
+    text = json.dumps({"summary": "ok"})
+    return httpx.Response(
+        status, json=[{"generated_text": text}], headers=headers, request=REQUEST
+    )
+
+
+def failing(status, headers=None):
+    resp = response(status, headers)
+    return httpx.HTTPStatusError("error", request=REQUEST, response=resp)
+
+
+@pytest.fixture
+def sleeps():
+    with patch.object(
+        dispatcher_module.asyncio, "sleep", new_callable=AsyncMock
+    ) as mock_sleep:
+        yield mock_sleep
+
+
+@pytest.mark.asyncio
+async def test_retries_honor_retry_after(sleeps):
+    client = MagicMock()
+    client.post = AsyncMock(
+        side_effect=[failing(429, {"Retry-After": "7"}), failing(503), response(200)]
+    )
+    dispatcher = LLMDispatcher()
+
+    with patch.object(dispatcher_module, "llm_client", client):
+        result = await dispatcher.call({"inputs": "x"})
+
+    assert result.status_code == 200
+    delays = [c.args[0] for c in sleeps.await_args_list]
+    assert delays[0] == 7
+    assert 0 <= delays[1] <= 2  # base * 2^1 с jitter
+    assert dispatcher.stats["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(sleeps):
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=failing(401))
+
+    with patch.object(dispatcher_module, "llm_client", client):
+        with pytest.raises(httpx.HTTPStatusError):
+            await LLMDispatcher().call({})
+
+    client.post.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_rejects(sleeps):
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=httpx.ConnectError("down"))
+    dispatcher = LLMDispatcher()
+    dispatcher.breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+
+    with patch.object(dispatcher_module, "llm_client", client):
+        with pytest.raises(LLMUnavailableError):
+            await dispatcher.call({})
+        assert dispatcher.breaker.state == "open"
+
+        # Открытый breaker не тратит квоту на мертвый эндпоинт
+        client.post.reset_mock()
+        with pytest.raises(LLMUnavailableError):
+            await dispatcher.call({})
+        client.post.assert_not_awaited()
+
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+    with patch.object(dispatcher_module, "time") as mock_time:
+        mock_time.monotonic.return_value = 100
+        breaker.record_failure()
+        mock_time.monotonic.return_value = 111
+        assert breaker.state == "half_open"
+        allowed, trial = breaker.allow()
+        assert allowed and trial is not None
+        assert breaker.allow() == (False, None)
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_releases_half_open_breaker():
+    started = asyncio.Event()
+
+    async def hang(payload):
+        started.set()
+        await asyncio.Event().wait()
+
+    client = MagicMock()
+    client.post = hang
+    dispatcher = LLMDispatcher()
+    dispatcher.breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    dispatcher.breaker.record_failure()
+
+    with patch.object(dispatcher_module, "llm_client", client):
+        trial = asyncio.create_task(dispatcher.call({}))
+        await started.wait()
+        assert dispatcher.breaker.allow() == (False, None)
+
+        # Тикет отменили по таймауту, пока шел пробный запрос
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    assert dispatcher.breaker.state == "half_open"
+    assert dispatcher.breaker.allow()[0] is True
+
+
+@pytest.mark.asyncio
+async def test_call_from_closed_state_does_not_release_others_trial():
+    started = asyncio.Event()
+
+    async def hang(payload):
+        started.set()
+        await asyncio.Event().wait()
+
+    client = MagicMock()
+    client.post = hang
+    dispatcher = LLMDispatcher()
+    dispatcher.breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+
+    with patch.object(dispatcher_module, "llm_client", client):
+        # Запрос ушел, пока breaker был закрыт
+        old_call = asyncio.create_task(dispatcher.call({}))
+        await started.wait()
+        dispatcher.breaker.record_failure()
+        started.clear()
+        trial = asyncio.create_task(dispatcher.call({}))
+        await started.wait()
+
+        old_call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await old_call
+        # Пробный запрос все еще один
+        assert dispatcher.breaker.allow() == (False, None)
+        # И ошибка такого запроса тоже не освобождает пробный
+        dispatcher.breaker.record_failure()
+        assert dispatcher.breaker.allow() == (False, None)
+
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+    assert dispatcher.breaker.allow()[0] is True
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate(sleeps):
+    # Подменяем модуль time целиком: time.monotonic нужен и event loop
+    with patch.object(dispatcher_module, "time") as mock_time:
+        mock_time.monotonic.side_effect = [0, 0, 0, 0, 0.5]
+        bucket = TokenBucket(rate=2, burst=2)
+        await bucket.acquire()
+        await bucket.acquire()
+        # Запас исчерпан: ждем полтокена при 2 токенах в секунду
+        await bucket.acquire()
+
+    sleeps.assert_awaited_once_with(0.5)
+
+
+@pytest.mark.asyncio
+async def test_unavailable_llm_parks_email():
+    repo = MagicMock()
+    repo.create_ticket = AsyncMock()
+    queue = MagicMock()
+    queue.ack = AsyncMock()
+    email = {
+        "body": "Я Петр Петров. Сломался прибор ДГС ЭРИС-230.",
+        "email_addr": "a@b.ru",
+        "message_id": "<1@b.ru>",
+        "entry_id": "1-0",
+    }
+
+    with (
+        patch(
+            "app.services.email_service.process_ticket_ai",
+            AsyncMock(side_effect=LLMUnavailableError("open")),
+        ),
+        patch("app.services.email_service.retry_queue") as mock_retry,
+    ):
+        mock_retry.park = AsyncMock()
+        results = await EmailService(repo, queue)._process_emails([email])
+
+    assert results == []
+    repo.create_ticket.assert_not_awaited()
+    mock_retry.park.assert_awaited_once()
+    assert mock_retry.park.await_args.args[0]["message_id"] == "<1@b.ru>"
+    # Запись из стрима подтверждается только после того, как письмо отложено
+    queue.ack.assert_awaited_once_with("1-0")
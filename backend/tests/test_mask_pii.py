@@ -0,0 +1,69 @@
+# backend/tests/test_mask_pii.py
+from app.services.parsing.utils import mask_pii, unmask_pii
+
+
+def entity(text, ent_type, body, normal=None, **extra):
+    start = body.index(text)
+    return {
+        "type": ent_type,
+        "text": text,
+        "normal": normal or text,
+        "start": start,
+        "end": start + len(text),
+        **extra,
+    }
+
+
+def test_mask_by_offsets_and_repeated_mentions():
+    body = "Иван Иванов пишет. Тел +79001234567. С уважением, Иван Иванов"
+    entities = [
+        entity("Иван Иванов", "NAME", body, gender="masc"),
+        entity("+79001234567", "PHONE", body, normal="79001234567"),
+    ]
+
+    masked, entity_map = mask_pii(body, entities)
+
+    assert masked == "<NAME_1> пишет. Тел <PHONE_1>. С уважением, <NAME_1>"
+    assert entity_map["PHONE_1"]["normal"] == "79001234567"
+
+
+def test_mask_respects_word_boundaries():
+    # "Ия" не должна маскироваться внутри "Россия"
+    body = "Ия из Россия"
+    masked, _ = mask_pii(body, [entity("Ия", "NAME", body)])
+
+    assert masked == "<NAME_1> из Россия"
+
+
+def test_same_normal_shares_placeholder():
+    body = "Звоните 8 900 123 45 67 или 89001234567"
+    entities = [
+        entity("8 900 123 45 67", "PHONE", body, normal="89001234567"),
+        entity("89001234567", "PHONE", body, normal="89001234567"),
+    ]
+
+    masked, entity_map = mask_pii(body, entities)
+
+    assert masked == "Звоните <PHONE_1> или <PHONE_1>"
+    assert list(entity_map) == ["PHONE_1"]
+
+
+def test_serial_is_replaced_with_device_name():
+    body = "Зав. номер 230201384 сломался."
+    entities = [entity("230201384", "DEVICE", body, normal="ДГС ЭРИС-230")]
+
+    masked, entity_map = mask_pii(body, entities)
+
+    assert masked == "Зав. номер ДГС ЭРИС-230 сломался."
+    assert entity_map == {}
+
+
+def test_unmask_roundtrip():
+    entity_map = {
+        "NAME_1": {"type": "NAME", "normal": "Иван Иванов", "gender": "masc"},
+        "EMAIL_1": {"type": "EMAIL", "normal": "a@b.ru"},
+    }
+
+    text = unmask_pii("<NAME_1>, ответ на <EMAIL_1>. <PHONE_9>", entity_map)
+
+    assert text == "Иван Иванов, ответ на a@b.ru. <PHONE_9>"
@@ -0,0 +1,46 @@
+# backend/tests/test_model_registry.py
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+from app.services.model_registry import ModelRegistry
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_model_loaded_once_across_threads():
+    loader = MagicMock(return_value=object())
+    registry = ModelRegistry()
+    registry.register("model", loader)
+
+    with ThreadPoolExecutor(8) as pool:
+        models = list(pool.map(lambda _: registry.get("model"), range(32)))
+
+    loader.assert_called_once()
+    assert all(model is models[0] for model in models)
+    assert registry.status()["model"]["loaded"] is True
+    assert registry.load_times["model"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_prewarm_skips_failing_model():
+    registry = ModelRegistry()
+    registry.register("broken", MagicMock(side_effect=ImportError("no lib")))
+    registry.register("ok", MagicMock(return_value="model"))
+
+    await registry.prewarm(["broken", "ok"])
+
+    assert registry.is_loaded("ok")
+    assert not registry.is_loaded("broken")
+
+
+def test_endpoints_import_does_not_load_natasha():
+    code = (
+        "import sys, app.api.v1.endpoints, app.workers.email_watcher;"
+        "assert 'natasha' not in sys.modules;"
+        "assert 'pymorphy3' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=BACKEND_DIR)
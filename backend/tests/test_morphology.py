@@ -0,0 +1,34 @@
+# backend/tests/test_morphology.py
+import pytest
+from app.services.parsing import morphology
+from app.services.parsing.utils import inflect_name
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    morphology.clear_cache()
+    yield
+    morphology.clear_cache()
+
+
+def test_inflect_name_hits_cache():
+    assert inflect_name("Иван Петров", "DAT", "masc") == "Ивану Петрову"
+    assert inflect_name("Иван Петров", "DAT", "masc") == "Ивану Петрову"
+
+    stats = morphology.cache_stats()
+    assert stats["inflect"]["misses"] == 2
+    assert stats["inflect"]["hits"] == 2
+    assert stats["inflect"]["hit_rate"] == 0.5
+
+
+def test_inflect_key_includes_grammemes():
+    assert morphology.inflect("Иван", {"datv"}) == "ивану"
+    assert morphology.inflect("Иван", {"gent"}) == "ивана"
+    assert morphology.cache_stats()["inflect"]["hits"] == 0
+
+
+def test_detect_gender_shares_parse_cache():
+    assert morphology.detect_gender("Анна") == "femn"
+    morphology.inflect("Анна", {"datv"})
+
+    assert morphology.cache_stats()["parse"]["hits"] == 1
@@ -0,0 +1,107 @@
+# backend/tests/test_ner_pool.py
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+import pytest
+from app.services.parsing import ner_pool as ner_pool_module
+from app.services.parsing.ner_pool import NerProcessPool
+
+TEXT = "Меня зовут Иван Иванов, телефон +79001234567."
+
+
+@pytest.fixture
+def pool():
+    pool = NerProcessPool()
+    pool.start(workers=1, max_tasks_per_child=2)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extract_in_worker_process(pool):
+    await pool.warm_up()
+    entities = await pool.extract(TEXT)
+
+    assert any(e["type"] == "NAME" for e in entities)
+    assert any(e["type"] == "PHONE" and e["normal"] == "79001234567" for e in entities)
+    assert await pool.health_check() is True
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_restarted(pool):
+    await pool.warm_up()
+    for process in list(pool._executor._processes.values()):
+        process.kill()
+
+    assert await pool.health_check() is False
+    # После перезапуска пул снова работает
+    entities = await pool.extract(TEXT)
+    assert any(e["type"] == "NAME" for e in entities)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_failures_restart_pool_once(pool):
+    await pool.warm_up()
+    broken = pool._executor
+    for process in list(broken._processes.values()):
+        process.kill()
+
+    results = await asyncio.gather(
+        *(pool.extract_batch([TEXT]) for _ in range(4)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, BrokenProcessPool) for result in results)
+    assert pool.restarts == 1
+    assert pool._executor is not broken
+    # Новый пул не снесли следующие упавшие задачи
+    entities = await pool.extract(TEXT)
+    assert any(e["type"] == "NAME" for e in entities)
+
+
+@pytest.mark.asyncio
+async def test_busy_pool_is_not_restarted_by_health_check(pool):
+    await pool.warm_up()
+    executor = pool._executor
+    settings = ner_pool_module.settings
+
+    with (
+        patch.object(settings, "NER_POOL_HEALTH_TIMEOUT", 0.2),
+        patch.object(settings, "NER_POOL_HANG_TIMEOUT", 30),
+    ):
+        # Единственный воркер занят длинным пакетом: ping ждет в очереди
+        long_batch = asyncio.create_task(pool._run(time.sleep, 1))
+        await asyncio.sleep(0.05)
+        assert await pool.health_check() is True
+        await long_batch
+
+    # Пул отвечает и после длинного пакета
+    entities = await pool.extract(TEXT)
+    assert any(e["type"] == "NAME" for e in entities)
+    assert pool._executor is executor
+    assert pool.restarts == 0
+
+
+@pytest.mark.asyncio
+async def test_hung_pool_is_restarted_by_health_check(pool):
+    await pool.warm_up()
+    settings = ner_pool_module.settings
+
+    with (
+        patch.object(settings, "NER_POOL_HEALTH_TIMEOUT", 0.2),
+        patch.object(settings, "NER_POOL_HANG_TIMEOUT", 0.1),
+    ):
+        hung = asyncio.create_task(pool._run(time.sleep, 5))
+        await asyncio.sleep(0.15)
+        assert await pool.health_check() is False
+
+    assert pool.restarts == 1
+    with pytest.raises(BrokenProcessPool):
+        await hung
+
+
+@pytest.mark.asyncio
+async def test_disabled_pool_runs_in_threads():
+    entities = await NerProcessPool().extract(TEXT)
+    assert any(e["type"] == "NAME" for e in entities)
@@ -1,5 +1,8 @@
 # backend/tests/test_nlp.py
-from app.services.parsing.ner_extractor import extract_entities
+from unittest.mock import patch
+
+from app.services.model_registry import model_registry
+from app.services.parsing.ner_extractor import extract_entities, extract_entities_batch
 
 
 def test_extract_name():
@@ -20,3 +23,32 @@ def test_extract_phone():
     assert len(phones) > 0
     # Теперь проверяем очищенный номер
     assert phones[0]["normal"] == "89001234567"
+
+
+def test_batch_matches_single_with_offsets():
+    texts = [
+        "Меня зовут Иван Иванов, телефон +79001234567.",
+        "",
+        "Пишет Анна Смирнова, прибор ДГС ЭРИС-230, почта anna@mail.ru",
+    ]
+    batch = extract_entities_batch(texts)
+
+    assert batch == [extract_entities(text) for text in texts]
+    assert batch[1] == []
+    for text, entities in zip(texts, batch):
+        for entity in entities:
+            assert text[entity["start"] : entity["end"]] == entity["text"]
+
+
+def test_text_without_names_skips_segmentation():
+    text = "Прибор ДГС ЭРИС-230 не работает, звоните 8 900 123 45 67"
+    extract_entities(text)
+
+    with patch(
+        "app.services.parsing.ner_extractor.model_registry.get",
+        wraps=model_registry.get,
+    ) as get:
+        entities = extract_entities(text)
+
+    assert not any(e["type"] == "NAME" for e in entities)
+    assert "segmenter" not in [call.args[0] for call in get.call_args_list]
@@ -0,0 +1,113 @@
+# backend/tests/test_onnx_embedding.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from app.services.model_registry import load_embedding_backend
+from app.services.onnx_embedding import OnnxEmbedder, parity_check
+
+DIM = 4
+PAD_ID = 999
+
+
+class FakeTokenizer:
+    """Токен = длина текста; паддинг до самого длинного в батче."""
+
+    def encode_batch(self, texts):
+        width = max(len(text.split()) for text in texts)
+        encodings = []
+        for text in texts:
+            n = len(text.split())
+            encodings.append(
+                SimpleNamespace(
+                    ids=[len(text)] * n + [PAD_ID] * (width - n),
+                    attention_mask=[1] * n + [0] * (width - n),
+                )
+            )
+        return encodings
+
+
+class FakeSession:
+    """Скрытое состояние токена - его id во всех измерениях."""
+
+    def __init__(self, input_names):
+        self.input_names = input_names
+        self.calls = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name=name) for name in self.input_names]
+
+    def run(self, output_names, inputs):
+        self.calls.append(inputs)
+        hidden = np.repeat(inputs["input_ids"][..., None], DIM, axis=2)
+        return [hidden.astype("float32")]
+
+
+def test_onnx_encode_pools_without_padding_and_keeps_order():
+    session = FakeSession(["input_ids", "attention_mask"])
+    embedder = OnnxEmbedder(session, FakeTokenizer(), max_length=512)
+    texts = ["датчик ПГ ЭРИС-414 не работает", "ошибка", "горит E3"]
+
+    vectors = embedder.encode(texts, batch_size=2, normalize_embeddings=False)
+
+    assert vectors.shape == (3, DIM)
+    for text, vector in zip(texts, vectors):
+        assert np.allclose(vector, len(text))
+    # Батчи из текстов близкой длины: короткие вместе
+    assert [len(call["input_ids"]) for call in session.calls] == [2, 1]
+    assert "token_type_ids" not in session.calls[0]
+
+
+def test_onnx_encode_normalizes_and_feeds_token_types():
+    session = FakeSession(["input_ids", "attention_mask", "token_type_ids"])
+    embedder = OnnxEmbedder(session, FakeTokenizer(), max_length=512)
+
+    vectors = embedder.encode(["query: датчик не работает"])
+
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert not session.calls[0]["token_type_ids"].any()
+
+
+def random_encoder(seed):
+    """Случайный вектор на текст; запрос и фрагмент одного текста совпадают."""
+    rng = np.random.default_rng(seed)
+    cache = {}
+
+    def encode(texts):
+        keys = [text.split(": ", 1)[1] for text in texts]
+        for key in keys:
+            if key not in cache:
+                vector = rng.normal(size=32).astype("float32")
+                cache[key] = vector / np.linalg.norm(vector)
+        return np.stack([cache[key] for key in keys])
+
+    return encode
+
+
+def test_parity_accepts_close_int8_vectors():
+    reference = random_encoder(0)
+    noise = np.random.default_rng(1)
+
+    def quantized(texts):
+        vectors = reference(texts) + noise.normal(scale=0.01, size=(len(texts), 32))
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    report = parity_check(reference, quantized, [f"Раздел {i}" for i in range(50)], 1)
+
+    assert report["passed"] is True
+    assert report["cosine_min"] > 0.99
+    assert report["index_recall@1"] == 1.0
+
+
+def test_parity_rejects_unrelated_model():
+    report = parity_check(
+        random_encoder(0), random_encoder(2), [f"Раздел {i}" for i in range(50)], 1
+    )
+
+    assert report["passed"] is False
+    assert report["index_recall@1"] < 0.5
+
+
+def test_unknown_embedding_backend():
+    with pytest.raises(ValueError):
+        load_embedding_backend("tensorrt")
@@ -0,0 +1,120 @@
+# backend/tests/test_pipeline.py
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.services.email_service import EmailService
+from app.services.pipeline import Stage, StagedPipeline
+
+
+@pytest.mark.asyncio
+async def test_network_stage_overlaps():
+    async def slow(item):
+        await asyncio.sleep(0.1)
+        return item
+
+    pipeline = StagedPipeline([Stage("ai", slow, concurrency=10)])
+    started = time.perf_counter()
+    results = await pipeline.run(range(10))
+
+    assert sorted(results) == list(range(10))
+    assert time.perf_counter() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_backpressure():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def limited(item):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return item
+
+    async def passthrough(item):
+        return item
+
+    pipeline = StagedPipeline(
+        [Stage("fast", passthrough, 4), Stage("ner", limited, 2)], queue_size=1
+    )
+    results = await pipeline.run(range(20))
+
+    assert len(results) == 20
+    assert max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_item_errors_are_isolated():
+    async def fragile(item):
+        if item == 3:
+            raise RuntimeError("boom")
+        return item
+
+    async def only_even(item):
+        return item if item % 2 == 0 else None
+
+    pipeline = StagedPipeline([Stage("fragile", fragile, 2), Stage("even", only_even)])
+    results = await pipeline.run(range(6))
+
+    assert sorted(results) == [0, 2, 4]
+    assert pipeline.stats["fragile"] == {"processed": 5, "filtered": 0, "failed": 1}
+    assert pipeline.stats["even"]["filtered"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_stage_groups_items_and_isolates_failures():
+    sizes = []
+
+    async def batched(items):
+        sizes.append(len(items))
+        if 3 in items:
+            raise ValueError("bad item")
+        return [item * 10 for item in items]
+
+    async def feed(item):
+        await asyncio.sleep(0)
+        return item
+
+    pipeline = StagedPipeline(
+        [Stage("feed", feed), Stage("ner", batched, concurrency=1, batch_size=4)]
+    )
+    results = await pipeline.run(range(8))
+
+    assert sorted(results) == [0, 10, 20, 40, 50, 60, 70]
+    assert max(sizes) <= 4
+    assert pipeline.stats["ner"]["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_process_emails_persists_and_publishes(mock_ai_processor):
+    mock_repo = MagicMock()
+
+    async def create_ticket(ticket):
+        if "Смирнова" in ticket["original_message"]:
+            raise RuntimeError("db down")
+        return "uuid-1"
+
+    mock_repo.create_ticket = AsyncMock(side_effect=create_ticket)
+    emails = [
+        {
+            "body": "Я Петр Петров. Сломался прибор ДГС ЭРИС-230.",
+            "email_addr": "a@b.ru",
+        },
+        {
+            "body": "Я Анна Смирнова. Сломался прибор ПГ ЭРИС-414.",
+            "email_addr": "c@d.ru",
+        },
+    ]
+
+    with patch(
+        "app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock
+    ) as mock_publish:
+        results = await EmailService(repo=mock_repo)._process_emails(emails)
+
+    assert mock_repo.create_ticket.await_count == 2
+    assert [r["ticket_id"] for r in results] == ["uuid-1"]
+    mock_publish.assert_awaited_once()
@@ -0,0 +1,232 @@
+# backend/tests/test_rag_engine.py
+import asyncio
+import fcntl
+import json
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from app.services import rag_engine as rag_module
+from app.services.embedding_service import EmbeddingService
+from app.services.rag_engine import IndexCache, RAGEngine, write_dir_atomic
+
+# test_nlp_pipeline подменяет faiss в sys.modules: берем модуль, с которым работает движок
+faiss = rag_module.faiss
+
+DIM = 8
+
+
+def write_index(root, device: str, chunks):
+    index_dir = os.path.join(root, device)
+    os.makedirs(index_dir, exist_ok=True)
+    index = faiss.IndexFlatIP(DIM)
+    index.add(np.random.default_rng(0).random((len(chunks), DIM), dtype="float32"))
+    faiss.write_index(index, os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "store.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(enumerate(chunks)), f, ensure_ascii=False)
+
+
+def make_engine(root, max_bytes: int = 10 * 1024 * 1024, encoder=None) -> RAGEngine:
+    engine = RAGEngine(
+        index_root=str(root), embeddings=EmbeddingService(encoder or MagicMock())
+    )
+    engine.index_cache = IndexCache(max_bytes)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_hot_device_is_not_reloaded_from_disk(tmp_path):
+    write_index(tmp_path, "ДГС ЭРИС-230", ["Фрагмент 1", "Фрагмент 2"])
+    engine = make_engine(tmp_path)
+
+    with patch.object(faiss, "read_index", wraps=faiss.read_index) as read_index:
+        first = await engine.load_index("ДГС ЭРИС-230", None)
+        second = await engine.load_index("ДГС ЭРИС-230", None)
+
+    assert read_index.call_count == 1
+    assert second is first
+    assert second[1] == {0: "Фрагмент 1", 1: "Фрагмент 2"}
+    assert engine.index_cache.stats["hits"] == 1
+    assert engine.index_cache.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_index_on_disk_invalidates_cache(tmp_path):
+    write_index(tmp_path, "ПГ ЭРИС-414", ["Старый фрагмент"])
+    engine = make_engine(tmp_path)
+    await engine.load_index("ПГ ЭРИС-414", None)
+
+    write_index(tmp_path, "ПГ ЭРИС-414", ["Новый фрагмент", "Еще один фрагмент"])
+    store_file = os.path.join(tmp_path, "ПГ ЭРИС-414", "store.json")
+    stat = os.stat(store_file)
+    # mtime мог не успеть смениться: сдвигаем явно
+    os.utime(store_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    _, doc_store = await engine.load_index("ПГ ЭРИС-414", None)
+
+    assert doc_store[0] == "Новый фрагмент"
+    assert engine.index_cache.invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_by_footprint(tmp_path):
+    devices = ["A-1", "B-2", "C-3"]
+    for device in devices:
+        write_index(tmp_path, device, ["фрагмент " * 50] * 20)
+    engine = make_engine(tmp_path)
+    await engine.load_index("A-1", None)
+    one_device = engine.index_cache.bytes
+    engine.index_cache = IndexCache(int(one_device * 2.5))
+
+    for device in devices:
+        await engine.load_index(device, None)
+
+    stats = engine.index_cache.stats
+    assert stats["devices"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    # Вытеснен самый давний
+    assert engine.index_cache.get("A-1", (0, 0, 0, 0)) is None
+    assert engine.index_cache.invalidations == 0
+
+
+def counting_encoder():
+    """Медленный encode в потоке: параллельные сборки успевают пересечься."""
+    calls = []
+
+    def encode(texts):
+        calls.append(len(texts))
+        time.sleep(0.05)
+        return np.random.default_rng(len(calls)).random((len(texts), DIM), "float32")
+
+    return encode, calls
+
+
+def fake_pdf(pdf_path):
+    page = MagicMock()
+    page.extract_text.return_value = "\n".join(
+        f"Раздел {i}: порядок обслуживания газоанализатора и проверки сенсора"
+        for i in range(5)
+    )
+    reader = MagicMock()
+    reader.pages = [page]
+    return reader
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tickets_build_index_once(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF")
+    encoder, calls = counting_encoder()
+    # Второй движок - как воркер в другом процессе: общий только каталог и flock
+    engines = [
+        make_engine(tmp_path / "index", encoder=encoder),
+        make_engine(tmp_path / "index", encoder=encoder),
+    ]
+
+    with patch.object(rag_module, "PdfReader", side_effect=fake_pdf):
+        results = await asyncio.gather(
+            *(
+                engine.load_index(device, str(pdf_path))
+                for engine in engines
+                for device in ["ДГС ЭРИС-230", "ДГС ЭРИС-230", "ПГ ЭРИС-414"]
+            )
+        )
+
+    assert calls == [5, 5]
+    assert all(len(doc_store) == 5 for _, doc_store in results)
+    assert sorted(os.listdir(tmp_path / "index")) == [
+        ".locks",
+        "ДГС ЭРИС-230",
+        "ПГ ЭРИС-414",
+    ]
+    assert all(not engine._builds for engine in engines)
+
+
+@pytest.mark.asyncio
+async def test_failed_build_leaves_no_partial_index(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF")
+    engine = make_engine(tmp_path / "index", encoder=counting_encoder()[0])
+
+    with (
+        patch.object(rag_module, "PdfReader", side_effect=fake_pdf),
+        patch.object(faiss, "write_index", side_effect=OSError("disk full")),
+        pytest.raises(OSError),
+    ):
+        await engine.load_index("ДГС ЭРИС-230", str(pdf_path))
+
+    assert os.listdir(tmp_path / "index") == [".locks"]
+    assert not engine.has_index("ДГС ЭРИС-230")
+
+
+@pytest.mark.asyncio
+async def test_build_polls_lock_held_by_other_process(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(b"%PDF")
+    engine = make_engine(tmp_path / "index", encoder=counting_encoder()[0])
+    lock_dir = tmp_path / "index" / ".locks"
+    lock_dir.mkdir(parents=True)
+    # Сборку этого прибора держит другой процесс
+    held = open(lock_dir / "ДГС ЭРИС-230.lock", "a")
+    fcntl.flock(held, fcntl.LOCK_EX)
+
+    with (
+        patch.object(rag_module, "PdfReader", side_effect=fake_pdf),
+        patch.object(rag_module.settings, "RAG_BUILD_LOCK_POLL", 0.01),
+    ):
+        build = asyncio.create_task(engine.load_index("ДГС ЭРИС-230", str(pdf_path)))
+        await asyncio.sleep(0.1)
+        assert not build.done()
+        # Ожидание ограничено: тикет не ждет чужую сборку бесконечно
+        other = make_engine(tmp_path / "index", encoder=counting_encoder()[0])
+        with patch.object(rag_module.settings, "RAG_BUILD_LOCK_TIMEOUT", 0.05):
+            with pytest.raises(TimeoutError):
+                await other.load_index("ДГС ЭРИС-230", str(pdf_path))
+
+        fcntl.flock(held, fcntl.LOCK_UN)
+        held.close()
+        index, doc_store = await build
+
+    assert len(doc_store) == 5
+
+
+def test_write_dir_atomic_replaces_existing_dir(tmp_path):
+    target = tmp_path / "index" / "device"
+
+    def writer(content):
+        def write(tmp_dir):
+            with open(os.path.join(tmp_dir, "data.txt"), "w") as f:
+                f.write(content)
+
+        return write
+
+    write_dir_atomic(str(target), writer("v1"))
+    write_dir_atomic(str(target), writer("v2"))
+    assert (target / "data.txt").read_text() == "v2"
+
+    # Сбой записи не трогает прежний каталог
+    def broken(tmp_dir):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_dir_atomic(str(target), broken)
+    assert (target / "data.txt").read_text() == "v2"
+
+    # Не встал на место новый каталог - прежний возвращается
+    real_rename = os.rename
+    calls = []
+
+    def failing_rename(src, dst):
+        calls.append((src, dst))
+        if len(calls) == 2:
+            raise OSError("busy")
+        real_rename(src, dst)
+
+    with patch.object(rag_module.os, "rename", side_effect=failing_rename):
+        with pytest.raises(OSError):
+            write_dir_atomic(str(target), writer("v3"))
+    assert (target / "data.txt").read_text() == "v2"
+    assert os.listdir(tmp_path / "index") == ["device"]
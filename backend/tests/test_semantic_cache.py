@@ -0,0 +1,91 @@
+# backend/tests/test_semantic_cache.py
+import re
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+from app.services import ai_processor
+from app.services.semantic_cache import SemanticCache
+
+VOCAB = ["датчик", "эрис-414", "не", "работает", "горит", "ошибка", "калибровка"]
+RESULT = {
+    "category": "неисправность",
+    "sentiment": "negative",
+    "summary": "Не работает датчик",
+    "answer": "<NAME_1_NOM>, направим инженера",
+    "important": False,
+}
+
+
+def fake_encoder(texts):
+    """Мешок слов вместо E5: одинаковые слова - близкие векторы."""
+    vectors = []
+    for text in texts:
+        words = re.findall(r"[\w-]+", text.lower())
+        vector = np.array([words.count(w) for w in VOCAB], dtype="float32") + 0.01
+        vectors.append(vector / np.linalg.norm(vector))
+    return np.stack(vectors)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticCache(str(tmp_path / "semantic"), encoder=fake_encoder)
+
+
+@pytest.mark.asyncio
+async def test_paraphrase_reuses_answer_template(cache):
+    await cache.add("<NAME_1>: датчик ЭРИС-414 не работает", RESULT, "v1")
+
+    hit = await cache.lookup("Датчик ЭРИС-414 не работает. <NAME_1>", "v1")
+    assert hit["category"] == "неисправность"
+    assert hit["answer"] == "<NAME_1_NOM>, направим инженера"
+
+    assert await cache.lookup("Нужна калибровка", "v1") is None
+    # Другая версия промпта - другой ответ
+    assert await cache.lookup("<NAME_1>: датчик ЭРИС-414 не работает", "v2") is None
+    assert cache.stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_template_needs_matching_placeholders(cache):
+    await cache.add("<NAME_1>: датчик ЭРИС-414 не работает", RESULT, "v1")
+
+    # В тикете нет имени - шаблон с <NAME_1> не подходит
+    assert await cache.lookup("датчик ЭРИС-414 не работает", "v1") is None
+
+
+@pytest.mark.asyncio
+async def test_eviction_by_age_and_persistence(cache, tmp_path):
+    with patch("app.services.semantic_cache.time.time", return_value=1_000):
+        await cache.add("<NAME_1>: датчик ЭРИС-414 не работает", RESULT, "v1")
+    await cache.add("<NAME_1>: горит ошибка", RESULT, "v1")
+    await cache.save()
+
+    restored = SemanticCache(str(tmp_path / "semantic"), encoder=fake_encoder)
+    await restored.load()
+
+    # Первая запись старше SEMANTIC_CACHE_MAX_AGE и вытеснена при загрузке
+    assert restored.stats["size"] == 1
+    assert restored.index.ntotal == 1
+    assert await restored.lookup("<NAME_1>: горит ошибка", "v1")
+
+
+@pytest.mark.asyncio
+async def test_semantic_hit_skips_llm(cache):
+    llm = AsyncMock(return_value=dict(RESULT))
+    with (
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", False),
+        patch.object(ai_processor, "semantic_cache", cache),
+        patch.object(ai_processor, "_call_llm", llm),
+    ):
+        await ai_processor.process_ticket_ai(
+            "<NAME_1>: датчик ЭРИС-414 не работает", None
+        )
+        result = await ai_processor.process_ticket_ai(
+            "Датчик ЭРИС-414 не работает!!! <NAME_1>", None
+        )
+
+    llm.assert_awaited_once()
+    assert result["category"] == "неисправность"
+    assert result["manual_required"] is False
@@ -0,0 +1,129 @@
+# backend/tests/test_spam_filter.py
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.services.email_service import EmailService
+from app.services.parsing.automaton import KeywordAutomaton
+from app.services.parsing.ner_pool import ner_pool
+from app.services.spam_filter import SpamFilter
+
+HAM = "Добрый день. Сломался газоанализатор ДГС ЭРИС-230 на объекте, горит ошибка"
+SPAM = "Только сегодня скидки на продвижение сайта, бесплатный аудит и вебинар"
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton({"he": 1, "she": 2, "hers": 3})
+
+    matches = automaton.find_all("USHERS")
+
+    assert {(m.keyword, m.start, m.end) for m in matches} == {
+        ("she", 1, 4),
+        ("he", 2, 4),
+        ("hers", 2, 6),
+    }
+    assert automaton.find_longest("ushers he") == [(7, 9, "he", 1)]
+
+
+@pytest.mark.parametrize(
+    "headers, sender, reason",
+    [
+        ({"Auto-Submitted": "auto-replied"}, "a@b.ru", "auto_submitted"),
+        ({"Auto-Submitted": "no"}, "a@b.ru", None),
+        ({"List-Unsubscribe": "<mailto:u@x.ru>"}, "news@x.ru", "mailing_list"),
+        ({}, "MAILER-DAEMON@mx.ru", "robot_sender"),
+        ({}, "ivanov@gazprom.ru", None),
+    ],
+)
+def test_header_heuristics(headers, sender, reason):
+    assert SpamFilter().check(HAM, sender, headers) == reason
+
+
+def test_keywords_and_reject_rate():
+    spam_filter = SpamFilter()
+
+    assert spam_filter.check(
+        "Вернусь 15 числа", "a@b.ru", {"Subject": "Автоматический ответ: я в отпуске"}
+    ) == ("auto_reply")
+    assert spam_filter.check(SPAM, "a@b.ru") == "spam_words"
+    # Одно рекламное слово в рабочем письме - не повод отклонять
+    assert spam_filter.check(HAM + ", счет со скидкой", "a@b.ru") is None
+    assert spam_filter.check(HAM, "a@b.ru") is None
+
+    assert spam_filter.stats["reject_rate"] == 0.5
+    assert spam_filter.stats["by_reason"] == {"auto_reply": 1, "spam_words": 1}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        # Основы слов - только с начала слова
+        HAM + ". Реакция сервиса нулевая, а обещали бесплатно заменить сенсор",
+        HAM + ". Просим бесплатную консультацию по аккредитации лаборатории",
+        # Подпись рассылки и цитата автоответа - не текст клиента
+        HAM + "\n\n> Automatic reply: out of office\n> Я в отпуске",
+        HAM + "\n-- \nTo unsubscribe from this group send an email",
+        HAM + "\n\n-----Original Message-----\nСкидки! Распродажа! Вебинар бесплатно",
+    ],
+)
+def test_complaints_with_spam_lookalikes_pass(body):
+    assert SpamFilter().check(body, "ivanov@gazprom.ru", {"Subject": "Ошибка"}) is None
+
+
+def test_auto_reply_detected_in_encoded_subject():
+    subject = "=?utf-8?b?0JDQstGC0L7QvtGC0LLQtdGCOiDRjyDQsiDQvtGC0L/Rg9GB0LrQtQ==?="
+
+    assert SpamFilter().check(HAM, "a@b.ru", {"Subject": subject}) == "auto_reply"
+
+
+def test_scan_is_capped_for_huge_bodies():
+    body = HAM + " " + "текст " * 200_000 + SPAM
+
+    assert SpamFilter().check(body, "a@b.ru") is None
+
+
+@pytest.mark.asyncio
+async def test_classifier_trained_from_tickets():
+    repo = MagicMock()
+    repo.get_classified_samples = AsyncMock(
+        return_value=[
+            {
+                "original_message": "Заработок в интернете, пиши",
+                "category": "спам",
+                "is_relevant": False,
+            },
+            {"original_message": HAM, "category": "неисправность", "is_relevant": True},
+        ]
+        * 20
+    )
+    spam_filter = SpamFilter()
+    await spam_filter.train(repo)
+
+    assert spam_filter.classifier.trained
+    assert spam_filter.check("Удаленный заработок в интернете", "a@b.ru") == (
+        "classifier"
+    )
+    assert spam_filter.check("Ошибка на ДГС ЭРИС-230", "a@b.ru") is None
+
+
+@pytest.mark.asyncio
+async def test_rejected_email_skips_ner_and_ai(mock_ai_processor):
+    repo = MagicMock()
+    repo.create_ticket = AsyncMock(return_value="uuid-1")
+    email = {
+        "body": HAM,
+        "email_addr": "robot@shop.ru",
+        "headers": {"List-Unsubscribe": "<mailto:u@shop.ru>"},
+    }
+
+    with (
+        patch.object(ner_pool, "extract_batch", new_callable=AsyncMock) as mock_ner,
+        patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock),
+    ):
+        results = await EmailService(repo)._process_emails([email])
+
+    mock_ner.assert_not_awaited()
+    mock_ai_processor.assert_not_awaited()
+    ticket = repo.create_ticket.await_args.args[0]
+    assert ticket["is_relevant"] is False
+    assert ticket["filtered_by"] == "mailing_list"
+    assert results[0]["ticket_id"] == "uuid-1"
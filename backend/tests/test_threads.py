@@ -0,0 +1,102 @@
+# backend/tests/test_threads.py
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from app.services.email_service import EmailService
+from app.services.parsing.ner_pool import ner_pool
+from tests.fake_imap import make_raw_email
+
+
+@pytest.fixture
+def repo():
+    repo = MagicMock()
+    repo.create_ticket = AsyncMock(side_effect=lambda ticket: uuid4())
+    repo.find_ticket_by_message_ids = AsyncMock(return_value=None)
+    repo.add_ticket_message = AsyncMock(return_value=True)
+    repo.update_ticket = AsyncMock(return_value=True)
+    return repo
+
+
+def test_parse_thread_headers():
+    raw = make_raw_email("Спасибо, но проблема осталась.")
+    raw = (
+        b"In-Reply-To: <reply-1@support.ru>\r\n"
+        b"References: <ticket-1@client.ru> <reply-1@support.ru>\r\n" + raw
+    )
+    parsed = EmailService(repo=MagicMock())._parse_raw_email(raw)
+
+    assert parsed["in_reply_to"] == "<reply-1@support.ru>"
+    assert parsed["references"] == ["<ticket-1@client.ru>", "<reply-1@support.ru>"]
+
+
+@pytest.mark.asyncio
+async def test_follow_up_attached_without_ai(repo, mock_ai_processor):
+    ticket_id = uuid4()
+    repo.find_ticket_by_message_ids = AsyncMock(return_value=ticket_id)
+    emails = [
+        {
+            "body": "Спасибо, но проблема осталась.",
+            "email_addr": "a@b.ru",
+            "message_id": "<follow-up@client.ru>",
+            "in_reply_to": "<reply-1@support.ru>",
+            "references": ["<ticket-1@client.ru>"],
+        }
+    ]
+
+    with patch.object(ner_pool, "extract_batch", new_callable=AsyncMock) as mock_ner:
+        results = await EmailService(repo)._process_emails(emails)
+
+    assert results == []
+    mock_ner.assert_not_awaited()
+    mock_ai_processor.assert_not_awaited()
+    repo.create_ticket.assert_not_awaited()
+    repo.find_ticket_by_message_ids.assert_awaited_once_with(
+        ["<reply-1@support.ru>", "<ticket-1@client.ru>"]
+    )
+    repo.add_ticket_message.assert_awaited_once_with(
+        ticket_id,
+        "in",
+        "Спасибо, но проблема осталась.",
+        "a@b.ru",
+        "<follow-up@client.ru>",
+    )
+    repo.update_ticket.assert_awaited_once_with(ticket_id, {"is_resolved": False})
+
+
+@pytest.mark.asyncio
+async def test_unknown_thread_becomes_new_ticket(repo, mock_ai_processor):
+    emails = [
+        {
+            "body": "Я Петр Петров. Сломался прибор ДГС ЭРИС-230.",
+            "email_addr": "a@b.ru",
+            "in_reply_to": "<unknown@elsewhere.ru>",
+        }
+    ]
+    with patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock):
+        results = await EmailService(repo)._process_emails(emails)
+
+    assert len(results) == 1
+    repo.add_ticket_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reclassify_uses_conversation(repo, mock_ai_processor):
+    ticket_id = uuid4()
+    repo.get_ticket = AsyncMock(
+        return_value={"original_message": "Датчик не работает.", "email": "a@b.ru"}
+    )
+    repo.get_ticket_messages = AsyncMock(
+        return_value=[
+            {"direction": "out", "body": "Перезагрузите прибор."},
+            {"direction": "in", "body": "Я Петр Петров, прибор ДГС ЭРИС-230 сломан."},
+        ]
+    )
+
+    updates = await EmailService(repo).reclassify_ticket(ticket_id)
+
+    masked_text = mock_ai_processor.await_args[0][0]
+    assert "Датчик не работает." in masked_text
+    assert "Перезагрузите" not in masked_text
+    assert updates["category"] == "тест"
+    repo.update_ticket.assert_awaited_once_with(ticket_id, updates)
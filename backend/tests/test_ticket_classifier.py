@@ -0,0 +1,181 @@
+# backend/tests/test_ticket_classifier.py
+import random
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.services import ai_processor
+from app.services.email_service import EmailService
+from app.services.parsing.ner_pool import ner_pool
+from app.services.ticket_classifier import TicketClassifier
+
+# (category, sentiment, important) -> фразы, из которых собираются тикеты
+TEMPLATES = {
+    ("неисправность", "negative", False): [
+        "сломался газоанализатор",
+        "прибор не включается",
+        "горит ошибка на датчике",
+        "датчик не работает после замены",
+    ],
+    ("неисправность", "negative", True): [
+        "срочно утечка газа в котельной",
+        "пахнет газом срочно приезжайте",
+        "утечка газа датчик молчит",
+        "угроза взрыва запах газа",
+    ],
+    ("калибровка", "neutral", False): [
+        "нужна калибровка датчика",
+        "когда плановая поверка прибора",
+        "запишите на калибровку газоанализатора",
+        "просим провести поверку",
+    ],
+    ("благодарность", "positive", False): [
+        "спасибо за быстрый ремонт",
+        "благодарим инженера за работу",
+        "большое спасибо все работает",
+        "благодарность сервисной службе",
+    ],
+    ("спам", "neutral", False): [
+        "скидки на продвижение сайта",
+        "выгодное предложение кредит",
+        "вебинар по заработку бесплатно",
+        "реклама распродажа только сегодня",
+    ],
+}
+
+
+def make_samples(per_class: int = 40):
+    rng = random.Random(1)
+    samples = []
+    for (category, sentiment, important), phrases in TEMPLATES.items():
+        for n in range(per_class):
+            text = f"{rng.choice(phrases)}, {rng.choice(phrases)}. Заявка {n}"
+            samples.append(
+                {
+                    "text": text,
+                    "category": category,
+                    "sentiment": sentiment,
+                    "important": important,
+                }
+            )
+    return samples
+
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    classifier = TicketClassifier(str(tmp_path_factory.mktemp("clf") / "clf.json"))
+    classifier.fit(make_samples())
+    return classifier
+
+
+def test_classifier_labels_tickets_and_reports_accuracy(trained):
+    assert trained.classify("Срочно! Утечка газа в котельной, пахнет газом") == {
+        "category": "неисправность",
+        "sentiment": "negative",
+        "important": True,
+    }
+    assert trained.classify("Нужна калибровка датчика, когда поверка?") == {
+        "category": "калибровка",
+        "sentiment": "neutral",
+        "important": False,
+    }
+
+    report = trained.report
+    assert report["test_samples"] > 0
+    assert report["heads"]["category"]["accuracy"] >= 0.9
+    assert report["heads"]["important"]["classes"]["True"]["recall"] == 1.0
+    assert report["coverage"] > 0.5
+
+
+def test_classifier_defers_to_llm_when_unsure(trained):
+    assert trained.classify("Абракадабра непонятные слова") is None
+    assert TicketClassifier("/nonexistent.json").classify("сломался прибор") is None
+
+
+def test_classifier_survives_save_and_load(trained):
+    text = "прибор не включается, горит ошибка"
+    trained.save()
+
+    loaded = TicketClassifier(trained.path)
+
+    assert loaded.load()
+    assert loaded.classify(text) == trained.classify(text)
+    assert loaded.report == trained.report
+
+
+@pytest.mark.asyncio
+async def test_train_needs_enough_history(tmp_path):
+    classifier = TicketClassifier(str(tmp_path / "clf.json"))
+    repo = MagicMock()
+    repo.get_labeled_tickets = AsyncMock(
+        return_value=[
+            {
+                "original_message": "сломался прибор",
+                "category": "неисправность",
+                "sentiment": "negative",
+                "is_important": False,
+            }
+        ]
+    )
+
+    report = await classifier.train(repo)
+
+    assert report["trained"] is False
+    assert not classifier.trained
+    assert not (tmp_path / "clf.json").exists()
+
+
+@pytest.mark.asyncio
+async def test_labeled_ticket_uses_answer_only_prompt():
+    llm_result = {"summary": "Утечка", "answer": "Выезжаем", "category": "спам"}
+    labels = {"category": "неисправность", "sentiment": "negative", "important": True}
+
+    with (
+        patch.object(ai_processor.settings, "USE_MOCK_AI", False),
+        patch.object(ai_processor.settings, "LLM_CACHE_ENABLED", False),
+        patch.object(ai_processor.settings, "SEMANTIC_CACHE_ENABLED", False),
+        patch.object(
+            ai_processor, "_call_llm", AsyncMock(return_value=llm_result)
+        ) as mock_llm,
+    ):
+        result = await ai_processor.process_ticket_ai(
+            "Утечка газа", None, labels=labels
+        )
+
+    assert mock_llm.await_args.args[0] == ai_processor.PROMPT_ANSWER_ONLY
+    assert result["category"] == "неисправность"
+    assert result["important"] is True
+    assert result["answer"] == "Выезжаем"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_skips_llm_for_classified_spam(trained, mock_ai_processor):
+    repo = MagicMock()
+    repo.create_ticket = AsyncMock(side_effect=["uuid-1", "uuid-2"])
+    emails = [
+        {"body": "Вебинар по заработку бесплатно, Петр Петров", "email_addr": "a@b.ru"},
+        {"body": "Я Петр Петров, прибор не включается", "email_addr": "c@d.ru"},
+    ]
+    entities = [{"type": "NAME", "text": "Петр Петров", "normal": "Петр Петров"}]
+
+    # Рекламные слова поймал бы и спам-фильтр: проверяем именно классификатор
+    with (
+        patch("app.services.email_service.settings.SPAM_FILTER_ENABLED", False),
+        patch("app.services.email_service.ticket_classifier", trained),
+        patch.object(
+            ner_pool, "extract_batch", AsyncMock(return_value=[entities, entities])
+        ),
+        patch("app.messaging.publisher.publish_new_ticket", new_callable=AsyncMock),
+    ):
+        await EmailService(repo)._process_emails(emails)
+
+    tickets = {
+        call.args[0]["original_message"]: call.args[0]
+        for call in repo.create_ticket.await_args_list
+    }
+    spam = tickets[emails[0]["body"]]
+    assert spam["filtered_by"] == "ticket_classifier"
+    assert spam["is_relevant"] is False
+
+    mock_ai_processor.assert_awaited_once()
+    assert mock_ai_processor.await_args.kwargs["labels"]["category"] == "неисправность"
+    assert tickets[emails[1]["body"]]["classified_by"] == "ticket_classifier"